@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+'''benchmark render time and file size of CPT verticals with and without
+level-of-detail decimation, for raster (PNG) and vector (SVG, PDF) output'''
+
+from xsboringen.borehole import Vertical
+from xsboringen.cpt import CPT
+from xsboringen.cross_section import CrossSection
+from xsboringen.plotting import CrossSectionPlot
+from xsboringen import styles
+
+from shapely.geometry import LineString, mapping
+import numpy as np
+import click
+import yaml
+
+import tempfile
+import time
+import os
+
+DEFAULTCONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'xsboringen', 'defaultconfig.yaml')
+
+
+def synthetic_cpt(code, x, nsamples, rng):
+    depth = np.linspace(0., 40., nsamples)
+    cone_resistance = np.abs(rng.normal(5., 3., nsamples)).cumsum() / nsamples
+    friction_ratio = np.abs(rng.normal(2., 1., nsamples))
+    verticals = {
+        'cone_resistance': Vertical('cone_resistance',
+            depth.tolist(), cone_resistance.tolist()),
+        'friction_ratio': Vertical('friction_ratio',
+            depth.tolist(), friction_ratio.tolist()),
+        }
+    return CPT(code, depth=40., x=x, y=0., z=0., verticals=verticals)
+
+
+def get_plot(ncpts, nsamples, decimate):
+    # styles lookups consume the config records, read a fresh copy
+    with open(DEFAULTCONFIG) as y:
+        config = yaml.load(y, Loader=yaml.SafeLoader)
+
+    rng = np.random.default_rng(1)
+    length = 1000.
+    cs = CrossSection(
+        geometry=mapping(LineString([(0., 0.), (length, 0.)])),
+        buffer_distance=1.,
+        label='A',
+        )
+    for i in range(ncpts):
+        x = (i + 1) * length / (ncpts + 1)
+        cs.boreholes.append((x, synthetic_cpt('S{:d}'.format(i), x, nsamples, rng)))
+
+    plotting_styles = {
+        'segments': styles.SegmentStylesLookup(
+            **config['styles']['segments']),
+        'wells': styles.SimpleStylesLookup(**config['styles']['wells']),
+        'verticals': styles.SimpleStylesLookup(
+            **config['styles']['verticals']),
+        'surfaces': styles.SimpleStylesLookup(**config['styles']['surfaces']),
+        'solids': styles.SimpleStylesLookup(**config['styles']['solids']),
+        }
+    plot_config = dict(config['cross_section_plot'])
+    plot_config['decimate_verticals'] = decimate
+    plot_config['n_jobs'] = 1
+    return CrossSectionPlot(cs, plotting_styles, plot_config, ylim=[-45., 5.])
+
+
+@click.command()
+@click.option('--ncpts', default=20, help='number of CPTs in cross-section')
+@click.option('--nsamples', default=4000, help='number of samples per CPT')
+def main(ncpts, nsamples):
+    row = '{fmt:<5s} {decimate!s:<9s} {seconds:>8.2f} s {size:>10.1f} kB'
+    print('{:<5s} {:<9s} {:>10s} {:>13s}'.format(
+        'fmt', 'decimate', 'time', 'size'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for fmt in ('png', 'svg', 'pdf'):
+            for decimate in (False, True):
+                imagefile = os.path.join(tmpdir, 'bench.{}'.format(fmt))
+                plt = get_plot(ncpts, nsamples, decimate)
+                start = time.perf_counter()
+                plt.to_image(imagefile)
+                seconds = time.perf_counter() - start
+                size = os.path.getsize(imagefile) / 1024.
+                print(row.format(
+                    fmt=fmt, decimate=decimate, seconds=seconds, size=size,
+                    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+'''benchmark reading a folder of Dinoloket XML files with extra fields,
+using the ElementTree and lxml backends'''
+
+from xsboringen.xmlfiles import boreholes_from_xmlfile, BACKENDS
+
+import numpy as np
+import click
+
+import tempfile
+import time
+import glob
+import os
+
+INTERVAL = (
+    '<lithoInterval topDepth="{top:d}" baseDepth="{base:d}">'
+    '<lithology code="{lithology:}"/><sandMedianClass code="ZMFO"/>'
+    '<sandMedian median="{median:d}"/><colorMain code="GR"/>'
+    '<organicMatterClass code="H1"/></lithoInterval>'
+    )
+
+SURVEY = (
+    '<?xml version="1.0"?><dinoSurvey><pointSurvey>'
+    '<identification id="{code:}"/><surveyLocation><coordinates>'
+    '<coordinateX>{x:.2f}</coordinateX><coordinateY>{y:.2f}</coordinateY>'
+    '</coordinates></surveyLocation><surfaceElevation>'
+    '<elevation levelValue="120"/></surfaceElevation>'
+    '<borehole baseDepth="{depth:d}"><date startYear="1990" startMonth="5"/>'
+    '<quality code="B"/><drillMethod code="HAND"/><lithoDescr>'
+    '{intervals:}</lithoDescr></borehole></pointSurvey></dinoSurvey>'
+    )
+
+EXTRA_FIELDS = {
+    'borehole': [
+        {'name': 'quality', 'match': 'quality@code', 'dtype': 'str'},
+        {'name': 'drillmethod', 'match': 'drillMethod@code', 'dtype': 'str'},
+        ],
+    'segments': [
+        {'name': 'color', 'match': 'colorMain@code', 'dtype': 'str'},
+        {'name': 'organic', 'match': 'organicMatterClass@code',
+            'dtype': 'str'},
+        {'name': 'median', 'match': 'sandMedian@median', 'dtype': 'float'},
+        ],
+    }
+
+
+def write_files(folder, nfiles, nintervals, rng):
+    for i in range(nfiles):
+        bases = np.sort(rng.choice(np.arange(1, 3000), nintervals,
+            replace=False))
+        tops = np.concatenate([[0], bases[:-1]])
+        intervals = ''.join(
+            INTERVAL.format(
+                top=int(t), base=int(b),
+                lithology=rng.choice(['Z', 'K', 'L', 'V']),
+                median=int(rng.integers(100, 400)),
+                )
+            for t, b in zip(tops, bases)
+            )
+        xmlfile = os.path.join(folder, 'B{:05d}_1.4.xml'.format(i))
+        with open(xmlfile, 'w') as f:
+            f.write(SURVEY.format(code='B{:05d}'.format(i),
+                x=rng.uniform(0., 1e4), y=rng.uniform(0., 1e4),
+                depth=int(bases[-1]), intervals=intervals,
+                ))
+
+
+@click.command()
+@click.option('--nfiles', default=10000, help='number of XML files')
+@click.option('--nintervals', default=30, help='number of intervals per file')
+def main(nfiles, nintervals):
+    row = '{backend:<6s} {seconds:>8.2f} s {rate:>10.0f} files/s'
+    print('{:<6s} {:>10s} {:>16s}'.format('backend', 'time', 'rate'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_files(tmpdir, nfiles, nintervals, np.random.default_rng(1))
+        xmlfiles = sorted(glob.glob(os.path.join(tmpdir, '*1.4.xml')))
+        for backend in BACKENDS:
+            start = time.perf_counter()
+            for xmlfile in xmlfiles:
+                for borehole in boreholes_from_xmlfile(xmlfile,
+                        extra_fields=EXTRA_FIELDS,
+                        backend=backend,
+                        ):
+                    pass
+            seconds = time.perf_counter() - start
+            print(row.format(
+                backend=backend, seconds=seconds, rate=nfiles / seconds,
+                ))
+
+
+if __name__ == '__main__':
+    main()
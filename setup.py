@@ -95,6 +95,8 @@ setup(
     extras_require={
         # 'dev': ['check-manifest'],
         # 'test': ['coverage'],
+        'lxml': ['lxml'],
+        'parquet': ['pyarrow'],
     },
 
     # If there are data files included in your packages that need to be
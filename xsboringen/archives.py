@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from collections import namedtuple
+from pathlib import Path
+import threading
+import posixpath
+import logging
+import zipfile
+import io
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# suffixes of archives read as folders
+ARCHIVE_SUFFIXES = ('.zip', )
+
+# size and modification time of archive member, as in os.stat_result
+MemberStat = namedtuple('MemberStat', ['st_size', 'st_mtime_ns'])
+
+# open archives per process, path and modification time
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def is_archive(path):
+    '''True if path is an existing archive file'''
+    path = Path(path)
+    return path.suffix.lower() in ARCHIVE_SUFFIXES and path.is_file()
+
+
+def split_archive(path):
+    '''archive and remaining parts of path inside archive, archive is None if
+    path is not in an archive'''
+    parts = Path(path).parts
+    for i, part in enumerate(parts):
+        if part.lower().endswith(ARCHIVE_SUFFIXES):
+            archive = Path(*parts[:i + 1])
+            if archive.is_file():
+                return archive, list(parts[i + 1:])
+    return None, list(parts)
+
+
+def open_archive(archive):
+    '''ZipFile of archive, kept open per process and reopened if archive is
+    modified'''
+    archive = str(archive)
+    key = os.getpid(), archive, os.stat(archive).st_mtime_ns
+    with _archives_lock:
+        zf = _archives.get(key)
+        if zf is None:
+            for stale in [k for k in _archives if k[1] == archive]:
+                _archives.pop(stale).close()
+            log.debug('opening {f:}'.format(f=os.path.basename(archive)))
+            zf = _archives[key] = zipfile.ZipFile(archive)
+    return zf
+
+
+class ArchiveMember(object):
+    '''Member of zip archive, read as source file without extracting'''
+    def __init__(self, archive, member):
+        self.archive = str(archive)
+        self.member = member
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(archive=\'{a:}\', '
+                'member=\'{s.member:}\')').format(
+            s=self, a=os.path.basename(self.archive))
+
+    def __str__(self):
+        return os.path.join(self.archive, *self.member.split('/'))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ArchiveMember) and
+            (self.archive, self.member) == (other.archive, other.member)
+            )
+
+    def __hash__(self):
+        return hash((self.archive, self.member))
+
+    @classmethod
+    def from_path(cls, path):
+        '''member from path through archive, None if not in archive'''
+        archive, parts = split_archive(path)
+        if (archive is None) or (len(parts) == 0):
+            return None
+        return cls(archive, '/'.join(parts))
+
+    @property
+    def name(self):
+        return posixpath.basename(self.member)
+
+    @property
+    def suffix(self):
+        return posixpath.splitext(self.name)[1]
+
+    def resolve(self):
+        return self.__class__(Path(self.archive).resolve(), self.member)
+
+    def exists(self):
+        if not os.path.exists(self.archive):
+            return False
+        try:
+            open_archive(self.archive).getinfo(self.member)
+            return True
+        except KeyError:
+            return False
+
+    def stat(self):
+        '''uncompressed size of member and modification time of archive'''
+        info = open_archive(self.archive).getinfo(self.member)
+        return MemberStat(info.file_size, os.stat(self.archive).st_mtime_ns)
+
+    def open(self, mode='r', encoding=None, errors=None):
+        '''binary or text stream of member'''
+        handle = open_archive(self.archive).open(self.member)
+        if 'b' in mode:
+            return handle
+        return io.TextIOWrapper(handle, encoding=encoding, errors=errors)
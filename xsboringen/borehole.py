@@ -3,6 +3,8 @@
 
 from xsboringen.mixins import AsDictMixin, CopyMixin
 
+import numpy as np
+
 from collections.abc import Iterable
 from itertools import groupby
 from functools import total_ordering
@@ -246,3 +248,197 @@ class Borehole(AsDictMixin, CopyMixin, Iterable):
 
     def to_lithology(self, *args, **kwargs):
         return self
+
+
+class LazyMixin(object):
+    '''Mixin for deferring segments and verticals until first access, read
+    by picklable loader from remembered source file and offset'''
+
+    # internal state, not an attribute of borehole
+    state_attrs = '_loader', '_segments', '_verticals'
+
+    def __init__(self, *args, loader=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loader = loader
+        if loader is not None:
+            # segments and verticals not given are read on first access
+            if kwargs.get('segments') is None:
+                self._segments = None
+            if kwargs.get('verticals') is None:
+                self._verticals = None
+
+    @property
+    def segments(self):
+        if self._segments is None:
+            self.load()
+        return self._segments
+
+    @segments.setter
+    def segments(self, segments):
+        self._segments = segments
+
+    @property
+    def verticals(self):
+        if self._verticals is None:
+            self.load()
+        return self._verticals
+
+    @verticals.setter
+    def verticals(self, verticals):
+        self._verticals = verticals
+
+    @property
+    def loaded(self):
+        '''True if segments and verticals are in memory'''
+        return (self._segments is not None) and (self._verticals is not None)
+
+    def as_dict(self, keys=None):
+        '''attributes as dict, segments and verticals are read if included'''
+        if keys:
+            return super().as_dict(keys=keys)
+        attrs = {
+            k: v for k, v in super().as_dict().items()
+            if k not in self.state_attrs
+            }
+        attrs.update(segments=self.segments, verticals=self.verticals)
+        return attrs
+
+    def load(self):
+        '''read segments and verticals not in memory from source'''
+        if self._loader is not None:
+            loaded = self._loader()
+        else:
+            loaded = {}
+        if self._segments is None:
+            self._segments = loaded.get('segments') or []
+        if self._verticals is None:
+            self._verticals = loaded.get('verticals') or {}
+        return self
+
+    def release(self):
+        '''drop segments and verticals from memory, to be read again on next
+        access, changes to segments or verticals are discarded'''
+        if self._loader is not None:
+            self._segments = None
+            self._verticals = None
+        return self
+
+
+class LazyBorehole(LazyMixin, Borehole):
+    '''Borehole with header fields only, segments are read on first access'''
+    pass
+
+
+def nan_to_none(values):
+    '''list of values with nan replaced by None'''
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        isnan = np.isnan(values)
+        values = values.tolist()
+        if isnan.any():
+            for i in np.flatnonzero(isnan):
+                values[i] = None
+        return values
+    return values.tolist()
+
+
+class SegmentTable(object):
+    '''Columnar table of boreholes and segments, with borehole columns of
+    one value per borehole and segment columns of one value per segment,
+    segments of borehole i are at offsets[i]:offsets[i + 1]'''
+
+    # core fields, other columns are passed as attributes
+    borehole_fields = Borehole.fieldnames
+    segment_fields = Segment.fieldnames
+
+    def __init__(self, boreholes, segments, offsets, attrs=None):
+        self.boreholes = boreholes
+        self.segments = segments
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.attrs = attrs or {}
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(boreholes={n:d}, '
+                'segments={s.nsegments:d})').format(s=self, n=len(self))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nsegments(self):
+        return int(self.offsets[-1])
+
+    @classmethod
+    def concatenate(cls, tables):
+        '''concatenate tables with the same columns'''
+        tables = [t for t in tables if len(t) > 0]
+        if len(tables) == 0:
+            return cls({}, {}, [0])
+        boreholes = {
+            k: np.concatenate([t.boreholes[k] for t in tables])
+            for k in tables[0].boreholes
+            }
+        segments = {
+            k: np.concatenate([t.segments[k] for t in tables])
+            for k in tables[0].segments
+            }
+        offsets = [np.zeros(1, dtype=np.int64)]
+        start = 0
+        for table in tables:
+            offsets.append(table.offsets[1:] + start)
+            start += table.nsegments
+        return cls(boreholes, segments, np.concatenate(offsets),
+            attrs=tables[0].attrs,
+            )
+
+    def take(self, indices):
+        '''table of boreholes at indices, with their segments'''
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        rows = (
+            np.repeat(starts - offsets[:-1], lengths) +
+            np.arange(offsets[-1], dtype=np.int64)
+            )
+        return self.__class__(
+            {k: v[indices] for k, v in self.boreholes.items()},
+            {k: v[rows] for k, v in self.segments.items()},
+            offsets,
+            attrs=self.attrs,
+            )
+
+    def to_boreholes(self):
+        '''yield Borehole with Segments for each borehole in table'''
+        boreholes = {k: nan_to_none(v) for k, v in self.boreholes.items()}
+        segments = {k: nan_to_none(v) for k, v in self.segments.items()}
+        borehole_attrs = [
+            k for k in boreholes if k not in self.borehole_fields
+            ]
+        segment_attrs = [
+            k for k in segments if k not in self.segment_fields
+            ]
+        tops, bases = segments['top'], segments['base']
+        lithologies = segments['lithology']
+        sandmedianclasses = segments['sandmedianclass']
+        offsets = self.offsets.tolist()
+        for i in range(len(self)):
+            segments_ = []
+            for j in range(offsets[i], offsets[i + 1]):
+                attrs = {
+                    k: segments[k][j] for k in segment_attrs
+                    }
+                segments_.append(Segment(tops[j], bases[j],
+                    lithologies[j], sandmedianclasses[j],
+                    **attrs,
+                    ))
+            attrs = dict(self.attrs)
+            attrs.update({k: boreholes[k][i] for k in borehole_attrs})
+            yield Borehole(boreholes['code'][i], boreholes['depth'][i],
+                x=boreholes['x'][i],
+                y=boreholes['y'][i],
+                z=boreholes['z'][i],
+                segments=segments_,
+                **attrs,
+                )
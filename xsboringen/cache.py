@@ -0,0 +1,183 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen import utils
+
+from pathlib import Path
+import hashlib
+import logging
+import sqlite3
+import pickle
+import json
+import time
+import zlib
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# bump to invalidate cached objects after changes to parsing or classes
+CACHE_VERSION = 1
+
+
+def state(an_object):
+    '''json serializable state of reader option'''
+    if isinstance(an_object, (set, frozenset)):
+        return sorted(an_object, key=repr)
+    if hasattr(an_object, 'wkt'):
+        return an_object.wkt
+    if hasattr(an_object, '__dict__'):
+        return an_object.__class__.__name__, vars(an_object)
+    return repr(an_object)
+
+
+class CacheStats(object):
+    '''Hits, misses and evictions of source cache'''
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(hits={s.hits:d}, '
+                'misses={s.misses:d})').format(s=self)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        if lookups > 0:
+            return self.hits / lookups
+        else:
+            return 0.
+
+
+class SourceCache(object):
+    '''Persistent cache of objects parsed from source files, in SQLite
+    database with compressed pickles and least recently used eviction'''
+    def __init__(self, cachefile, max_size_mb=512):
+        self.file = Path(cachefile)
+        self.max_size = int(max_size_mb * 1024 ** 2)
+        self.stats = CacheStats()
+        if not self.file.parent.exists():
+            self.file.parent.mkdir(parents=True)
+        self.connection = sqlite3.connect(str(self.file))
+        self.connection.execute((
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, '
+            'path TEXT, '
+            'size INTEGER, '
+            'accessed REAL, '
+            'data BLOB)'
+            ))
+        self.connection.execute((
+            'CREATE INDEX IF NOT EXISTS entries_accessed '
+            'ON entries (accessed)'
+            ))
+        self.connection.commit()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file={s.file.name:}, '
+                'entries={n:d})').format(s=self, n=len(self))
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def size(self):
+        '''total size of cached data in bytes'''
+        return self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def key(task):
+        '''key of reading task from file stat, reader and reader options'''
+        stat = utils.source_stat(task.file)
+        reader = '{r.__module__:}.{r.__name__:}'.format(r=task.reader)
+        options = json.dumps(task.options, sort_keys=True, default=state)
+        keyvalues = json.dumps([
+            CACHE_VERSION,
+            str(utils.source_path(task.file)),
+            stat.st_size,
+            stat.st_mtime_ns,
+            reader,
+            options,
+            ])
+        return hashlib.sha1(keyvalues.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        '''cached objects for key or None, marks entry as recently used'''
+        row = self.connection.execute(
+            'SELECT data FROM entries WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+        try:
+            objects = pickle.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            log.debug('invalid cache entry {k:}: {e:}'.format(k=key, e=e))
+            self.connection.execute(
+                'DELETE FROM entries WHERE key = ?', (key, ))
+            self.stats.misses += 1
+            return None
+        self.connection.execute(
+            'UPDATE entries SET accessed = ? WHERE key = ?',
+            (time.time(), key),
+            )
+        self.stats.hits += 1
+        return objects
+
+    def put(self, key, path, objects):
+        '''store objects parsed from path'''
+        data = zlib.compress(
+            pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+        self.connection.execute((
+            'INSERT OR REPLACE INTO entries (key, path, size, accessed, data) '
+            'VALUES (?, ?, ?, ?, ?)'),
+            (key, str(path), len(data), time.time(), sqlite3.Binary(data)),
+            )
+        self.stats.stores += 1
+
+    def evict(self):
+        '''remove least recently used entries until below size cap'''
+        excess = self.size - self.max_size
+        if excess <= 0:
+            return
+        rows = self.connection.execute(
+            'SELECT key, size FROM entries ORDER BY accessed')
+        keys = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            keys.append((key, ))
+            excess -= size
+        self.connection.executemany(
+            'DELETE FROM entries WHERE key = ?', keys)
+        self.stats.evictions += len(keys)
+
+    def clear(self):
+        self.connection.execute('DELETE FROM entries')
+        self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.evict()
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def report(self):
+        '''log cache statistics'''
+        log.info((
+            'source cache: {s.hits:d} hits, {s.misses:d} misses '
+            '({s.hit_ratio:.0%}), {s.stores:d} stored, '
+            '{s.evictions:d} evicted, {size:.1f} MB'
+            ).format(s=self.stats, size=self.size / 1024 ** 2))
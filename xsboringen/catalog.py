@@ -0,0 +1,244 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.geffiles import GefFile
+from xsboringen import utils
+
+from shapely.geometry import Point
+
+from collections import namedtuple
+from pathlib import Path
+import logging
+import sqlite3
+import json
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+# catalog entry of single GEF file
+CatalogEntry = namedtuple('CatalogEntry',
+    ['path', 'code', 'x', 'y', 'z', 'depth', 'columnsep', 'columns'],
+    )
+
+# number of headers read between commits
+COMMIT_INTERVAL = 1000
+
+
+class GefCatalog(object):
+    '''Catalog of GEF headers for spatial selection of files before parsing,
+    refreshed incrementally using file size and modification time'''
+    def __init__(self, catalogfile=None):
+        if catalogfile is not None:
+            self.file = Path(catalogfile)
+            if not self.file.parent.exists():
+                self.file.parent.mkdir(parents=True)
+            database = str(self.file)
+        else:
+            self.file = None
+            database = ':memory:'
+        self.connection = sqlite3.connect(database)
+        self.connection.execute((
+            'CREATE TABLE IF NOT EXISTS headers ('
+            'path TEXT PRIMARY KEY, '
+            'size INTEGER, '
+            'mtime INTEGER, '
+            'fieldnames TEXT, '
+            'code TEXT, '
+            'x REAL, '
+            'y REAL, '
+            'z REAL, '
+            'depth REAL, '
+            'columnsep TEXT, '
+            'columns TEXT)'
+            ))
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS headers_xy ON headers (x, y)'
+            )
+        self.connection.commit()
+
+        # number of files offered to and selected by select
+        self.considered = 0
+        self.selected = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(entries={n:d})').format(
+            s=self, n=len(self))
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM headers').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @staticmethod
+    def read_entry(geffile, fieldnames=None):
+        '''read header of GEF file up to #EOH'''
+        gef = GefFile(geffile, fieldnames=fieldnames)
+        header = gef.header()
+
+        # code
+        try:
+            code = header[gef.fieldnames.code][0].strip()
+        except (KeyError, IndexError):
+            code = None
+
+        # x, y
+        try:
+            _, x, y, *_ = header[gef.fieldnames.xy]
+            x = gef.safe_float(x)
+            y = gef.safe_float(y)
+        except (KeyError, ValueError):
+            x, y = None, None
+
+        # z
+        try:
+            _, z, *_ = header[gef.fieldnames.z]
+            z = gef.safe_float(z)
+        except (KeyError, ValueError):
+            z = None
+
+        # depth
+        try:
+            depth = header['MEASUREMENTVAR'][gef.measurementvars.depth].value
+        except KeyError:
+            depth = None
+
+        # column layout
+        if gef.fieldnames.columnsep in header:
+            columnsep, *_ = header[gef.fieldnames.columnsep]
+        else:
+            columnsep = None
+        columns = [
+            tuple(c) for n, c in sorted(header.get('COLUMNINFO', {}).items())
+            ]
+        return CatalogEntry(str(gef.file), code, x, y, z, depth,
+            columnsep, columns,
+            )
+
+    def locate(self, geffile, fieldnames):
+        '''x and y of GEF file and True if header was read, header is read
+        only for new and modified files, fieldnames as json'''
+        path = str(utils.source_path(geffile))
+        stat = utils.source_stat(geffile)
+        stamp = stat.st_size, stat.st_mtime_ns, fieldnames
+        row = self.connection.execute((
+            'SELECT size, mtime, fieldnames, x, y FROM headers '
+            'WHERE path = ?'), (path, )).fetchone()
+        if (row is not None) and (tuple(row[:3]) == stamp):
+            return row[3], row[4], False
+        try:
+            entry = self.read_entry(geffile, json.loads(fieldnames))
+        except Exception as e:
+            log.debug('cannot read header of {f:}: {e:}'.format(
+                f=os.path.basename(path), e=e))
+            entry = CatalogEntry(path, *[None] * 6, columns=[])
+        self.connection.execute((
+            'INSERT OR REPLACE INTO headers '
+            '(path, size, mtime, fieldnames, '
+            'code, x, y, z, depth, columnsep, columns) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'),
+            (path, stat.st_size, stat.st_mtime_ns, fieldnames,
+             entry.code, entry.x, entry.y, entry.z, entry.depth,
+             entry.columnsep, json.dumps(entry.columns)),
+            )
+        return entry.x, entry.y, True
+
+    def refresh(self, geffiles, fieldnames=None):
+        '''read headers of new and modified files'''
+        fieldnames = json.dumps(fieldnames, sort_keys=True)
+        updated = 0
+        for geffile in geffiles:
+            x, y, is_updated = self.locate(geffile, fieldnames)
+            updated += int(is_updated)
+        self.connection.commit()
+        log.debug('catalog refreshed, {:d} headers read'.format(updated))
+        return updated
+
+    def prune(self):
+        '''remove entries of files that no longer exist'''
+        missing = [
+            (p, ) for p, in self.connection.execute(
+                'SELECT path FROM headers')
+            if not utils.source_exists(p)
+            ]
+        self.connection.executemany(
+            'DELETE FROM headers WHERE path = ?', missing)
+        self.connection.commit()
+        return len(missing)
+
+    def entries(self, bbox=None):
+        '''catalog entries with location, inside bbox if given'''
+        query = (
+            'SELECT path, code, x, y, z, depth, columnsep, columns '
+            'FROM headers WHERE x IS NOT NULL AND y IS NOT NULL'
+            )
+        if bbox is not None:
+            query += ' AND x >= ? AND y >= ? AND x <= ? AND y <= ?'
+            rows = self.connection.execute(query, tuple(bbox))
+        else:
+            rows = self.connection.execute(query)
+        for row in rows:
+            *values, columns = row
+            yield CatalogEntry(*values,
+                columns=[tuple(c) for c in json.loads(columns)])
+
+    def inside(self, x, y, bbox=None, polygon=None):
+        '''True if x, y is inside bbox and polygon'''
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            if not ((xmin <= x <= xmax) and (ymin <= y <= ymax)):
+                return False
+        if polygon is not None:
+            return polygon.intersects(Point(x, y))
+        return True
+
+    def select(self, geffiles, bbox=None, polygon=None, fieldnames=None):
+        '''yield GEF files located inside bbox (xmin, ymin, xmax, ymax) and
+        polygon while streaming files, headers are read first for new and
+        modified files, files without location in header are passed on so
+        that reader reads or reports them'''
+        fieldnames = json.dumps(fieldnames, sort_keys=True)
+        polygon = utils.as_geometry(polygon)
+        bbox = utils.bounds(bbox, polygon)
+
+        considered, selected, updated = 0, 0, 0
+        try:
+            for geffile in geffiles:
+                x, y, is_updated = self.locate(geffile, fieldnames)
+                considered += 1
+                self.considered += 1
+                updated += int(is_updated)
+                if updated >= COMMIT_INTERVAL:
+                    self.connection.commit()
+                    updated = 0
+                if (x is not None) and (y is not None) and not self.inside(
+                        x, y, bbox=bbox, polygon=polygon):
+                    continue
+                selected += 1
+                self.selected += 1
+                yield geffile
+        finally:
+            if self.connection is not None:
+                self.connection.commit()
+            log.debug('selected {s:d} of {n:d} GEF files'.format(
+                s=selected, n=considered))
+
+    def report(self):
+        '''log number of GEF files skipped by selection'''
+        if self.considered == 0:
+            return
+        log.info((
+            'GEF catalog: {s.selected:d} of {s.considered:d} files selected, '
+            '{n:d} skipped without parsing'
+            ).format(s=self, n=self.considered - self.selected))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.borehole import Borehole, Segment
+from xsboringen.borehole import Borehole, LazyMixin, Segment
 
 from collections import namedtuple
 
@@ -50,4 +50,6 @@ class CPT(Borehole):
         return self
 
 
-
+class LazyCPT(LazyMixin, CPT):
+    '''CPT with header fields only, verticals are read on first access'''
+    pass
@@ -2,6 +2,16 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 from shapely.geometry import shape, Point
+from shapely.ops import unary_union
+
+
+def buffer_union(geometries, buffer_distance):
+    '''union of buffers with given distance around cross-section lines,
+    None if no lines are given'''
+    buffers = [shape(g).buffer(buffer_distance) for g in geometries]
+    if len(buffers) == 0:
+        return None
+    return unary_union(buffers)
 
 
 class CrossSection(object):
@@ -2,15 +2,23 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.borehole import Borehole, Segment
+from xsboringen.borehole import Borehole, Segment, SegmentTable
 from xsboringen.point import Point
+from xsboringen.tablewriter import TableFile, TableWriter
 from xsboringen.well import Well, FilterSegment
 from xsboringen import utils
 
+import numpy as np
+
 from collections import namedtuple
-from itertools import groupby
+from itertools import groupby, islice
+from operator import itemgetter
 from pathlib import Path
+import tempfile
 import logging
+import locale
+import pickle
+import heapq
 import csv
 import os
 
@@ -23,37 +31,63 @@ def boreholes_from_csv(folder,
         ):
     csvfiles = utils.careful_glob(folder, '*.csv')
     for csvfile in csvfiles:
-        csv_ = CSVBoreholeFile(csvfile,
-            delimiter=delimiter,
-            decimal=decimal,
-            )
-        for borehole in csv_.to_boreholes(fieldnames, extra_fields):
-            if borehole is not None:
-                yield borehole
+        for borehole in boreholes_from_csvfile(csvfile,
+                fieldnames=fieldnames,
+                extra_fields=extra_fields,
+                delimiter=delimiter,
+                decimal=decimal,
+                ):
+            yield borehole
+
+
+def boreholes_from_csvfile(csvfile,
+        fieldnames=None, extra_fields=None,
+        delimiter=',', decimal='.',
+        columnar=False, chunksize=100000,
+        grouping='sorted', memory_mb=256, predicate=None,
+        ):
+    csv_ = CSVBoreholeFile(csvfile,
+        delimiter=delimiter,
+        decimal=decimal,
+        )
+    for borehole in csv_.to_boreholes(fieldnames, extra_fields,
+            columnar=columnar,
+            chunksize=chunksize,
+            grouping=grouping,
+            memory_mb=memory_mb,
+            predicate=predicate,
+            ):
+        if borehole is not None:
+            yield borehole
 
 
 def points_from_csv(csvfile,
     fieldnames=None, valuefields=None,
-    delimiter=',', decimal='.'
+    delimiter=',', decimal='.',
+    grouping='sorted', memory_mb=256, predicate=None,
     ):
     csv_ = CSVPointFile(csvfile,
         delimiter=delimiter,
         decimal=decimal,
         )
-    for point in csv_.to_points(fieldnames, valuefields):
+    for point in csv_.to_points(fieldnames, valuefields,
+            grouping=grouping,
+            memory_mb=memory_mb,
+            predicate=predicate,
+            ):
         if point is not None:
             yield point
 
 
 def wells_from_csv(csvfile,
     fieldnames=None, nsegments=0,
-    delimiter=',', decimal='.'
+    delimiter=',', decimal='.', predicate=None,
     ):
     csv_ = CSVWellFile(csvfile,
         delimiter=delimiter,
         decimal=decimal,
         )
-    for well in csv_.to_wells(fieldnames, nsegments):
+    for well in csv_.to_wells(fieldnames, nsegments, predicate=predicate):
         if well is not None:
             yield well
 
@@ -64,7 +98,7 @@ class CSVFile(object):
 
     def __init__(self, csvfile, delimiter=',', decimal='.',
             ):
-        self.file = Path(csvfile).resolve()
+        self.file = utils.source_path(csvfile)
         self.attrs = {
             'source': self.file.name,
             'format': self._format,
@@ -73,6 +107,9 @@ class CSVFile(object):
         self.delimiter = delimiter
         self.decimal = decimal
 
+        # encoding of text mode reading, for parsing lines read in binary mode
+        self.encoding = locale.getpreferredencoding(False)
+
     @staticmethod
     def safe_int(s):
         try:
@@ -98,6 +135,180 @@ class CSVFile(object):
         else:
             return s
 
+    def parse_line(self, line):
+        '''parse single line read in binary mode to list of values'''
+        line = line.decode(self.encoding)
+        return next(csv.reader([line], delimiter=self.delimiter), [])
+
+    @staticmethod
+    def row_to_dict(header, row):
+        '''row as dict with missing values None, like DictReader'''
+        record = dict(zip(header, row))
+        for key in header[len(row):]:
+            record[key] = None
+        return record
+
+    def read_groups(self, code_field, grouping='sorted', memory_mb=256,
+            ranges=None,
+            ):
+        '''yield code and rows as dicts for each group of rows with the same
+        code, rows must be sorted by code unless grouping is unsorted, only
+        given byte ranges per code are read if ranges is not None'''
+        if ranges is not None:
+            for code, rows in self.read_ranges(ranges):
+                yield code, rows
+        elif grouping == 'sorted':
+            with utils.open_source(self.file, 'r') as f:
+                reader = csv.DictReader(f, delimiter=self.delimiter)
+                bycode = lambda r: r[code_field]
+                for code, rows in groupby(reader, key=bycode):
+                    yield code, rows
+        elif grouping == 'unsorted':
+            if utils.source_stat(self.file).st_size <= memory_mb * 1024 ** 2:
+                groups = self.group_by_index(code_field)
+            else:
+                groups = self.group_by_runs(code_field, memory_mb)
+            for code, rows in groups:
+                yield code, rows
+        else:
+            raise ValueError('grouping \'{}\' not supported'.format(grouping))
+
+    def read_ranges(self, ranges):
+        '''yield code and rows as dicts read from list of code and byte ranges
+        of whole lines'''
+        with utils.open_source(self.file, 'rb') as f:
+            header = self.parse_line(f.readline())
+            for code, byteranges in ranges:
+                rows = []
+                for start, end in byteranges:
+                    f.seek(start)
+                    lines = f.read(end - start).decode(self.encoding)
+                    for row in csv.reader(lines.splitlines(),
+                            delimiter=self.delimiter,
+                            ):
+                        if len(row) > 0:
+                            rows.append(self.row_to_dict(header, row))
+                yield code, rows
+
+    def group_by_index(self, code_field):
+        '''group unsorted rows using hash index of code to row offsets,
+        groups in order of first appearance'''
+        log.debug('indexing {s.file.name:}'.format(s=self))
+        index = {}
+        with utils.open_source(self.file, 'rb') as f:
+            line = f.readline()
+            header = self.parse_line(line)
+            column = {name: i for i, name in enumerate(header)}[code_field]
+            offset = len(line)
+            for line in f:
+                row = self.parse_line(line)
+                if len(row) > 0:
+                    code = row[column] if column < len(row) else None
+                    index.setdefault(code, []).append(offset)
+                offset += len(line)
+
+            for code, offsets in index.items():
+                rows = []
+                for offset in offsets:
+                    f.seek(offset)
+                    row = self.parse_line(f.readline())
+                    rows.append(self.row_to_dict(header, row))
+                yield code, rows
+
+    def group_by_runs(self, code_field, memory_mb=256):
+        '''group unsorted rows using sorted runs in temporary files of at
+        most memory_mb, merged by code and row number'''
+        budget = memory_mb * 1024 ** 2
+        with tempfile.TemporaryDirectory() as tmpdir:
+            runs = []
+            with utils.open_source(self.file, 'rb') as f:
+                header = self.parse_line(f.readline())
+                column = {name: i for i, name in enumerate(header)}[code_field]
+                batch = []
+                size = 0
+                for number, line in enumerate(f):
+                    row = self.parse_line(line)
+                    if len(row) == 0:
+                        continue
+                    code = row[column] if column < len(row) else ''
+                    batch.append((code, number, line))
+                    size += len(line) + 100  # approximate tuple overhead
+                    if size >= budget:
+                        runs.append(self.write_run(batch, tmpdir, len(runs)))
+                        batch = []
+                        size = 0
+                if len(batch) > 0:
+                    runs.append(self.write_run(batch, tmpdir, len(runs)))
+            log.debug('merging {n:d} sorted runs of {s.file.name:}'.format(
+                n=len(runs), s=self))
+
+            merged = heapq.merge(*[self.read_run(r) for r in runs])
+            for code, items in groupby(merged, key=itemgetter(0)):
+                yield code, [
+                    self.row_to_dict(header, self.parse_line(line))
+                    for _, _, line in items
+                    ]
+
+    @staticmethod
+    def write_run(batch, folder, number):
+        '''write batch sorted by code and row number to run file'''
+        runfile = os.path.join(folder, 'run{:05d}.pkl'.format(number))
+        batch.sort(key=itemgetter(0, 1))
+        with open(runfile, 'wb') as f:
+            for item in batch:
+                pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return runfile
+
+    @staticmethod
+    def read_run(runfile):
+        with open(runfile, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+    @classmethod
+    def to_floats(cls, values, decimal='.'):
+        '''convert strings to float array in bulk, invalid values to nan'''
+        strings = np.asarray(values, dtype=object).astype(str)
+        if len(strings) == 0:
+            return np.array([], dtype=float)
+        if decimal != '.':
+            strings = np.char.replace(strings, decimal, '.')
+        strings[(strings == '') | (strings == 'None')] = 'nan'
+        try:
+            return strings.astype(float)
+        except ValueError:
+            pass
+
+        # convert per block, value by value only in blocks with invalid values
+        floats = np.empty(len(strings), dtype=float)
+        blocksize = 1024
+        for start in range(0, len(strings), blocksize):
+            block = strings[start: start + blocksize]
+            try:
+                floats[start: start + blocksize] = block.astype(float)
+            except ValueError:
+                floats[start: start + blocksize] = [
+                    np.nan if f is None else f
+                    for f in (cls.safe_float(v) for v in block)
+                    ]
+        return floats
+
+    @classmethod
+    def cast_array(cls, values, dtype, decimal):
+        '''cast array of strings to dtype'''
+        if dtype == 'float':
+            return cls.to_floats(values, decimal)
+        elif dtype == 'int':
+            return np.array([
+                cls.safe_int(v) if v is not None else None for v in values
+                ], dtype=object)
+        else:
+            return values
+
+
 class CSVBoreholeFile(CSVFile):
     _format = 'CSV Borehole'
     FieldNames = namedtuple('FieldNames',
@@ -133,61 +344,232 @@ class CSVBoreholeFile(CSVFile):
         log.debug('calculating depth from segments')
         return max(s.base for s in segments)
 
-    def to_boreholes(self, fieldnames, extra_fields=None):
+    def rows_to_table(self, rows, columns, fieldnames,
+            borehole_fields, segment_fields, final=True,
+            ):
+        '''convert rows to SegmentTable, returns table and rows of last
+        borehole to carry over if not final'''
+        def column(name, index=None):
+            if name not in columns:
+                values = np.full(len(rows), None, dtype=object)
+            else:
+                i = columns[name]
+                values = np.array([r[i] for r in rows], dtype=object)
+            if index is not None:
+                return values[index]
+            return values
+
+        # split boreholes at code changes
+        codes = column(fieldnames.code)
+        change = np.ones(len(codes), dtype=bool)
+        change[1:] = codes[1:] != codes[:-1]
+        starts = np.flatnonzero(change)
+        if final:
+            end = len(rows)
+        else:
+            end = starts[-1]
+            if end == 0:
+                return None, rows
+            starts = starts[:-1]
+        carry = rows[end:]
+        rows = rows[:end]
+
+        # skip boreholes without code
+        counts = np.diff(np.append(starts, end))
+        keep = np.array([c not in {None, ''} for c in codes[starts]],
+            dtype=bool)
+        rowindex = np.flatnonzero(np.repeat(keep, counts))
+        firstrows = starts[keep]
+        offsets = np.concatenate([[0], np.cumsum(counts[keep])])
+
+        # segments, top of first segment at 0 and base to next top
+        bases = self.to_floats(column(fieldnames.base, rowindex), self.decimal)
+        tops = np.empty_like(bases)
+        tops[1:] = bases[:-1]
+        tops[offsets[:-1]] = 0.
+        segments = {
+            'top': tops,
+            'base': bases,
+            'lithology': column(fieldnames.lithology, rowindex),
+            'sandmedianclass': column(fieldnames.sandmedianclass, rowindex),
+            }
+        for field in segment_fields:
+            if field['fieldname'] not in columns:
+                continue
+            segments[field['name']] = self.cast_array(
+                column(field['fieldname'], rowindex),
+                dtype=field['dtype'],
+                decimal=self.decimal,
+                )
+
+        # boreholes from first row
+        boreholes = {
+            'code': np.array([str(c) for c in codes[firstrows]],
+                dtype=object),
+            'x': self.to_floats(column(fieldnames.x, firstrows), self.decimal),
+            'y': self.to_floats(column(fieldnames.y, firstrows), self.decimal),
+            'z': self.to_floats(column(fieldnames.z, firstrows), self.decimal),
+            }
+        if fieldnames.depth in columns:
+            boreholes['depth'] = self.to_floats(
+                column(fieldnames.depth, firstrows), self.decimal)
+        elif len(firstrows) > 0:
+            log.debug('calculating depth from segments')
+            boreholes['depth'] = np.fmax.reduceat(bases, offsets[:-1])
+        else:
+            boreholes['depth'] = np.array([], dtype=float)
+        for field in borehole_fields:
+            if field['fieldname'] not in columns:
+                continue
+            boreholes[field['name']] = self.cast_array(
+                column(field['fieldname'], firstrows),
+                dtype=field['dtype'],
+                decimal=self.decimal,
+                )
+
+        table = SegmentTable(boreholes, segments, offsets, attrs=self.attrs)
+        return table, carry
+
+    def read_table(self, fieldnames, extra_fields=None, chunksize=100000):
+        '''read selected columns as SegmentTable per chunk of rows, rows
+        of the last borehole in a chunk are carried over to the next'''
         fieldnames = self.FieldNames(**fieldnames)
         extra_fields = extra_fields or {}
         borehole_fields = extra_fields.get('borehole') or []
         segment_fields = extra_fields.get('segments') or []
 
-        log.debug('reading {s.file.name:}'.format(s=self))
-        with open(self.file, 'r') as f:
-            reader = csv.DictReader(f, delimiter=self.delimiter)
-            bycode = lambda r: r[fieldnames.code]
-            for code, rows in groupby(reader, key=bycode):
-                if code in {None, ''}:
-                    continue
+        log.debug('reading {s.file.name:} in chunks'.format(s=self))
+        with utils.open_source(self.file, 'r') as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = {name: i for i, name in enumerate(header)}
+            width = len(header)
+            carry = []
+            while True:
+                chunk = list(islice(reader, chunksize))
+
+                # pad short rows with None, like DictReader
+                lengths = np.fromiter(map(len, chunk), dtype=int,
+                    count=len(chunk))
+                for i in np.flatnonzero(lengths < width):
+                    chunk[i] = chunk[i] + [None] * (width - lengths[i])
+
+                final = len(chunk) < chunksize
+                rows = carry + chunk
+                if len(rows) == 0:
+                    break
+                table, carry = self.rows_to_table(rows, columns, fieldnames,
+                    borehole_fields, segment_fields,
+                    final=final,
+                    )
+                if table is not None:
+                    yield table
+                if final:
+                    break
 
-                # materialize rows
-                rows = [r for r in rows]
+    def to_segment_table(self, fieldnames, extra_fields=None,
+            chunksize=100000,
+            ):
+        '''read file as single SegmentTable'''
+        return SegmentTable.concatenate(self.read_table(fieldnames,
+            extra_fields=extra_fields,
+            chunksize=chunksize,
+            ))
+
+    def to_boreholes(self, fieldnames, extra_fields=None,
+            columnar=False, chunksize=100000,
+            grouping='sorted', memory_mb=256, ranges=None, predicate=None,
+            ):
+        '''yield Borehole for each code, boreholes rejected by predicate on
+        their first row are skipped before segments are read'''
+        if columnar and (ranges is not None):
+            columnar = False
+        if columnar and (grouping != 'sorted'):
+            log.warning((
+                'columnar reading requires sorted input, '
+                'reading {s.file.name:} by row').format(s=self))
+            columnar = False
+        if columnar:
+            for table in self.read_table(fieldnames,
+                    extra_fields=extra_fields,
+                    chunksize=chunksize,
+                    ):
+                if predicate is not None:
+                    table = predicate.select(table)
+                for borehole in table.to_boreholes():
+                    yield borehole
+            return
 
-                # code
-                code = str(code)
+        fieldnames = self.FieldNames(**fieldnames)
+        extra_fields = extra_fields or {}
+        borehole_fields = extra_fields.get('borehole') or []
+        segment_fields = extra_fields.get('segments') or []
 
-                # segments as list
-                segments = [
-                    s for s in self.read_segments(rows,
+        log.debug('reading {s.file.name:}'.format(s=self))
+        for code, rows in self.read_groups(fieldnames.code,
+                grouping=grouping,
+                memory_mb=memory_mb,
+                ranges=ranges,
+                ):
+            if code in {None, ''}:
+                continue
+
+            # materialize rows
+            rows = [r for r in rows]
+
+            # code
+            code = str(code)
+
+            # x, y, z
+            x = self.safe_float(rows[0][fieldnames.x], self.decimal)
+            y = self.safe_float(rows[0][fieldnames.y], self.decimal)
+            z = self.safe_float(rows[0][fieldnames.z], self.decimal)
+
+            # extra fields
+            for field in borehole_fields:
+                value = rows[0].get(field['fieldname'])
+                if value is not None:
+                    self.attrs[field['name']] = self.cast(value,
+                        dtype=field['dtype'],
                         decimal=self.decimal,
-                        fieldnames=fieldnames,
-                        fields=segment_fields,
                         )
-                    ]
-
-                # depth
-                if fieldnames.depth in rows[0]:
-                    depth = self.safe_float(rows[0][fieldnames.depth],
-                        self.decimal)
-                else:
-                    depth = self.depth_from_segments(segments)
 
-                # x, y, z
-                x = self.safe_float(rows[0][fieldnames.x], self.decimal)
-                y = self.safe_float(rows[0][fieldnames.y], self.decimal)
-                z = self.safe_float(rows[0][fieldnames.z], self.decimal)
-
-                # extra fields
-                for field in borehole_fields:
-                    value = rows[0].get(field['fieldname'])
-                    if value is not None:
-                        self.attrs[field['name']] = self.cast(value,
-                            dtype=field['dtype'],
-                            decimal=self.decimal,
-                            )
-
-                yield Borehole(code, depth,
-                    x=x, y=y, z=z,
-                    segments=segments,
-                    **self.attrs,
+            # depth
+            if fieldnames.depth in rows[0]:
+                depth = self.safe_float(rows[0][fieldnames.depth],
+                    self.decimal)
+            else:
+                depth = None
+
+            # skip segments if rejected on first row
+            if (predicate is not None) and not predicate.accepts(
+                    code=code, x=x, y=y,
+                    quality=self.attrs.get('quality'),
+                    **({'depth': depth} if depth is not None else {})
+                    ):
+                continue
+
+            # segments as list
+            segments = [
+                s for s in self.read_segments(rows,
+                    decimal=self.decimal,
+                    fieldnames=fieldnames,
+                    fields=segment_fields,
                     )
+                ]
+            if depth is None:
+                depth = self.depth_from_segments(segments)
+                if (predicate is not None) and not predicate.accepts_depth(
+                        depth):
+                    continue
+
+            yield Borehole(code, depth,
+                x=x, y=y, z=z,
+                segments=segments,
+                **self.attrs,
+                )
 
 
 class CSVPointFile(CSVFile):
@@ -197,49 +579,56 @@ class CSVPointFile(CSVFile):
             'code', 'x', 'y', 'z', 'top', 'base',
             )
         )
-    def to_points(self, fieldnames, valuefields=None):
+    def to_points(self, fieldnames, valuefields=None,
+            grouping='sorted', memory_mb=256, predicate=None,
+            ):
         fieldnames = self.FieldNames(**fieldnames)
         valuefields = valuefields or []
 
         log.debug('reading {s.file.name:}'.format(s=self))
-        with open(self.file, 'r') as f:
-            reader = csv.DictReader(f, delimiter=self.delimiter)
-            bycode = lambda r: r[fieldnames.code]
-            for code, rows in groupby(reader, key=bycode):
-                if code in {None, ''}:
+        for code, rows in self.read_groups(fieldnames.code,
+                grouping=grouping,
+                memory_mb=memory_mb,
+                ):
+            if code in {None, ''}:
+                continue
+
+            # code
+            code = str(code)
+            if (predicate is not None) and not predicate.accepts_code(code):
+                continue
+
+            for row in rows:
+                # x, y, z
+                x = self.safe_float(row[fieldnames.x], self.decimal)
+                y = self.safe_float(row[fieldnames.y], self.decimal)
+                if (predicate is not None) and not predicate.accepts_location(
+                        x, y):
                     continue
+                z = self.safe_float(row[fieldnames.z], self.decimal)
 
-                # code
-                code = str(code)
-
-                for row in rows:
-                    # x, y, z
-                    x = self.safe_float(row[fieldnames.x], self.decimal)
-                    y = self.safe_float(row[fieldnames.y], self.decimal)
-                    z = self.safe_float(row[fieldnames.z], self.decimal)
-
-                    top = self.safe_float(row[fieldnames.top], self.decimal)
-                    base = self.safe_float(row[fieldnames.base], self.decimal)
-
-                    values = []
-                    for field in valuefields:
-                        value = row.get(field['fieldname'])
-                        if value is not None:
-                            values.append({
-                                'name': field['name'],
-                                'value': self.cast(value,
-                                    dtype=field['dtype'],
-                                    decimal=self.decimal,
-                                    ),
-                                'dtype': field['dtype'],
-                                'format': field['format'],
-                                })
-
-                    yield Point(code,
-                        x=x, y=y, z=z,
-                        top=top, base=base,
-                        values=values,
-                        )
+                top = self.safe_float(row[fieldnames.top], self.decimal)
+                base = self.safe_float(row[fieldnames.base], self.decimal)
+
+                values = []
+                for field in valuefields:
+                    value = row.get(field['fieldname'])
+                    if value is not None:
+                        values.append({
+                            'name': field['name'],
+                            'value': self.cast(value,
+                                dtype=field['dtype'],
+                                decimal=self.decimal,
+                                ),
+                            'dtype': field['dtype'],
+                            'format': field['format'],
+                            })
+
+                yield Point(code,
+                    x=x, y=y, z=z,
+                    top=top, base=base,
+                    values=values,
+                    )
 
 
 class CSVWellFile(CSVFile):
@@ -249,11 +638,11 @@ class CSVWellFile(CSVFile):
             'code', 'x', 'y', 'z', 'filtertoplevel', 'filterbottomlevel', 'filtersegment_toplevel', 'filtersegment_bottomlevel', 'location'
             )
         )
-    def to_wells(self, fieldnames, nsegments=0):
+    def to_wells(self, fieldnames, nsegments=0, predicate=None):
         fieldnames = self.FieldNames(**fieldnames)
 
         log.debug('reading {s.file.name:}'.format(s=self))
-        with open(self.file, 'r') as f:
+        with utils.open_source(self.file, 'r') as f:
             reader = csv.DictReader(f, delimiter=self.delimiter)
 
             for row in reader:
@@ -264,6 +653,9 @@ class CSVWellFile(CSVFile):
                 # x, y, z
                 x = self.safe_float(row[fieldnames.x], self.decimal)
                 y = self.safe_float(row[fieldnames.y], self.decimal)
+                if (predicate is not None) and not predicate.accepts(
+                        code=code, x=x, y=y):
+                    continue
                 z = self.safe_float(row[fieldnames.z], self.decimal)
 
                 filtertoplevel = self.safe_float(row[fieldnames.filtertoplevel], self.decimal)
@@ -287,7 +679,11 @@ class CSVWellFile(CSVFile):
                     )
 
 
-def boreholes_to_csv(boreholes, csvfile, extra_fields=None):
+def boreholes_to_csv(boreholes, csvfile, extra_fields=None,
+        compress=None, batchsize=10000,
+        ):
+    '''write row per segment, boreholes may include SegmentTable, output
+    is gzip compressed if compress is True or csvfile ends with .gz'''
     log.info('writing to {f:}'.format(f=os.path.basename(csvfile)))
     extra_fields = extra_fields or {}
     borehole_fields = (
@@ -296,41 +692,32 @@ def boreholes_to_csv(boreholes, csvfile, extra_fields=None):
     segment_fields = (
         Segment.fieldnames + (extra_fields.get('segments') or ())
         )
-    with utils.careful_open(csvfile, 'w') as f:
-        writer = csv.DictWriter(f,
-            fieldnames=borehole_fields + segment_fields,
-            lineterminator='\n',
-            extrasaction='ignore',
+    with TableFile(csvfile, compress=compress) as f:
+        writer = TableWriter(f, borehole_fields, segment_fields,
+            batchsize=batchsize,
             )
         writer.writeheader()
-        for borehole in boreholes:
-            for segment in borehole:
-                row = borehole.as_dict(borehole_fields)
-                row.update(segment.as_dict(segment_fields))
-                writer.writerow(row)
+        writer.write(boreholes)
 
 
-def cross_section_to_csv(cs, csvfile, extra_fields=None):
+def cross_section_to_csv(cs, csvfile, extra_fields=None,
+        compress=None, batchsize=10000,
+        ):
     log.info('writing to {f:}'.format(f=os.path.basename(csvfile)))
+    extra_fields = extra_fields or {}
     borehole_fields = (
         Borehole.fieldnames + (extra_fields.get('borehole') or ())
         )
     segment_fields = (
         Segment.fieldnames + (extra_fields.get('segments') or ())
         )
-    fieldnames = ('label', 'distance') + borehole_fields + segment_fields
-    with utils.careful_open(csvfile, 'w') as f:
-        writer = csv.DictWriter(f,
-            fieldnames=fieldnames,
-            lineterminator='\n',
-            extrasaction='ignore',
+    with TableFile(csvfile, compress=compress) as f:
+        writer = TableWriter(f, borehole_fields, segment_fields,
+            prefix_fields=('label', 'distance'),
+            batchsize=batchsize,
             )
         writer.writeheader()
         cs.sort()
         for distance, borehole in cs.boreholes:
-            for segment in borehole:
-                row = {'label': cs.label, 'distance': distance}
-                row.update(borehole.as_dict(borehole_fields))
-                row.update(segment.as_dict(segment_fields))
-                writer.writerow(row)
-
+            writer.write_borehole(borehole, prefix=(cs.label, distance))
+        writer.flush()
@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.csvfiles import CSVBoreholeFile
+from xsboringen.predicate import Predicate
+
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import logging
+import sqlite3
+import json
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+INDEX_VERSION = 1
+
+# size of blocks at start and end of file included in checksum
+CHECKSUM_BLOCKSIZE = 1024 ** 2
+
+
+def boreholes_from_csvindex(csvfile,
+        fieldnames=None, extra_fields=None,
+        delimiter=',', decimal='.',
+        codes=None, bbox=None, indexfile=None, predicate=None,
+        ):
+    '''read boreholes selected by code or bbox from CSV file, seeking to
+    byte ranges in index, index is (re)built if not valid, other parts of
+    predicate are checked on first row of each borehole, index is stored
+    in indexfile or next to CSV file if None'''
+    predicate = Predicate.from_spec(predicate, codes=codes, bbox=bbox)
+    with CSVIndex(csvfile, fieldnames,
+            delimiter=delimiter,
+            decimal=decimal,
+            indexfile=indexfile,
+            ) as index:
+        index.update()
+        if predicate is not None:
+            ranges = index.select(codes=predicate.codes, bbox=predicate.bbox)
+        else:
+            ranges = index.select()
+    csv_ = CSVBoreholeFile(csvfile,
+        delimiter=delimiter,
+        decimal=decimal,
+        )
+    for borehole in csv_.to_boreholes(fieldnames, extra_fields,
+            ranges=ranges,
+            predicate=predicate,
+            ):
+        if borehole is not None:
+            yield borehole
+
+
+def checksum(csvfile, blocksize=CHECKSUM_BLOCKSIZE):
+    '''checksum of file from size, modification time and first and last
+    block, without reading the whole file'''
+    stat = os.stat(csvfile)
+    sha1 = hashlib.sha1()
+    sha1.update('{s.st_size:d} {s.st_mtime_ns:d}'.format(s=stat).encode())
+    with open(csvfile, 'rb') as f:
+        sha1.update(f.read(blocksize))
+        if stat.st_size > 2 * blocksize:
+            f.seek(-blocksize, os.SEEK_END)
+            sha1.update(f.read(blocksize))
+        else:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def max_or_none(a, b):
+    '''maximum of two values, ignoring None'''
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+class CSVIndex(object):
+    '''Index of byte range, location and depth of each borehole in CSV file,
+    valid as long as checksum and reading options match, stored in
+    indexfile with {name} replaced by name of CSV file, or in sidecar
+    <csvfile>.idx if indexfile is None'''
+    def __init__(self, csvfile, fieldnames,
+            delimiter=',', decimal='.', indexfile=None,
+            ):
+        self.csvfile = Path(csvfile).resolve()
+        if indexfile is None:
+            indexfile = self.csvfile.with_name(self.csvfile.name + '.idx')
+        else:
+            indexfile = str(indexfile).format(name=self.csvfile.name)
+        self.file = Path(indexfile)
+        self.fieldnames = CSVBoreholeFile.FieldNames(**fieldnames)
+        self.delimiter = delimiter
+        self.decimal = decimal
+
+        self.connection = sqlite3.connect(str(self.file))
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+            )
+        self.connection.execute((
+            'CREATE TABLE IF NOT EXISTS ranges ('
+            'code TEXT, '
+            'start INTEGER, '
+            'end INTEGER, '
+            'x REAL, '
+            'y REAL, '
+            'depth REAL)'
+            ))
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS ranges_code ON ranges (code)'
+            )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS ranges_xy ON ranges (x, y)'
+            )
+        self.connection.commit()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file={s.file.name:}, '
+                'ranges={n:d})').format(s=self, n=len(self))
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM ranges').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def settings(self):
+        '''reading options stored with index'''
+        return json.dumps({
+            'version': INDEX_VERSION,
+            'fieldnames': self.fieldnames._asdict(),
+            'delimiter': self.delimiter,
+            'decimal': self.decimal,
+            }, sort_keys=True)
+
+    def meta(self):
+        return dict(self.connection.execute('SELECT key, value FROM meta'))
+
+    def is_valid(self):
+        '''index matches checksum of CSV file and reading options'''
+        meta = self.meta()
+        return (
+            (meta.get('settings') == self.settings) and
+            (meta.get('checksum') == checksum(self.csvfile))
+            )
+
+    def update(self):
+        '''build index if not valid, returns True if index was built'''
+        if self.is_valid():
+            return False
+        self.build()
+        return True
+
+    def scan(self):
+        '''yield code, byte range, x, y and depth of each run of rows with
+        the same code'''
+        csv_ = CSVBoreholeFile(self.csvfile,
+            delimiter=self.delimiter,
+            decimal=self.decimal,
+            )
+        fieldnames = self.fieldnames
+        with open(self.csvfile, 'rb') as f:
+            line = f.readline()
+            header = csv_.parse_line(line)
+            depth_from_base = fieldnames.depth not in header
+            offset = len(line)
+            current = None
+            for line in f:
+                row = csv_.row_to_dict(header, csv_.parse_line(line))
+                value = lambda name: csv_.safe_float(row.get(name) or '',
+                    self.decimal)
+                code = row.get(fieldnames.code)
+                if (current is not None) and (code == current[0]):
+                    current[2] = offset + len(line)
+                    if depth_from_base:
+                        current[5] = max_or_none(
+                            current[5], value(fieldnames.base))
+                else:
+                    if current is not None:
+                        yield tuple(current)
+                    if code in {None, ''}:
+                        current = None
+                    else:
+                        if depth_from_base:
+                            depth = value(fieldnames.base)
+                        else:
+                            depth = value(fieldnames.depth)
+                        current = [code, offset, offset + len(line),
+                            value(fieldnames.x), value(fieldnames.y), depth,
+                            ]
+                offset += len(line)
+            if current is not None:
+                yield tuple(current)
+
+    def build(self):
+        '''scan CSV file and store byte ranges'''
+        log.info('indexing {f:}'.format(f=self.csvfile.name))
+        self.connection.execute('DELETE FROM ranges')
+        self.connection.execute('DELETE FROM meta')
+        self.connection.executemany((
+            'INSERT INTO ranges (code, start, end, x, y, depth) '
+            'VALUES (?, ?, ?, ?, ?, ?)'),
+            self.scan(),
+            )
+        self.connection.executemany(
+            'INSERT INTO meta (key, value) VALUES (?, ?)',
+            [
+                ('settings', self.settings),
+                ('checksum', checksum(self.csvfile)),
+                ],
+            )
+        self.connection.commit()
+        log.debug('indexed {n:d} ranges'.format(n=len(self)))
+
+    def select(self, codes=None, bbox=None):
+        '''byte ranges per code for codes and boreholes inside bbox
+        (xmin, ymin, xmax, ymax), as list of code and ranges in file order'''
+        query = 'SELECT ranges.code, start, end FROM ranges'
+        conditions = []
+        parameters = []
+        if codes is not None:
+            # codes in temporary table, no limit on number of parameters
+            self.connection.execute((
+                'CREATE TEMP TABLE IF NOT EXISTS selected ('
+                'code TEXT PRIMARY KEY)'
+                ))
+            self.connection.execute('DELETE FROM selected')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO selected (code) VALUES (?)',
+                ((str(c),) for c in codes),
+                )
+            query += ' JOIN selected ON selected.code = ranges.code'
+        if bbox is not None:
+            conditions.append('x >= ? AND y >= ? AND x <= ? AND y <= ?')
+            parameters.extend(bbox)
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY start'
+
+        # all ranges of a code from first range in file
+        selected = OrderedDict()
+        for code, start, end in self.connection.execute(query, parameters):
+            selected.setdefault(code, []).append((start, end))
+        log.debug('selected {n:d} boreholes from index'.format(
+            n=len(selected)))
+        return list(selected.items())
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,489 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole, LazyMixin, Segment, Vertical, nan_to_none
+from xsboringen.cache import state
+from xsboringen.cpt import CPT
+from xsboringen.point import Point
+from xsboringen.predicate import Predicate
+from xsboringen.well import Well, FilterSegment
+from xsboringen import utils
+
+from shapely.geometry import Point as ShapelyPoint
+
+import numpy as np
+
+from pathlib import Path
+import logging
+import sqlite3
+import json
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+DATABASE_VERSION = 1
+
+# core attributes stored in columns, other attributes as json
+BOREHOLE_COLUMNS = 'code', 'depth', 'x', 'y', 'z'
+SEGMENT_COLUMNS = 'top', 'base', 'lithology', 'sandmedianclass'
+
+TABLES = (
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    (
+        'CREATE TABLE IF NOT EXISTS files ('
+        'id INTEGER PRIMARY KEY, '
+        'path TEXT UNIQUE, '
+        'kind TEXT, '
+        'size INTEGER, '
+        'mtime INTEGER, '
+        'options TEXT)'
+        ),
+    (
+        'CREATE TABLE IF NOT EXISTS boreholes ('
+        'id INTEGER PRIMARY KEY, '
+        'file_id INTEGER, '
+        'class TEXT, '
+        'code TEXT, '
+        'x REAL, '
+        'y REAL, '
+        'z REAL, '
+        'depth REAL, '
+        'quality TEXT, '
+        'format TEXT, '
+        'attrs TEXT)'
+        ),
+    (
+        'CREATE TABLE IF NOT EXISTS segments ('
+        'borehole_id INTEGER, '
+        'seq INTEGER, '
+        'top REAL, '
+        'base REAL, '
+        'lithology TEXT, '
+        'sandmedianclass TEXT, '
+        'attrs TEXT)'
+        ),
+    (
+        'CREATE TABLE IF NOT EXISTS verticals ('
+        'borehole_id INTEGER, '
+        'name TEXT, '
+        'depth BLOB, '
+        '"values" BLOB)'
+        ),
+    (
+        'CREATE TABLE IF NOT EXISTS wells ('
+        'id INTEGER PRIMARY KEY, '
+        'file_id INTEGER, '
+        'code TEXT, '
+        'x REAL, '
+        'y REAL, '
+        'z REAL, '
+        'filtertoplevel REAL, '
+        'filterbottomlevel REAL, '
+        'location TEXT, '
+        'filtersegments TEXT)'
+        ),
+    (
+        'CREATE TABLE IF NOT EXISTS points ('
+        'id INTEGER PRIMARY KEY, '
+        'file_id INTEGER, '
+        'code TEXT, '
+        'x REAL, '
+        'y REAL, '
+        'z REAL, '
+        'top REAL, '
+        'base REAL, '
+        '"values" TEXT)'
+        ),
+    'CREATE INDEX IF NOT EXISTS boreholes_file ON boreholes (file_id)',
+    'CREATE INDEX IF NOT EXISTS boreholes_code ON boreholes (code)',
+    'CREATE INDEX IF NOT EXISTS segments_borehole ON segments (borehole_id)',
+    'CREATE INDEX IF NOT EXISTS verticals_borehole ON verticals (borehole_id)',
+    'CREATE INDEX IF NOT EXISTS wells_file ON wells (file_id)',
+    'CREATE INDEX IF NOT EXISTS points_file ON points (file_id)',
+    )
+
+# spatial tables with R-tree index on x, y
+SPATIAL_TABLES = 'boreholes', 'wells', 'points'
+
+
+def boreholes_from_database(dbfile, bbox=None, polygon=None, codes=None,
+        min_depth=None, quality=None, predicate=None,
+        ):
+    '''read boreholes and CPT's from database, selected by location, code,
+    minimum depth and quality'''
+    predicate = Predicate.from_spec(predicate,
+        bbox=bbox,
+        polygon=polygon,
+        codes=codes,
+        min_depth=min_depth,
+        quality=quality,
+        )
+    selection = predicate.as_dict() if predicate is not None else {}
+    with BoreholeDatabase(dbfile) as database:
+        for borehole in database.boreholes(**selection):
+            yield borehole
+
+
+def points_from_database(dbfile, bbox=None, polygon=None, codes=None,
+        predicate=None,
+        ):
+    predicate = Predicate.from_spec(predicate,
+        bbox=bbox, polygon=polygon, codes=codes,
+        )
+    selection = predicate.spatial_dict() if predicate is not None else {}
+    with BoreholeDatabase(dbfile) as database:
+        for point in database.points(**selection):
+            yield point
+
+
+def wells_from_database(dbfile, bbox=None, polygon=None, codes=None,
+        predicate=None,
+        ):
+    predicate = Predicate.from_spec(predicate,
+        bbox=bbox, polygon=polygon, codes=codes,
+        )
+    selection = predicate.spatial_dict() if predicate is not None else {}
+    with BoreholeDatabase(dbfile) as database:
+        for well in database.wells(**selection):
+            yield well
+
+
+def to_blob(values):
+    '''list of floats with None as float64 bytes'''
+    if values is None:
+        return None
+    return np.array(
+        [np.nan if v is None else v for v in values], dtype=np.float64,
+        ).tobytes()
+
+
+def from_blob(blob):
+    '''float64 bytes as list of floats with None'''
+    if blob is None:
+        return None
+    return nan_to_none(np.frombuffer(blob, dtype=np.float64))
+
+
+def extra_attrs(an_object, columns):
+    '''json of attributes not stored in columns'''
+    return json.dumps({
+        k: v for k, v in vars(an_object).items()
+        if k not in columns
+        }, default=str)
+
+
+class BoreholeDatabase(object):
+    '''Local SQLite database of boreholes, segments, verticals, wells and
+    points with R-tree index on location, updated incrementally per source
+    file by size and modification time'''
+    def __init__(self, dbfile):
+        self.file = Path(dbfile)
+        if not self.file.parent.exists():
+            self.file.parent.mkdir(parents=True)
+        self.connection = sqlite3.connect(str(self.file))
+        for statement in TABLES:
+            self.connection.execute(statement)
+        for table in SPATIAL_TABLES:
+            self.connection.execute((
+                'CREATE VIRTUAL TABLE IF NOT EXISTS {t:}_rtree '
+                'USING rtree(id, xmin, xmax, ymin, ymax)').format(t=table)
+                )
+        self.connection.execute(
+            'INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+            ('version', str(DATABASE_VERSION)),
+            )
+        self.connection.commit()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file={s.file.name:}, '
+                'boreholes={n:d})').format(s=self, n=self.count('boreholes'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def count(self, table):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM {t:}'.format(t=table)).fetchone()[0]
+
+    @staticmethod
+    def stamp(task):
+        '''path, size, modification time and reader options of task file'''
+        path = str(utils.source_path(task.file))
+        stat = utils.source_stat(task.file)
+        options = json.dumps(
+            ['{r.__module__:}.{r.__name__:}'.format(r=task.reader),
+             task.options],
+            sort_keys=True,
+            default=state,
+            )
+        return path, stat.st_size, stat.st_mtime_ns, options
+
+    def stale(self, tasks):
+        '''tasks of files that are new or changed since last ingest'''
+        stamps = {
+            p: (s, m, o) for p, s, m, o in self.connection.execute(
+                'SELECT path, size, mtime, options FROM files')
+            }
+        stale = []
+        for task in tasks:
+            path, *stamp = self.stamp(task)
+            if stamps.get(path) != tuple(stamp):
+                stale.append(task)
+        return stale
+
+    def delete_file(self, path):
+        '''delete file and all objects read from it'''
+        row = self.connection.execute(
+            'SELECT id FROM files WHERE path = ?', (path, )).fetchone()
+        if row is None:
+            return
+        file_id, = row
+        ids = [
+            (i, ) for i, in self.connection.execute(
+                'SELECT id FROM boreholes WHERE file_id = ?', (file_id, ))
+            ]
+        self.connection.executemany(
+            'DELETE FROM segments WHERE borehole_id = ?', ids)
+        self.connection.executemany(
+            'DELETE FROM verticals WHERE borehole_id = ?', ids)
+        for table in SPATIAL_TABLES:
+            self.connection.execute((
+                'DELETE FROM {t:}_rtree WHERE id IN '
+                '(SELECT id FROM {t:} WHERE file_id = ?)').format(t=table),
+                (file_id, ))
+            self.connection.execute(
+                'DELETE FROM {t:} WHERE file_id = ?'.format(t=table),
+                (file_id, ))
+        self.connection.execute('DELETE FROM files WHERE id = ?', (file_id, ))
+
+    def store(self, task, kind, objects):
+        '''replace objects read from task file, kind is boreholes, wells or
+        points'''
+        path, size, mtime, options = self.stamp(task)
+        self.delete_file(path)
+        cursor = self.connection.execute((
+            'INSERT INTO files (path, kind, size, mtime, options) '
+            'VALUES (?, ?, ?, ?, ?)'),
+            (path, kind, size, mtime, options),
+            )
+        file_id = cursor.lastrowid
+        insert = {
+            'boreholes': self.insert_borehole,
+            'wells': self.insert_well,
+            'points': self.insert_point,
+            }[kind]
+        for an_object in objects:
+            object_id = insert(file_id, an_object)
+            if (an_object.x is not None) and (an_object.y is not None):
+                self.connection.execute((
+                    'INSERT INTO {t:}_rtree (id, xmin, xmax, ymin, ymax) '
+                    'VALUES (?, ?, ?, ?, ?)').format(t=kind),
+                    (object_id, an_object.x, an_object.x,
+                     an_object.y, an_object.y),
+                    )
+        self.connection.commit()
+
+    def insert_borehole(self, file_id, borehole):
+        cursor = self.connection.execute((
+            'INSERT INTO boreholes '
+            '(file_id, class, code, x, y, z, depth, quality, format, attrs) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'),
+            (file_id, 'CPT' if isinstance(borehole, CPT) else 'Borehole',
+             borehole.code,
+             borehole.x, borehole.y, borehole.z, borehole.depth,
+             getattr(borehole, 'quality', None),
+             getattr(borehole, 'format', None),
+             extra_attrs(borehole,
+                BOREHOLE_COLUMNS + ('segments', 'verticals') +
+                LazyMixin.state_attrs),
+             ),
+            )
+        borehole_id = cursor.lastrowid
+        self.connection.executemany((
+            'INSERT INTO segments '
+            '(borehole_id, seq, top, base, lithology, sandmedianclass, attrs) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)'),
+            [
+                (borehole_id, i, s.top, s.base, s.lithology,
+                 s.sandmedianclass, extra_attrs(s, SEGMENT_COLUMNS))
+                for i, s in enumerate(borehole.segments)
+                ],
+            )
+        self.connection.executemany((
+            'INSERT INTO verticals (borehole_id, name, depth, "values") '
+            'VALUES (?, ?, ?, ?)'),
+            [
+                (borehole_id, name, to_blob(v.depth), to_blob(v.values))
+                for name, v in borehole.verticals.items()
+                ],
+            )
+        return borehole_id
+
+    def insert_well(self, file_id, well):
+        cursor = self.connection.execute((
+            'INSERT INTO wells '
+            '(file_id, code, x, y, z, filtertoplevel, filterbottomlevel, '
+            'location, filtersegments) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'),
+            (file_id, well.code, well.x, well.y, well.z,
+             well.filtertoplevel, well.filterbottomlevel, well.location,
+             json.dumps([
+                [s.toplevel, s.bottomlevel] for s in well.filtersegments
+                ])),
+            )
+        return cursor.lastrowid
+
+    def insert_point(self, file_id, point):
+        cursor = self.connection.execute((
+            'INSERT INTO points '
+            '(file_id, code, x, y, z, top, base, "values") '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'),
+            (file_id, point.code, point.x, point.y, point.z,
+             point.top, point.base,
+             json.dumps([v._asdict() for v in point.values])),
+            )
+        return cursor.lastrowid
+
+    def prune(self):
+        '''remove files that no longer exist'''
+        missing = [
+            p for p, in self.connection.execute('SELECT path FROM files')
+            if not utils.source_exists(p)
+            ]
+        for path in missing:
+            self.delete_file(path)
+        self.connection.commit()
+        return len(missing)
+
+    def select(self, table, columns, bbox=None, polygon=None, codes=None,
+            conditions=None, parameters=None,
+            ):
+        '''rows of spatial table inside bbox and polygon, with codes and
+        additional conditions'''
+        conditions = list(conditions or [])
+        parameters = list(parameters or [])
+        polygon = utils.as_geometry(polygon)
+        bbox = utils.bounds(bbox, polygon)
+        query = 'SELECT {c:} FROM {t:} AS o'.format(
+            c=', '.join('o.{}'.format(c) for c in columns), t=table)
+        if bbox is not None:
+            query += ' JOIN {t:}_rtree AS r ON o.id = r.id'.format(t=table)
+            conditions.append(
+                'r.xmin >= ? AND r.xmax <= ? AND r.ymin >= ? AND r.ymax <= ?')
+            xmin, ymin, xmax, ymax = bbox
+            parameters.extend([xmin, xmax, ymin, ymax])
+        if codes is not None:
+            # codes in temporary table, no limit on number of parameters
+            self.connection.execute((
+                'CREATE TEMP TABLE IF NOT EXISTS selected_{t:} ('
+                'code TEXT PRIMARY KEY)'
+                ).format(t=table))
+            self.connection.execute('DELETE FROM selected_{t:}'.format(
+                t=table))
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO selected_{t:} (code) VALUES (?)'.format(
+                    t=table),
+                ((str(c),) for c in codes),
+                )
+            query += ' JOIN selected_{t:} AS s ON s.code = o.code'.format(
+                t=table)
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY o.id'
+        for row in self.connection.execute(query, parameters):
+            if (polygon is not None) and not polygon.intersects(
+                    ShapelyPoint(row[1], row[2])):
+                continue
+            yield row
+
+    def boreholes(self, bbox=None, polygon=None, codes=None,
+            min_depth=None, quality=None,
+            ):
+        '''yield Borehole or CPT with segments and verticals, boreholes
+        without quality pass quality selection'''
+        conditions = []
+        parameters = []
+        if min_depth is not None:
+            conditions.append('o.depth >= ?')
+            parameters.append(min_depth)
+        if quality is not None:
+            quality = list(quality)
+            conditions.append('(o.quality IS NULL OR o.quality IN ({}))'.format(
+                ', '.join('?' * len(quality))))
+            parameters.extend(quality)
+        rows = self.select('boreholes',
+            ('id', 'x', 'y', 'z', 'code', 'depth', 'class', 'attrs'),
+            bbox=bbox,
+            polygon=polygon,
+            codes=codes,
+            conditions=conditions,
+            parameters=parameters,
+            )
+        for borehole_id, x, y, z, code, depth, class_, attrs in rows:
+            segments = [
+                Segment(top, base, lithology, sandmedianclass,
+                    **json.loads(segment_attrs))
+                for top, base, lithology, sandmedianclass, segment_attrs in
+                self.connection.execute((
+                    'SELECT top, base, lithology, sandmedianclass, attrs '
+                    'FROM segments WHERE borehole_id = ? ORDER BY seq'),
+                    (borehole_id, ))
+                ]
+            verticals = {
+                name: Vertical(name, from_blob(depth_), from_blob(values))
+                for name, depth_, values in self.connection.execute((
+                    'SELECT name, depth, "values" FROM verticals '
+                    'WHERE borehole_id = ?'),
+                    (borehole_id, ))
+                }
+            cls = CPT if class_ == 'CPT' else Borehole
+            yield cls(code, depth,
+                x=x, y=y, z=z,
+                segments=segments,
+                verticals=verticals,
+                **json.loads(attrs),
+                )
+
+    def wells(self, bbox=None, polygon=None, codes=None):
+        rows = self.select('wells',
+            ('id', 'x', 'y', 'z', 'code', 'filtertoplevel',
+                'filterbottomlevel', 'location', 'filtersegments'),
+            bbox=bbox,
+            polygon=polygon,
+            codes=codes,
+            )
+        for (_, x, y, z, code, filtertoplevel, filterbottomlevel,
+                location, filtersegments) in rows:
+            yield Well(code,
+                x=x, y=y, z=z,
+                filtertoplevel=filtertoplevel,
+                filterbottomlevel=filterbottomlevel,
+                filtersegments=[
+                    FilterSegment(toplevel=t, bottomlevel=b)
+                    for t, b in json.loads(filtersegments)
+                    ],
+                location=location,
+                )
+
+    def points(self, bbox=None, polygon=None, codes=None):
+        rows = self.select('points',
+            ('id', 'x', 'y', 'z', 'code', 'top', 'base', '"values"'),
+            bbox=bbox,
+            polygon=polygon,
+            codes=codes,
+            )
+        for _, x, y, z, code, top, base, values in rows:
+            yield Point(code,
+                x=x, y=y, z=z,
+                top=top, base=base,
+                values=json.loads(values),
+                )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
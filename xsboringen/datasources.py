@@ -2,10 +2,21 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.csvfiles import boreholes_from_csv, points_from_csv, wells_from_csv
-from xsboringen.geffiles import boreholes_from_gef, cpts_from_gef
-from xsboringen.xmlfiles import boreholes_from_xml
+from xsboringen.archives import split_archive
+from xsboringen.cache import SourceCache
+from xsboringen.catalog import GefCatalog
+from xsboringen.csvfiles import boreholes_from_csvfile, points_from_csv, wells_from_csv
+from xsboringen.csvindex import boreholes_from_csvindex
+from xsboringen.database import boreholes_from_database, points_from_database, wells_from_database
+from xsboringen.discovery import Discovery
+from xsboringen.geffiles import boreholes_from_geffile, cpts_from_geffile
+from xsboringen.parallel import Executor
+from xsboringen.predicate import Predicate
+from xsboringen.prefetch import Prefetcher
+from xsboringen.verticalstore import cpts_from_store
+from xsboringen.xmlfiles import boreholes_from_xmlfile
 
+from collections import namedtuple
 from pathlib import Path
 from itertools import chain
 import logging
@@ -13,91 +24,400 @@ import os
 
 log = logging.getLogger(os.path.basename(__file__))
 
-def boreholes_from_sources(datasources, admixclassifier=None):
-    readers = []
-    for datasource in datasources:
-        if datasource['format'] == 'Dinoloket XML 1.4':
-            readers.append(boreholes_from_xml(
-                folder=Path(datasource['folder']),
-                version=1.4,
-                extra_fields=datasource.get('extra_fields'),
-                ))
-        elif datasource['format'] == 'CSV boringen':
-            readers.append(boreholes_from_csv(
-                folder=Path(datasource['folder']),
-                fieldnames=datasource['fieldnames'],
-                extra_fields=datasource.get('extra_fields'),
-                delimiter=datasource.get('delimiter', ','),
-                decimal=datasource.get('decimal', '.'),
-                ))
-        elif datasource['format'] == 'GEF boringen':
-            readers.append(boreholes_from_gef(
-                folder=Path(datasource['folder']),
-                classifier=admixclassifier,
-                fieldnames=datasource.get('fieldnames'),
-                ))
-        elif datasource['format'] == 'GEF boringen TNO':
-            readers.append(boreholes_from_gef(
-                folder=Path(datasource['folder']),
-                classifier=admixclassifier,
-                fieldnames=datasource.get('fieldnames'),
-                gef_format="tno",
-                ))
-        elif datasource['format'] == 'GEF sonderingen':
-            readers.append(cpts_from_gef(
-                folder=Path(datasource['folder']),
-                fieldnames=datasource.get('fieldnames'),
-                datacolumns=datasource['datacolumns'],
-                ))
-        else:
+# reading task for a single file, with size of file if known
+Task = namedtuple('Task', ['reader', 'file', 'options', 'size'],
+    defaults=[None],
+    )
+
+# readers of files small enough to be read ahead into memory
+PREFETCH_READERS = {
+    boreholes_from_geffile,
+    cpts_from_geffile,
+    boreholes_from_xmlfile,
+    }
+
+# readers of whole source files, cached without predicate so that cached
+# objects do not depend on selection, index-backed readers are not cached
+UNFILTERED_CACHE_READERS = {
+    boreholes_from_geffile,
+    cpts_from_geffile,
+    boreholes_from_xmlfile,
+    boreholes_from_csvfile,
+    }
+
+# readers returning boreholes and CPT's with header fields only if lazy
+LAZY_READERS = {
+    boreholes_from_geffile,
+    cpts_from_geffile,
+    boreholes_from_xmlfile,
+    }
+
+
+def borehole_tasks(datasource, admixclassifier=None,
+        catalog=None, predicate=None, discovery=None, lazy=False,
+        ):
+    '''yield reading task for each file in borehole datasource, with
+    predicate combined from argument and codes, min_depth and quality of
+    datasource passed on to reader, GEF files are selected by location
+    using catalog, files are streamed while discovery lists folders, GEF
+    and XML readers return lazy boreholes if lazy'''
+    if discovery is None:
+        discovery = Discovery()
+
+    # sizes of files listed by discovery, passed on to read-ahead
+    sizes = {}
+    def find(pattern):
+        folder = Path(datasource['folder'])
+        for entry in discovery.glob(folder, pattern):
+            sizes[str(entry.path)] = entry.size
+            yield entry.path
+    predicate = Predicate.from_spec(predicate,
+        codes=datasource.get('codes'),
+        min_depth=datasource.get('min_depth'),
+        quality=datasource.get('quality'),
+        )
+    if datasource['format'] == 'Dinoloket XML 1.4':
+        files = find('*1.4.xml')
+        reader = boreholes_from_xmlfile
+        options = {
+            'extra_fields': datasource.get('extra_fields'),
+            'backend': datasource.get('backend'),
+            }
+    elif datasource['format'] == 'CSV boringen':
+        files = find('*.csv')
+        reader = boreholes_from_csvfile
+        options = {
+            'fieldnames': datasource['fieldnames'],
+            'extra_fields': datasource.get('extra_fields'),
+            'delimiter': datasource.get('delimiter', ','),
+            'decimal': datasource.get('decimal', '.'),
+            'columnar': datasource.get('columnar', False),
+            'chunksize': datasource.get('chunksize', 100000),
+            'grouping': datasource.get('grouping', 'sorted'),
+            'memory_mb': datasource.get('memory_mb', 256),
+            }
+        folder = Path(datasource['folder'])
+        in_archive = split_archive(folder)[0] is not None
+        if datasource.get('index', False) and in_archive:
             log.warning((
-                'dataformat \'{fmt:}\' not supported, skipping').format(
-                    fmt=datasource['format'],
+                'no index of CSV files in archive {f:}, reading by scan'
+                ).format(f=folder))
+        elif datasource.get('index', False):
+            reader = boreholes_from_csvindex
+            options = {
+                'fieldnames': datasource['fieldnames'],
+                'extra_fields': datasource.get('extra_fields'),
+                'delimiter': datasource.get('delimiter', ','),
+                'decimal': datasource.get('decimal', '.'),
+                'indexfile': datasource.get('indexfile'),
+                }
+    elif datasource['format'] == 'GEF boringen':
+        files = find('*.gef')
+        reader = boreholes_from_geffile
+        options = {
+            'classifier': admixclassifier,
+            'fieldnames': datasource.get('fieldnames'),
+            }
+    elif datasource['format'] == 'GEF boringen TNO':
+        files = find('*.gef')
+        reader = boreholes_from_geffile
+        options = {
+            'classifier': admixclassifier,
+            'fieldnames': datasource.get('fieldnames'),
+            'gef_format': 'tno',
+            }
+    elif datasource['format'] == 'GEF sonderingen':
+        files = find('*.gef')
+        reader = cpts_from_geffile
+        options = {
+            'fieldnames': datasource.get('fieldnames'),
+            'datacolumns': datasource['datacolumns'],
+            }
+    elif datasource['format'] == 'Database':
+        files = [datasource['file']]
+        reader = boreholes_from_database
+        options = {}
+    elif datasource['format'] == 'CPT store':
+        files = [Path(datasource['folder'])]
+        reader = cpts_from_store
+        options = {}
+    else:
+        log.warning((
+            'dataformat \'{fmt:}\' not supported, skipping').format(
+                fmt=datasource['format'],
+                )
+            )
+        return
+
+    # selection applied by reader
+    if predicate is not None:
+        options['predicate'] = predicate
+
+    # segments and verticals read on first access
+    if lazy and (reader in LAZY_READERS):
+        options['lazy'] = True
+
+    # select GEF files by location from headers
+    is_gef = datasource['format'].startswith('GEF')
+    if (is_gef and (catalog is not None) and (predicate is not None) and
+            predicate.is_spatial):
+        files = catalog.select(files,
+            bbox=predicate.bbox,
+            polygon=predicate.polygon,
+            fieldnames=datasource.get('fieldnames'),
+            )
+
+    for file in files:
+        yield Task(reader, file, options, sizes.pop(str(file), None))
+
+
+def unfiltered(task):
+    '''task without predicate and predicate to apply after reading, for
+    readers of whole source files'''
+    predicate = task.options.get('predicate')
+    if (predicate is None) or (task.reader not in UNFILTERED_CACHE_READERS):
+        return task, None
+    options = {k: v for k, v in task.options.items() if k != 'predicate'}
+    return task._replace(options=options), predicate
+
+
+def read_task(task):
+    '''read all objects from file, return file, objects and error message'''
+    try:
+        objects = [o for o in task.reader(task.file, **task.options)]
+        return task.file, objects, None
+    except Exception as e:
+        return task.file, [], '{e.__class__.__name__:}: {e:}'.format(e=e)
+
+
+def read_tasks(tasks, n_jobs=1, ordered=True, queue_size=None, cache=None,
+        prefetch=0, prefetch_memory_mb=256, prefetch_max_file_mb=16,
+        ):
+    '''read files from tasks and yield objects, on a process pool if
+    n_jobs > 1, failure of a single file is reported and skipped, GEF and
+    XML files up to prefetch_max_file_mb are read ahead into memory if
+    prefetch > 0 and files are parsed in this process without cache, except
+    for lazy reading of headers only, files are cached unfiltered and
+    predicate is applied after cache lookup, databases and stores are read
+    without cache'''
+    failed = 0
+    if (n_jobs > 1) or (cache is not None):
+        # predicates applied after cache lookup, per file
+        predicates = {}
+        if cache is not None:
+            def split(task):
+                task, predicate = unfiltered(task)
+                if predicate is not None:
+                    predicates[str(task.file)] = predicate
+                return task
+            tasks = (split(t) for t in tasks)
+
+        # keys of files not found in cache
+        keys = {}
+        def resolve(task):
+            if task.reader not in UNFILTERED_CACHE_READERS:
+                return None
+            key = cache.key(task)
+            objects = cache.get(key)
+            if objects is None:
+                keys[str(task.file)] = key
+                return None
+            return task.file, objects, None
+
+        executor = Executor(n_jobs=n_jobs, backend='processes')
+        try:
+            for file, objects, error in executor.imap(read_task, tasks,
+                    ordered=ordered,
+                    queue_size=queue_size,
+                    resolve=resolve if cache is not None else None,
+                    ):
+                key = keys.pop(str(file), None)
+                predicate = predicates.pop(str(file), None)
+                if error is not None:
+                    log_failure(file, error)
+                    failed += 1
+                elif key is not None:
+                    cache.put(key, file, objects)
+                for an_object in objects:
+                    if (predicate is None) or predicate.accepts_borehole(
+                            an_object):
+                        yield an_object
+        finally:
+            executor.close()
+    else:
+        if prefetch > 0:
+            prefetcher = Prefetcher(depth=prefetch,
+                memory_mb=prefetch_memory_mb,
+                max_file_mb=prefetch_max_file_mb,
+                )
+            prefetchable = lambda t: (
+                t.file
+                if (t.reader in PREFETCH_READERS) and
+                    not t.options.get('lazy', False)
+                else None
+                )
+            tasks = (
+                t._replace(file=b) if b is not None else t
+                for t, b in prefetcher.imap(tasks,
+                    source=prefetchable,
+                    size=lambda t: t.size,
                     )
                 )
-            pass
-    for result in chain(*readers):
-        yield result
+        for task in tasks:
+            try:
+                for an_object in task.reader(task.file, **task.options):
+                    yield an_object
+            except Exception as e:
+                log_failure(task.file,
+                    '{e.__class__.__name__:}: {e:}'.format(e=e))
+                failed += 1
+
+    if failed > 0:
+        log.warning('failed to read {:d} files'.format(failed))
+
+
+def log_failure(file, error):
+    log.warning('failed to read {f:}, skipping: {e:}'.format(
+        f=os.path.basename(str(file)),
+        e=error,
+        ))
+
+
+def boreholes_from_sources(datasources, admixclassifier=None,
+        n_jobs=1, ordered=True, queue_size=None,
+        cache_file=None, cache_max_size_mb=512,
+        catalog_file=None, bbox=None, polygon=None, predicate=None,
+        listing_cache_file=None, discovery_workers=8,
+        prefetch=0, prefetch_memory_mb=256, prefetch_max_file_mb=16,
+        lazy=False,
+        ):
+    '''read boreholes and CPT's from datasources, files are parsed on a
+    process pool when n_jobs > 1 and parsed files are cached in cache_file,
+    boreholes are selected by predicate (Predicate or dict with bbox,
+    polygon, min_depth, quality and codes) in the readers, GEF files outside
+    bbox or polygon are skipped using header catalog, folders are listed by
+    discovery with listings cached in listing_cache_file, next prefetch
+    files are read ahead into memory when parsing in this process, GEF and
+    XML boreholes and CPT's are returned with header fields only and read
+    segments and verticals on first access if lazy'''
+    predicate = Predicate.from_spec(predicate, bbox=bbox, polygon=polygon)
+    if (predicate is not None) and predicate.is_spatial:
+        catalog = GefCatalog(catalog_file)
+    else:
+        catalog = None
+    discovery = Discovery(listing_cache_file, n_workers=discovery_workers)
+    tasks = chain(*[
+        borehole_tasks(d, admixclassifier,
+            catalog=catalog,
+            predicate=predicate,
+            discovery=discovery,
+            lazy=lazy,
+            )
+        for d in datasources
+        ])
+
+    if cache_file is not None:
+        cache = SourceCache(cache_file, max_size_mb=cache_max_size_mb)
+    else:
+        cache = None
+    try:
+        for result in read_tasks(tasks,
+                n_jobs=n_jobs,
+                ordered=ordered,
+                queue_size=queue_size,
+                cache=cache,
+                prefetch=prefetch,
+                prefetch_memory_mb=prefetch_memory_mb,
+                prefetch_max_file_mb=prefetch_max_file_mb,
+                ):
+            yield result
+    finally:
+        if cache is not None:
+            cache.evict()
+            cache.report()
+            cache.close()
+        if catalog is not None:
+            catalog.report()
+            catalog.close()
+        discovery.close()
+
+
+def spatial_predicate(datasource, predicate=None):
+    '''predicate on location and code combined from argument and bbox and
+    codes of points or wells datasource'''
+    if predicate is not None:
+        predicate = Predicate.from_spec(predicate).spatial()
+    return Predicate.from_spec(predicate,
+        bbox=datasource.get('bbox'),
+        codes=datasource.get('codes'),
+        )
+
+
+def point_tasks(datasource, predicate=None):
+    '''yield reading task for points datasource'''
+    predicate = spatial_predicate(datasource, predicate)
+    if datasource['format'] == 'CSV punten':
+        yield Task(points_from_csv, datasource['file'], {
+            'fieldnames': datasource['fieldnames'],
+            'valuefields': datasource.get('valuefields'),
+            'delimiter': datasource.get('delimiter', ','),
+            'decimal': datasource.get('decimal', '.'),
+            'grouping': datasource.get('grouping', 'sorted'),
+            'memory_mb': datasource.get('memory_mb', 256),
+            'predicate': predicate,
+            })
+    elif datasource['format'] == 'Database':
+        yield Task(points_from_database, datasource['file'], {
+            'predicate': predicate,
+            })
+    else:
+        log.warning((
+            'dataformat \'{fmt:}\' not supported, skipping').format(
+                fmt=datasource['format'],
+                )
+            )
 
 
-def points_from_sources(datasources):
+def well_tasks(datasource, predicate=None):
+    '''yield reading task for wells datasource'''
+    predicate = spatial_predicate(datasource, predicate)
+    if datasource['format'] == 'CSV putten':
+        yield Task(wells_from_csv, datasource['file'], {
+            'fieldnames': datasource['fieldnames'],
+            'nsegments': datasource.get('nsegments', 0),
+            'delimiter': datasource.get('delimiter', ','),
+            'decimal': datasource.get('decimal', '.'),
+            'predicate': predicate,
+            })
+    elif datasource['format'] == 'Database':
+        yield Task(wells_from_database, datasource['file'], {
+            'predicate': predicate,
+            })
+    else:
+        log.warning((
+            'dataformat \'{fmt:}\' not supported, skipping').format(
+                fmt=datasource['format'],
+                )
+            )
+
+
+def points_from_sources(datasources, predicate=None):
+    '''read points from datasources, selected by location and code of
+    predicate'''
     readers = []
     for datasource in datasources:
-        if datasource['format'] == 'CSV punten':
-            readers.append(points_from_csv(
-                csvfile=datasource['file'],
-                fieldnames=datasource['fieldnames'],
-                valuefields=datasource.get('valuefields'),
-                delimiter=datasource.get('delimiter', ','),
-                decimal=datasource.get('decimal', '.'),
-                ))
-        else:
-            log.warning((
-                'dataformat \'{fmt:}\' not supported, skipping').format(
-                    fmt=datasource['format'],
-                    )
-                )
-            pass
+        for task in point_tasks(datasource, predicate):
+            readers.append(task.reader(task.file, **task.options))
     for result in chain(*readers):
         yield result
 
-def wells_from_sources(datasources):
+
+def wells_from_sources(datasources, predicate=None):
+    '''read wells from datasources, selected by location and code of
+    predicate'''
     readers = []
     for datasource in datasources:
-        if datasource['format'] == 'CSV putten':
-            readers.append(wells_from_csv(
-                csvfile=datasource['file'],
-                fieldnames=datasource['fieldnames'],
-                nsegments=datasource.get('nsegments', 0),
-                delimiter=datasource.get('delimiter', ','),
-                decimal=datasource.get('decimal', '.'),
-                ))
-        else:
-            log.warning((
-                'dataformat \'{fmt:}\' not supported, skipping').format(
-                    fmt=datasource['format'],
-                    )
-                )
-            pass
+        for task in well_tasks(datasource, predicate):
+            readers.append(task.reader(task.file, **task.options))
     for result in chain(*readers):
-        yield result
\ No newline at end of file
+        yield result
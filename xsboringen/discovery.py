@@ -0,0 +1,251 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.archives import ArchiveMember, split_archive, open_archive
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from pathlib import Path
+import threading
+import logging
+import sqlite3
+import fnmatch
+import json
+import os
+import re
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# discovered file with size in bytes and modification time in ns
+Entry = namedtuple('Entry', ['path', 'size', 'mtime'])
+
+# entry of directory listing
+ListingEntry = namedtuple('ListingEntry', ['name', 'is_dir', 'size', 'mtime'])
+
+
+def has_magic(part):
+    '''True if part of path contains glob wildcards'''
+    return any(c in part for c in '*?[')
+
+
+def split_pattern(folder, pattern):
+    '''base folder up to first part with wildcards and list of patterns for
+    remaining folder levels and file names'''
+    parts = Path(folder).parts + Path(pattern).parts
+    baseparts = []
+    for part in parts:
+        if has_magic(part):
+            break
+        baseparts.append(part)
+    patterns = list(parts[len(baseparts):])
+    if len(patterns) == 0:
+        # literal file name
+        patterns = [baseparts.pop()]
+    return Path(*baseparts), patterns
+
+
+def matcher(pattern):
+    '''compiled match of names to glob pattern, hidden names only match a
+    pattern starting with a dot, as in glob'''
+    match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    hidden = pattern.startswith('.')
+    def matches(name):
+        if name.startswith('.') and not hidden:
+            return False
+        return match(os.path.normcase(name)) is not None
+    return matches
+
+
+class ListingCache(object):
+    '''Persistent cache of directory listings in SQLite database, a listing
+    is valid while the modification time of its directory is unchanged'''
+    def __init__(self, cachefile):
+        self.file = Path(cachefile)
+        if not self.file.parent.exists():
+            self.file.parent.mkdir(parents=True)
+        self.connection = sqlite3.connect(str(self.file),
+            check_same_thread=False,
+            )
+        self.connection.execute((
+            'CREATE TABLE IF NOT EXISTS listings ('
+            'folder TEXT PRIMARY KEY, '
+            'mtime INTEGER, '
+            'entries TEXT)'
+            ))
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file=\'{s.file.name:}\')').format(
+            s=self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def get(self, folder, mtime):
+        '''cached listing of folder if directory is unchanged, else None'''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT mtime, entries FROM listings WHERE folder = ?',
+                (str(folder), )).fetchone()
+            if (row is None) or (row[0] != mtime):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [ListingEntry(*e) for e in json.loads(row[1])]
+
+    def put(self, folder, mtime, entries):
+        entries = json.dumps([list(e) for e in entries])
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO listings VALUES (?, ?, ?)',
+                (str(folder), mtime, entries))
+
+    def report(self):
+        '''log cache statistics'''
+        log.info('listing cache: {s.hits:d} hits, {s.misses:d} misses'.format(
+            s=self))
+
+    def close(self):
+        if self.connection is not None:
+            with self.lock:
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
+
+
+class Discovery(object):
+    '''Discovery of files by glob pattern, folders are listed with
+    os.scandir on a thread pool ahead of the consumer, with size and
+    modification time of each file from the same pass, listings are cached
+    per folder if cachefile is given'''
+    def __init__(self, cachefile=None, n_workers=8):
+        if cachefile is not None:
+            self.cache = ListingCache(cachefile)
+        else:
+            self.cache = None
+        self.n_workers = max(int(n_workers), 1)
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(n_workers={s.n_workers:d}, '
+                'cache={s.cache:})').format(s=self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def listdir(self, folder):
+        '''listing of folder sorted by name, from cache if directory is
+        unchanged, empty if folder cannot be read'''
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError as e:
+            log.warning('cannot list {f:}: {e:}'.format(f=folder, e=e))
+            return []
+        if self.cache is not None:
+            listing = self.cache.get(folder, mtime)
+            if listing is not None:
+                return listing
+
+        listing = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            listing.append(
+                                ListingEntry(entry.name, True, 0, 0))
+                        else:
+                            stat = entry.stat()
+                            listing.append(ListingEntry(entry.name, False,
+                                stat.st_size, stat.st_mtime_ns))
+                    except OSError:
+                        # broken link
+                        continue
+        except OSError as e:
+            log.warning('cannot list {f:}: {e:}'.format(f=folder, e=e))
+            return []
+        listing.sort()
+
+        if self.cache is not None:
+            self.cache.put(folder, mtime, listing)
+        return listing
+
+    def glob(self, folder, pattern='*'):
+        '''yield Entry for each file matching pattern in folder, wildcards
+        in folder are expanded, files are yielded in sorted order while
+        subfolders are listed ahead, members are yielded if folder is in a
+        zip archive'''
+        archive, parts = split_archive(folder)
+        if archive is not None:
+            for entry in self.glob_archive(archive, parts, pattern):
+                yield entry
+            return
+
+        base, patterns = split_pattern(folder, pattern)
+        if not base.exists():
+            raise ValueError('folder \'{f:}\' does not exist'.format(
+                f=folder,
+                ))
+        matchers = [matcher(p) for p in patterns]
+        pool = ThreadPoolExecutor(max_workers=self.n_workers)
+        try:
+            future = pool.submit(self.listdir, str(base))
+            for entry in self.walk(pool, future, str(base), matchers):
+                yield entry
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def glob_archive(self, archive, parts, pattern='*'):
+        '''yield Entry with ArchiveMember for each member of archive matching
+        folder parts and pattern'''
+        matchers = [matcher(p) for p in list(parts) + list(Path(pattern).parts)]
+        mtime = os.stat(archive).st_mtime_ns
+        infos = sorted(open_archive(archive).infolist(),
+            key=lambda i: i.filename,
+            )
+        for info in infos:
+            if info.is_dir():
+                continue
+            names = info.filename.split('/')
+            if len(names) != len(matchers):
+                continue
+            if all(m(n) for m, n in zip(matchers, names)):
+                yield Entry(ArchiveMember(archive, info.filename),
+                    info.file_size,
+                    mtime,
+                    )
+
+    def walk(self, pool, future, folder, matchers):
+        '''yield entries matching per level from listing of folder in future,
+        listings of all matching subfolders are submitted at once'''
+        matches, *remainder = matchers
+        listing = [e for e in future.result() if matches(e.name)]
+        join = os.path.join
+        if len(remainder) == 0:
+            for entry in listing:
+                if not entry.is_dir:
+                    yield Entry(join(folder, entry.name),
+                        entry.size,
+                        entry.mtime,
+                        )
+            return
+
+        subfolders = [join(folder, e.name) for e in listing if e.is_dir]
+        futures = [pool.submit(self.listdir, f) for f in subfolders]
+        for subfolder, future in zip(subfolders, futures):
+            for entry in self.walk(pool, future, subfolder, remainder):
+                yield entry
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.report()
+            self.cache.close()
@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.borehole import Borehole, Segment, Vertical
-from xsboringen.cpt import CPT
+from xsboringen.borehole import Borehole, LazyBorehole, Segment, Vertical
+from xsboringen.cpt import CPT, LazyCPT
+from xsboringen.prefetch import prefetched
 from xsboringen import utils
 
-from collections import defaultdict, namedtuple
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 import textwrap
 import logging
@@ -15,27 +17,209 @@ import os
 log = logging.getLogger(os.path.basename(__file__))
 
 
-def boreholes_from_gef(folder, classifier=None, fieldnames=None, gef_format=None):
+def boreholes_from_gef(folder, classifier=None, fieldnames=None, gef_format=None,
+        prefetch=0, prefetch_memory_mb=256, lazy=False,
+        ):
+    '''read boreholes from GEF files in folder, next prefetch files are read
+    ahead into memory while parsing, segments are read on first access if
+    lazy'''
     geffiles = utils.careful_glob(folder, '*.gef')
-    for geffile in geffiles:
-        if gef_format == "tno":
-            gef = GefBoreholeTNOFile(geffile, classifier, fieldnames)
-        else:
-            gef = GefBoreholeFile(geffile, classifier, fieldnames)
-        borehole = gef.to_borehole()
-        if borehole is not None:
+    for geffile in prefetched(geffiles, prefetch, prefetch_memory_mb):
+        for borehole in boreholes_from_geffile(geffile,
+                classifier=classifier,
+                fieldnames=fieldnames,
+                gef_format=gef_format,
+                lazy=lazy,
+                ):
             yield borehole
 
 
-def cpts_from_gef(folder, datacolumns=None, classifier=None, fieldnames=None):
+def boreholes_from_geffile(geffile, classifier=None, fieldnames=None, gef_format=None,
+        predicate=None, lazy=False,
+        ):
+    if gef_format == "tno":
+        gef = GefBoreholeTNOFile(geffile, classifier, fieldnames)
+    else:
+        gef = GefBoreholeFile(geffile, classifier, fieldnames)
+    borehole = gef.to_borehole(predicate=predicate, lazy=lazy)
+    if borehole is not None:
+        yield borehole
+
+
+def cpts_from_gef(folder, datacolumns=None, classifier=None, fieldnames=None,
+        prefetch=0, prefetch_memory_mb=256, lazy=False,
+        ):
+    '''read CPT's from GEF files in folder, next prefetch files are read
+    ahead into memory while parsing, verticals are read on first access if
+    lazy'''
     geffiles = utils.careful_glob(folder, '*.gef')
-    for geffile in geffiles:
-        gef = GefCPTFile(geffile, classifier, fieldnames)
-        cpt = gef.to_cpt(datacolumns)
-        if cpt is not None:
+    for geffile in prefetched(geffiles, prefetch, prefetch_memory_mb):
+        for cpt in cpts_from_geffile(geffile,
+                datacolumns=datacolumns,
+                classifier=classifier,
+                fieldnames=fieldnames,
+                lazy=lazy,
+                ):
             yield cpt
 
 
+def cpts_from_geffile(geffile, datacolumns=None, classifier=None, fieldnames=None,
+        predicate=None, lazy=False,
+        ):
+    gef = GefCPTFile(geffile, classifier, fieldnames)
+    cpt = gef.to_cpt(datacolumns, predicate=predicate, lazy=lazy)
+    if cpt is not None:
+        yield cpt
+
+
+@lru_cache(maxsize=256)
+def columns_from_layout(layout):
+    '''parse COLUMNINFO and COLUMNVOID header lines, once per header layout,
+    returned dicts are shared between files and should not be modified'''
+    columns = {}
+    for var, values in layout:
+        if var == 'COLUMNINFO':
+            number, unit, name, quantity_number = values.split(',', 3)
+            columninfo = GefFile.ColumnInfo(
+                GefFile.safe_int(number),
+                unit.strip(),
+                name.strip(),
+                GefFile.safe_int(quantity_number),
+                )
+            columns.setdefault(var, {})[columninfo.number] = columninfo
+        elif var == 'COLUMNVOID':
+            number, na_value = values.split(',', 1)
+            columnvoid = GefFile.ColumnVoid(
+                GefFile.safe_int(number),
+                GefFile.safe_float(na_value),
+                )
+            columns.setdefault(var, {})[columnvoid.number] = columnvoid
+    return columns
+
+
+class DecodingPlan(object):
+    '''Compiled decoding of GEF data block for one header layout'''
+    def __init__(self, columninfo, columnvoid, datacolumns,
+            columnsep=None, recordsep=None,
+            ):
+        self.columnsep = columnsep
+        self.recordsep = recordsep
+
+        # selected columns as zero-based index, key, converter and na value
+        column_mapping = {v: k for k, v in datacolumns}
+        self.fields = []
+        for number, ci in sorted(columninfo.items()):
+            key = column_mapping.get(ci.name)
+            if (key is None) or (number is None):
+                continue
+            columnvoid_ = columnvoid.get(number)
+            na_value = columnvoid_.value if columnvoid_ is not None else None
+            self.fields.append((number - 1, key, GefFile.safe_float, na_value))
+        self.keys = [key for _, key, _, _ in self.fields]
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(columns={s.keys:})').format(s=self)
+
+    def split(self, line):
+        line = line.rstrip(self.recordsep)
+        if self.columnsep is None:
+            return line.split()
+        else:
+            return line.split(self.columnsep)
+
+    def decode(self, lines):
+        '''decode data lines to verticals'''
+        items = {key: [] for key in self.keys}
+        for line in lines:
+            valuestrs = self.split(line)
+            nvalues = len(valuestrs)
+            for index, key, converter, na_value in self.fields:
+                if index >= nvalues:
+                    continue
+                value = converter(valuestrs[index])
+                if value == na_value:
+                    value = None
+                items[key].append(value)
+        items = {k: v for k, v in items.items() if len(v) > 0}
+        try:
+            depth = items.pop('depth')
+        except KeyError:
+            depth = None
+        verticals = {}
+        for key, values in items.items():
+            verticals[key] = Vertical(name=key, depth=depth, values=values)
+        return verticals
+
+
+@lru_cache(maxsize=256)
+def decoding_plan(layout, datacolumns, columnsep=None, recordsep=None):
+    '''compiled decoding plan, once per header layout and data columns'''
+    columns = columns_from_layout(layout)
+    return DecodingPlan(
+        columns.get('COLUMNINFO', {}),
+        columns.get('COLUMNVOID', {}),
+        datacolumns,
+        columnsep=columnsep,
+        recordsep=recordsep,
+        )
+
+
+class GefDataLoader(object):
+    '''Reader of GEF data block at offset after header, called by lazy
+    borehole or CPT on first access of segments or verticals'''
+    def __init__(self, geffile, offset):
+        self.file = utils.unbuffered_source(geffile)
+        self.offset = offset
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file=\'{s.file.name:}\', '
+                'offset={s.offset:})').format(s=self)
+
+    def __call__(self):
+        log.debug('loading {s.file.name:}'.format(s=self))
+        with utils.open_source(self.file) as f:
+            f.seek(self.offset)
+            lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
+            return self.read(lines)
+
+    def read(self, lines):
+        raise NotImplementedError
+
+
+class GefSegmentsLoader(GefDataLoader):
+    '''Reader of segments from GEF borehole data block'''
+    def __init__(self, geffile, offset, read_segments,
+            columnsep=None, recordsep=None, classifier=None,
+            ):
+        super().__init__(geffile, offset)
+        self.read_segments = read_segments
+        self.columnsep = columnsep
+        self.recordsep = recordsep
+        self.classifier = classifier
+
+    def read(self, lines):
+        '''segments from data lines, with classified lithology and admix'''
+        segments = [
+            s for s in self.read_segments(lines,
+                self.columnsep, self.recordsep)
+            ]
+        if self.classifier is not None:
+            for segment in segments:
+                segment.update(self.classifier.classify(segment.lithology))
+        return {'segments': segments}
+
+
+class GefVerticalsLoader(GefDataLoader):
+    '''Reader of verticals from GEF CPT data block'''
+    def __init__(self, geffile, offset, plan):
+        super().__init__(geffile, offset)
+        self.plan = plan
+
+    def read(self, lines):
+        '''verticals from data lines by decoding plan'''
+        return {'verticals': self.plan.decode(lines)}
+
+
 class GefFile(object):
     # GEF field names
     FieldNames = namedtuple('FieldNames',
@@ -91,7 +275,7 @@ class GefFile(object):
         fieldnames=None,
         measurementvars=None,
         ):
-        self.file = Path(geffile).resolve()
+        self.file = utils.source_path(geffile)
         self.attrs = {
             'source': self.file.name,
             'format': self._format,
@@ -136,28 +320,12 @@ class GefFile(object):
     @classmethod
     def read_header(cls, lines):
         header = {}
+        layout = []
         var, values = cls.read_headerline(lines)
         while var != 'EOH':
-            if var == 'COLUMNINFO':
-                if var not in header:
-                    header[var] = {}
-                number, unit, name, quantity_number = values.split(',', 3)
-                columninfo = cls.ColumnInfo(
-                    cls.safe_int(number),
-                    unit.strip(),
-                    name.strip(),
-                    cls.safe_int(quantity_number),
-                    )
-                header[var][columninfo.number] = columninfo
-            elif var == 'COLUMNVOID':
-                if var not in header:
-                    header[var] = {}
-                number, na_value = values.split(',', 1)
-                columnvoid = cls.ColumnVoid(
-                    cls.safe_int(number),
-                    cls.safe_float(na_value),
-                    )
-                header[var][columnvoid.number] = columnvoid
+            if var in {'COLUMNINFO', 'COLUMNVOID'}:
+                # column definitions, parsed once per layout
+                layout.append((var, values))
             elif var == 'MEASUREMENTTEXT':
                 if var not in header:
                     header[var] = {}
@@ -207,8 +375,61 @@ class GefFile(object):
             else:
                 header[var] = values.split(',')
             var, values = cls.read_headerline(lines)
+        header['LAYOUT'] = tuple(layout)
+        header.update(columns_from_layout(header['LAYOUT']))
         return header
 
+    @staticmethod
+    def iterlines(f):
+        '''non-empty lines of text stream read line by line, so that position
+        of stream after header can be told'''
+        for line in iter(f.readline, ''):
+            if len(line.strip()) > 0:
+                yield line.rstrip('\n')
+
+    def separators(self, header):
+        '''column and record separator from header, None if not given'''
+        if self.fieldnames.columnsep in header:
+            columnsep, *_ = header[self.fieldnames.columnsep]
+        else:
+            columnsep = None
+        if self.fieldnames.recordsep in header:
+            recordsep, *_ = header[self.fieldnames.recordsep]
+        else:
+            recordsep = None
+        return columnsep, recordsep
+
+    def has_depth(self, header):
+        '''True if depth is given in header'''
+        return self.measurementvars.depth in header.get('MEASUREMENTVAR', {})
+
+    def accepts_header(self, header, predicate):
+        '''check predicate on code, location and depth in header'''
+        values = {}
+        try:
+            values['code'] = header[self.fieldnames.code][0].strip()
+        except (KeyError, IndexError):
+            pass
+        try:
+            _, x, y, *_ = header[self.fieldnames.xy]
+            values['x'] = self.safe_float(x)
+            values['y'] = self.safe_float(y)
+        except (KeyError, ValueError):
+            pass
+        try:
+            values['depth'] = (
+                header['MEASUREMENTVAR'][self.measurementvars.depth].value
+                )
+        except KeyError:
+            pass
+        return predicate.accepts(**values)
+
+    def header(self):
+        '''read header only, up to #EOH'''
+        with utils.open_source(self.file) as f:
+            lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
+            return self.read_header(lines)
+
 
 class GefBoreholeFile(GefFile):
     _format = 'GEF Borehole'
@@ -250,33 +471,38 @@ class GefBoreholeFile(GefFile):
         log.debug('calculating depth from segments')
         return max(s.base for s in segments)
 
-    def to_borehole(self):
-        log.debug('reading {file:}'.format(file=os.path.basename(self.file)))
+    def to_borehole(self, predicate=None, lazy=False):
+        '''read GEF file and return Borehole, or LazyBorehole if lazy with
+        segments read on first access, or read now if depth is not given in
+        header'''
+        log.debug('reading {s.file.name:}'.format(s=self))
 
-        with open(self.file) as f:
-            lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
+        with utils.open_source(self.file) as f:
+            if lazy:
+                lines = self.iterlines(f)
+            else:
+                lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
             header = self.read_header(lines)
 
-            # column separator
-            if self.fieldnames.columnsep in header:
-                columnsep, *_ = header[self.fieldnames.columnsep]
+            # skip segments if rejected on header
+            if (predicate is not None) and not self.accepts_header(
+                    header, predicate):
+                return
+
+            # segments, data block is skipped if lazy and depth in header
+            columnsep, recordsep = self.separators(header)
+            loader = GefSegmentsLoader(self.file,
+                f.tell() if lazy else None,
+                self.read_segments,
+                columnsep=columnsep,
+                recordsep=recordsep,
+                classifier=self.classifier,
+                )
+            if lazy and self.has_depth(header):
+                segments = None
             else:
-                columnsep = None
+                segments = loader.read(lines)['segments']
 
-            # record separator
-            if self.fieldnames.recordsep in header:
-                recordsep, *_ = header[self.fieldnames.recordsep]
-            else:
-                recordsep = None
-
-            # segments
-            segments = [
-                s for s in self.read_segments(lines, columnsep, recordsep)
-                ]
-            # classify lithology and admix
-            if self.classifier is not None:
-                for segment in segments:
-                    segment.update(self.classifier.classify(segment.lithology))
         # code
         try:
             code = header[self.fieldnames.code][0].strip()
@@ -294,6 +520,9 @@ class GefBoreholeFile(GefFile):
             depth = header['MEASUREMENTVAR'][self.measurementvars.depth].value
         except KeyError:
             depth = self.depth_from_segments(segments)
+            if (predicate is not None) and not predicate.accepts_depth(
+                    depth):
+                return
 
         # x, y
         _, x, y, *_ = header[self.fieldnames.xy]
@@ -307,6 +536,13 @@ class GefBoreholeFile(GefFile):
         else:
             z = None
 
+        if lazy:
+            return LazyBorehole(code, depth,
+                x=x, y=y, z=z,
+                segments=segments,
+                loader=loader,
+                **self.attrs,
+                )
         return Borehole(code, depth,
             x=x, y=y, z=z,
             segments=segments,
@@ -348,29 +584,19 @@ class GefCPTFile(GefFile):
 
     @classmethod
     def read_verticals(cls, lines, selected_columns, na_values, columnsep, recordsep):
-        items = defaultdict(list)
-        for line in lines:
-            line = line.rstrip(recordsep)
-            if columnsep is None:
-                valuestrs = [v for v in line.split() if v.strip()]
-            else:
-                valuestrs = line.split(columnsep)
-            for i, valuestr in enumerate(valuestrs):
-                column = selected_columns.get(i + 1)
-                na_value = na_values.get(i + 1)
-                if column is not None:
-                    value = cls.safe_float(valuestr)
-                    if value == na_value:
-                        value = None
-                    items[column].append(value)
-        try:
-            depth = items.pop('depth')
-        except KeyError:
-            depth = None
-        verticals = {}
-        for key, values in items.items():
-            verticals[key] = Vertical(name=key, depth=depth, values=values)
-        return verticals
+        columninfo = {
+            i: cls.ColumnInfo(i, None, c, None)
+            for i, c in selected_columns.items() if c is not None
+            }
+        columnvoid = {i: cls.ColumnVoid(i, v) for i, v in na_values.items()}
+        datacolumns = [
+            (c, c) for c in selected_columns.values() if c is not None
+            ]
+        plan = DecodingPlan(columninfo, columnvoid, datacolumns,
+            columnsep=columnsep,
+            recordsep=recordsep,
+            )
+        return plan.decode(lines)
 
     @staticmethod
     def depth_from_verticals(verticals, field='friction_ratio'):
@@ -382,46 +608,39 @@ class GefCPTFile(GefFile):
         except IndexError:
             return None
 
-    def to_cpt(self, datacolumns=None):
-        log.debug('reading {file:}'.format(file=os.path.basename(self.file)))
+    def to_cpt(self, datacolumns=None, predicate=None, lazy=False):
+        '''read GEF file and return CPT, or LazyCPT if lazy with verticals
+        read on first access, or read now if depth is not given in header'''
+        log.debug('reading {s.file.name:}'.format(s=self))
         datacolumns = datacolumns or self._defaultdatacolumns
 
-        with open(self.file) as f:
-            lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
+        with utils.open_source(self.file) as f:
+            if lazy:
+                lines = self.iterlines(f)
+            else:
+                lines = (l.rstrip('\n') for l in f if len(l.strip()) > 0)
             header = self.read_header(lines)
 
-            # selected columns
-            column_mapping = {v: k for k, v in datacolumns.items()}
-            selected_columns = {
-                i: column_mapping.get(ci.name)
-                for i, ci in header['COLUMNINFO'].items()
-                }
-
-            # column na values
-            na_values = {
-                i: cv.value
-                for i, cv in header['COLUMNVOID'].items()
-                }
-
-            # column separator
-            if self.fieldnames.columnsep in header:
-                columnsep, *_ = header[self.fieldnames.columnsep]
+            # skip verticals if rejected on header
+            if (predicate is not None) and not self.accepts_header(
+                    header, predicate):
+                return
+
+            # verticals, decoding plan is reused for identical layouts
+            columnsep, recordsep = self.separators(header)
+            plan = decoding_plan(header['LAYOUT'],
+                tuple(sorted(datacolumns.items())),
+                columnsep=columnsep,
+                recordsep=recordsep,
+                )
+            if lazy:
+                loader = GefVerticalsLoader(self.file, f.tell(), plan)
             else:
-                columnsep = None
-
-            # record separator
-            if self.fieldnames.recordsep in header:
-                recordsep, *_ = header[self.fieldnames.recordsep]
+                loader = None
+            if lazy and self.has_depth(header):
+                verticals = None
             else:
-                recordsep = None
-
-            # verticals
-            verticals = self.read_verticals(lines,
-                selected_columns,
-                na_values,
-                columnsep,
-                recordsep,
-                )
+                verticals = plan.decode(lines)
 
         # code
         try:
@@ -439,6 +658,9 @@ class GefCPTFile(GefFile):
             depth = header['MEASUREMENTVAR'][self.measurementvars.depth].value
         except KeyError:
             depth = self.depth_from_verticals(verticals)
+            if (predicate is not None) and not predicate.accepts_depth(
+                    depth):
+                return
 
         # x, y
         _, x, y, *_ = header[self.fieldnames.xy]
@@ -452,6 +674,13 @@ class GefCPTFile(GefFile):
         else:
             z = None
 
+        if lazy:
+            return LazyCPT(code, depth,
+                x=x, y=y, z=z,
+                verticals=verticals,
+                loader=loader,
+                **self.attrs,
+                )
         return CPT(code, depth,
             x=x, y=y, z=z,
             verticals=verticals,
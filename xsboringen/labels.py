@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import text_to_path
+
+from collections import namedtuple
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class LabelLayout(object):
+    '''Batch layout of vertical (rotated) code labels along the x-axis'''
+    PlacedLabel = namedtuple('PlacedLabel', ['x', 'text', 'offset', 'index'])
+
+    _policies = 'all', 'cull', 'stagger'
+
+    def __init__(self, fontsize=None, policy='all', max_levels=2,
+            padding=1.,
+            ):
+        if policy not in self._policies:
+            raise ValueError('label policy \'{}\' not supported'.format(policy))
+        self.prop = FontProperties(size=fontsize)
+        self.policy = policy
+        if policy == 'stagger':
+            self.max_levels = max(int(max_levels), 1)
+        else:
+            self.max_levels = 1
+
+        # minimum space between labels [points]
+        self.padding = padding
+
+        self._extents = {}
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(policy={s.policy:}, '
+                'max_levels={s.max_levels:d})').format(s=self)
+
+    def extent(self, text):
+        '''label length and thickness from font metrics [points]'''
+        if text not in self._extents:
+            width, height, descent = text_to_path.get_text_width_height_descent(
+                text, self.prop, ismath=False,
+                )
+            self._extents[text] = width, height
+        return self._extents[text]
+
+    def layout(self, labels, points_per_unit):
+        '''place labels given as (x, text) and return surviving labels,
+        with offset of staggered labels in points and index in labels'''
+        labels = sorted(
+            ((x, text, i) for i, (x, text) in enumerate(labels)),
+            key=lambda l: l[0],
+            )
+        if self.policy == 'all':
+            return [self.PlacedLabel(x, text, 0., i) for x, text, i in labels]
+
+        # offset between levels is the length of the longest label
+        extents = [self.extent(str(text)) for x, text, i in labels]
+        level_offset = max((l for l, t in extents), default=0.) + self.padding
+
+        # right edge of last label per level [points]
+        right_edges = [None] * self.max_levels
+        placed = []
+        for (x, text, i), (length, thickness) in zip(labels, extents):
+            center = x * points_per_unit
+            left = center - thickness / 2.
+            for level, right_edge in enumerate(right_edges):
+                if (right_edge is None) or (left >= right_edge + self.padding):
+                    right_edges[level] = center + thickness / 2.
+                    placed.append(
+                        self.PlacedLabel(x, text, level * level_offset, i)
+                        )
+                    break
+        log.debug('placed {:d} of {:d} labels'.format(len(placed), len(labels)))
+        return placed
@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from shapely.geometry import shape
+
+from pathlib import Path
+import hashlib
+import logging
+import json
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def digest(*values):
+    '''hex digest of json representation of values'''
+    dumped = json.dumps(values, sort_keys=True, default=repr)
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+
+def file_stamp(filepath):
+    '''path, size and modification time of file'''
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return str(filepath), None, None
+    return str(filepath), stat.st_size, stat.st_mtime_ns
+
+
+def borehole_stamp(borehole):
+    '''code, source and digest of borehole contents'''
+    segments = [sorted(s.__dict__.items()) for s in borehole.segments]
+    verticals = [
+        (k, v.depth, v.values) for k, v in sorted(borehole.verticals.items())
+        ]
+    return (
+        borehole.code,
+        getattr(borehole, 'source', None),
+        digest(borehole.x, borehole.y, borehole.z, borehole.depth,
+            segments, verticals),
+        )
+
+
+def well_stamp(well):
+    '''code and digest of well contents'''
+    filtersegments = [
+        (s.toplevel, s.bottomlevel) for s in well.filtersegments
+        ]
+    return (
+        well.code,
+        digest(well.x, well.y, well.z,
+            well.filtertoplevel, well.filterbottomlevel,
+            filtersegments, well.location),
+        )
+
+
+def point_stamp(point):
+    '''code and digest of point contents'''
+    return (
+        point.code,
+        digest(point.x, point.y, point.z, point.top, point.base,
+            [tuple(v) for v in point.values]),
+        )
+
+
+def cross_section_fingerprint(cs, settings=None):
+    '''fingerprint of all inputs of cross-section plot'''
+    rasterfiles = [s.file for s in cs.surfaces]
+    for solid in cs.solids:
+        rasterfiles.extend([solid.topfile, solid.basefile])
+    return digest(
+        shape(cs.geometry).wkt,
+        cs.buffer_distance,
+        sorted(borehole_stamp(b) for d, b in cs.boreholes),
+        sorted(well_stamp(w) for d, w in cs.wells),
+        sorted(point_stamp(p) for d, p in cs.points),
+        [(s.name, s.stylekey) for s in cs.surfaces],
+        [(s.name, s.stylekey) for s in cs.solids],
+        [file_stamp(f) for f in rasterfiles],
+        settings,
+        )
+
+
+class PlotManifest(object):
+    '''Manifest of cross-section fingerprints in plot result folder'''
+    def __init__(self, manifestfile):
+        self.file = Path(manifestfile)
+        self.fingerprints = {}
+        if self.file.exists():
+            try:
+                with open(self.file) as f:
+                    self.fingerprints = json.load(f)
+            except ValueError:
+                log.warning('invalid manifest {f.name:}, ignoring'.format(
+                    f=self.file))
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file={s.file.name:}, '
+                'sections={n:d})').format(s=self, n=len(self.fingerprints))
+
+    def is_current(self, label, fingerprint, *outputfiles):
+        '''fingerprint unchanged and all output files exist'''
+        return (
+            (self.fingerprints.get(label) == fingerprint) and
+            all(Path(f).exists() for f in outputfiles)
+            )
+
+    def update(self, label, fingerprint):
+        self.fingerprints[label] = fingerprint
+
+    def save(self):
+        with open(self.file, 'w') as f:
+            json.dump(self.fingerprints, f, indent=2, sort_keys=True)
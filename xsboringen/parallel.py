@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from collections import OrderedDict, deque
+import logging
+import math
+import time
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def timed_batch(func, batch):
+    '''call func for each argument tuple in batch and time every call'''
+    results = []
+    for args in batch:
+        start = time.perf_counter()
+        result = func(*args)
+        results.append((result, time.perf_counter() - start))
+    return results
+
+
+class TaskTimings(object):
+    '''Running statistics of task execution times for one stage'''
+    def __init__(self, stage):
+        self.stage = stage
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(stage={s.stage:}, '
+                'count={s.count:d}, '
+                'mean={s.mean:.3f})').format(s=self)
+
+    @property
+    def mean(self):
+        if self.count > 0:
+            return self.total / self.count
+        else:
+            return 0.
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+class Executor(object):
+    '''Run-wide pool of workers shared by all sections and stages'''
+    _pools = {
+        'threads': ThreadPoolExecutor,
+        'processes': ProcessPoolExecutor,
+        }
+
+    def __init__(self, n_jobs=1, backend='threads', batch_time=0.2):
+        if backend not in self._pools:
+            raise ValueError('backend \'{}\' not supported'.format(backend))
+        self.n_jobs = max(int(n_jobs or 1), 1)
+        self.backend = backend
+
+        # target duration of one batch of tasks [s]
+        self.batch_time = batch_time
+
+        self.pool = None
+        self.timings = OrderedDict()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(n_jobs={s.n_jobs:d}, '
+                'backend={s.backend:})').format(s=self)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def parallel(self):
+        return self.n_jobs > 1
+
+    def start(self):
+        '''start worker pool, kept alive until close'''
+        if self.parallel and (self.pool is None):
+            log.debug('starting {} {} workers'.format(
+                self.n_jobs, self.backend))
+            self.pool = self._pools[self.backend](max_workers=self.n_jobs)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def batch_size(self, stage, ntasks):
+        '''adaptive batch size from task times measured so far'''
+        timings = self.timings.get(stage)
+        if (timings is None) or not (timings.mean > 0.):
+            size = 1
+        else:
+            size = max(int(self.batch_time / timings.mean), 1)
+
+        # at least one batch per worker
+        return min(size, max(math.ceil(ntasks / self.n_jobs), 1))
+
+    def map(self, func, tasks, stage=None):
+        '''call func for each argument tuple in tasks, return results in order'''
+        stage = stage or func.__name__
+        tasks = [t for t in tasks]
+        if stage not in self.timings:
+            self.timings[stage] = TaskTimings(stage)
+
+        if self.parallel and (len(tasks) > 1):
+            self.start()
+            size = self.batch_size(stage, len(tasks))
+            futures = [
+                self.pool.submit(timed_batch, func, tasks[i: i + size])
+                for i in range(0, len(tasks), size)
+                ]
+            timed_results = [r for f in futures for r in f.result()]
+        else:
+            timed_results = timed_batch(func, tasks)
+
+        results = []
+        for result, elapsed in timed_results:
+            log.debug('{stage:} task took {elapsed:.3f} s'.format(
+                stage=stage,
+                elapsed=elapsed,
+                ))
+            self.timings[stage].add(elapsed)
+            results.append(result)
+        return results
+
+    def imap(self, func, items, ordered=True, queue_size=None, resolve=None):
+        '''lazily call func for each item and yield results, with at most
+        queue_size pending results for back-pressure, optional resolve
+        returns result for item without calling func or None'''
+        if not self.parallel:
+            for item in items:
+                result = resolve(item) if resolve is not None else None
+                if result is None:
+                    result = func(item)
+                yield result
+            return
+
+        self.start()
+        queue_size = max(int(queue_size or 2 * self.n_jobs), 1)
+        pending = deque()
+        items = iter(items)
+        exhausted = False
+        while True:
+            # fill queue up to queue size
+            while (not exhausted) and (len(pending) < queue_size):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                result = resolve(item) if resolve is not None else None
+                if result is not None:
+                    future = Future()
+                    future.set_result(result)
+                else:
+                    future = self.pool.submit(func, item)
+                pending.append(future)
+
+            if len(pending) == 0:
+                break
+
+            # yield next result, or all completed results if unordered
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending = deque(f for f in pending if f not in done)
+                for future in done:
+                    yield future.result()
+
+    def report(self):
+        '''log task timings per stage'''
+        for stage, timings in self.timings.items():
+            log.info((
+                '{t.stage:}: {t.count:d} tasks, '
+                'total {t.total:.2f} s, '
+                'mean {t.mean:.3f} s, '
+                'max {t.max:.3f} s'
+                ).format(t=timings))
@@ -0,0 +1,344 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole, Segment, SegmentTable, nan_to_none
+from xsboringen.tablewriter import RowGetter
+
+import numpy as np
+
+from pathlib import Path
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# output formats, Arrow IPC files can be memory mapped without copying
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# core field types
+BOREHOLE_DTYPES = {
+    'code': 'str', 'depth': 'float', 'x': 'float', 'y': 'float', 'z': 'float',
+    }
+SEGMENT_DTYPES = {
+    'top': 'float', 'base': 'float', 'lithology': 'str',
+    'sandmedianclass': 'str',
+    }
+
+# dictionary encoded by default
+DICTIONARY_FIELDS = ('lithology', 'sandmedianclass')
+
+
+def arrow_type(dtype):
+    '''Arrow type for dtype of extra field'''
+    return {
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        }[dtype]
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required for Parquet and Arrow output')
+
+
+def boreholes_to_parquet(boreholes, folder, extra_fields=None,
+        dictionary_fields=None, row_group_size=65536, format='parquet',
+        compression='snappy',
+        ):
+    '''write boreholes and segments as two tables linked by borehole_id,
+    extra fields as names or dicts with name and dtype, boreholes may include
+    SegmentTable'''
+    log.info('writing to {f:}'.format(f=os.path.basename(str(folder))))
+    with BoreholeTableWriter(folder,
+            extra_fields=extra_fields,
+            dictionary_fields=dictionary_fields,
+            row_group_size=row_group_size,
+            format=format,
+            compression=compression,
+            ) as writer:
+        writer.write(boreholes)
+
+
+def read_parquet(folder, format='parquet'):
+    '''read boreholes and segments tables from folder, Arrow IPC files are
+    memory mapped without copying'''
+    require_pyarrow()
+    folder = Path(folder)
+    tables = []
+    for name in ('boreholes', 'segments'):
+        tablefile = folder / (name + FORMATS[format])
+        if format == 'arrow':
+            source = pa.memory_map(str(tablefile), 'r')
+            tables.append(pa.ipc.open_file(source).read_all())
+        else:
+            tables.append(pq.read_table(str(tablefile), memory_map=True))
+    return tuple(tables)
+
+
+class DictionaryEncoder(object):
+    '''Dictionary of string values that only grows, so that indices are
+    stable over batches and the dictionary is written as deltas'''
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            value = str(value)
+            i = self.index.get(value)
+            if i is None:
+                i = self.index[value] = len(self.values)
+                self.values.append(value)
+            indices.append(i)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()),
+            pa.array(self.values, type=pa.string()),
+            )
+
+
+class ColumnBuffer(object):
+    '''Buffered column of Arrow table, type inferred from first values if
+    not given'''
+    def __init__(self, name, dtype=None, dictionary=False):
+        self.name = name
+        self.dtype = dtype
+        self.encoder = DictionaryEncoder() if dictionary else None
+        self.type = None
+        if self.encoder is not None:
+            self.type = pa.dictionary(pa.int32(), pa.string())
+        elif dtype is not None:
+            self.type = arrow_type(dtype)
+        self.values = []
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(name={s.name:}, '
+                'type={s.type:})').format(s=self)
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_array(self):
+        '''buffered values as Arrow array, buffer is emptied'''
+        values, self.values = self.values, []
+        if self.encoder is not None:
+            return self.encoder.encode(values)
+        if self.type is None:
+            inferred = pa.array(values, from_pandas=True).type
+            if pa.types.is_null(inferred):
+                inferred = pa.string()
+            self.type = inferred
+        try:
+            return pa.array(values, type=self.type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError((
+                'cannot write column {s.name:} as {s.type:}, '
+                'specify dtype in extra_fields: {e:}').format(s=self, e=e))
+
+
+class TableSink(object):
+    '''Parquet or Arrow IPC file written in record batches, opened at first
+    batch when all column types are known'''
+    def __init__(self, tablefile, columns, format='parquet',
+            row_group_size=65536, compression='snappy',
+            ):
+        self.file = Path(tablefile)
+        self.columns = columns
+        self.format = format
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.writer = None
+        self.rows = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file={s.file.name:}, '
+                'rows={s.rows:d})').format(s=self)
+
+    @property
+    def nbuffered(self):
+        return len(self.columns[0])
+
+    def open(self, schema):
+        if self.format == 'arrow':
+            self.handle = pa.OSFile(str(self.file), 'wb')
+            self.writer = pa.ipc.new_file(self.handle, schema,
+                options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+                )
+        else:
+            self.handle = None
+            self.writer = pq.ParquetWriter(str(self.file), schema,
+                compression=self.compression,
+                )
+
+    def flush(self):
+        '''write buffered rows as record batch or row group'''
+        if (self.nbuffered == 0) and (self.writer is not None):
+            return
+        arrays = [c.to_array() for c in self.columns]
+        schema = pa.schema([(c.name, c.type) for c in self.columns])
+        batch = pa.record_batch(arrays, schema=schema)
+        if self.writer is None:
+            self.open(schema)
+        if self.format == 'arrow':
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_batch(batch, row_group_size=self.row_group_size)
+        self.rows += batch.num_rows
+
+    def append(self, rows):
+        '''append rows as tuples of column values, flushed per row group'''
+        for column, values in zip(self.columns, zip(*rows)):
+            column.values.extend(values)
+        if self.nbuffered >= self.row_group_size:
+            self.flush()
+
+    def extend(self, columns):
+        '''append columns as lists of values, flushed per row group'''
+        for column, values in zip(self.columns, columns):
+            column.values.extend(values)
+        if self.nbuffered >= self.row_group_size:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.handle is not None:
+            self.handle.close()
+
+
+class BoreholeTableWriter(object):
+    '''Write boreholes and segments to Parquet or Arrow IPC tables in row
+    groups, memory use is limited to one row group per table'''
+    def __init__(self, folder, extra_fields=None, dictionary_fields=None,
+            row_group_size=65536, format='parquet', compression='snappy',
+            ):
+        require_pyarrow()
+        if format not in FORMATS:
+            raise ValueError('format \'{}\' not supported'.format(format))
+        self.folder = Path(folder)
+        if not self.folder.exists():
+            self.folder.mkdir(parents=True)
+        self.format = format
+        extra_fields = extra_fields or {}
+        dictionary_fields = set(dictionary_fields or DICTIONARY_FIELDS)
+
+        # fields as name and dtype
+        borehole_fields = self.fields(
+            Borehole.fieldnames, BOREHOLE_DTYPES, extra_fields.get('borehole'))
+        segment_fields = self.fields(
+            Segment.fieldnames, SEGMENT_DTYPES, extra_fields.get('segments'))
+        self.borehole_getter = RowGetter([n for n, _ in borehole_fields])
+        self.segment_getter = RowGetter([n for n, _ in segment_fields])
+        self.borehole_fields = [n for n, _ in borehole_fields]
+        self.segment_fields = [n for n, _ in segment_fields]
+
+        link = ColumnBuffer('borehole_id', 'int')
+        self.boreholes = TableSink(
+            self.folder / ('boreholes' + FORMATS[format]),
+            [link] + [
+                ColumnBuffer(n, d, n in dictionary_fields)
+                for n, d in borehole_fields
+                ],
+            format=format,
+            row_group_size=row_group_size,
+            compression=compression,
+            )
+        link = ColumnBuffer('borehole_id', 'int')
+        self.segments = TableSink(
+            self.folder / ('segments' + FORMATS[format]),
+            [link] + [
+                ColumnBuffer(n, d, n in dictionary_fields)
+                for n, d in segment_fields
+                ],
+            format=format,
+            row_group_size=row_group_size,
+            compression=compression,
+            )
+        self.count = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(folder={s.folder.name:}, '
+                'boreholes={s.count:d})').format(s=self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @staticmethod
+    def fields(fieldnames, dtypes, extra_fields=None):
+        '''list of name and dtype, extra fields as name or dict with name and
+        optional dtype'''
+        fields = [(n, dtypes.get(n)) for n in fieldnames]
+        for field in extra_fields or []:
+            if isinstance(field, dict):
+                fields.append((field['name'], field.get('dtype')))
+            else:
+                fields.append((field, None))
+        return fields
+
+    def write_borehole(self, borehole):
+        borehole_id = self.count
+        self.boreholes.append([
+            (borehole_id, ) + self.borehole_getter.get(borehole),
+            ])
+        get = self.segment_getter.get
+        segments = [(borehole_id, ) + get(s) for s in borehole]
+        if len(segments) > 0:
+            self.segments.append(segments)
+        self.count += 1
+
+    def write_table(self, table):
+        '''write SegmentTable by column'''
+        ids = np.arange(self.count, self.count + len(table))
+        counts = np.diff(table.offsets)
+
+        def borehole_column(name):
+            if name in table.boreholes:
+                return nan_to_none(table.boreholes[name])
+            return [table.attrs.get(name)] * len(table)
+
+        def segment_column(name):
+            if name in table.segments:
+                return nan_to_none(table.segments[name])
+            return [None] * table.nsegments
+
+        self.boreholes.extend([ids.tolist()] + [
+            borehole_column(n) for n in self.borehole_fields
+            ])
+        self.segments.extend([np.repeat(ids, counts).tolist()] + [
+            segment_column(n) for n in self.segment_fields
+            ])
+        self.count += len(table)
+
+    def write(self, boreholes):
+        '''write boreholes, items that are SegmentTable are written by
+        column'''
+        for item in boreholes:
+            if isinstance(item, SegmentTable):
+                self.write_table(item)
+            else:
+                self.write_borehole(item)
+
+    def close(self):
+        self.boreholes.close()
+        self.segments.close()
+        log.debug('wrote {s.count:d} boreholes, {n:d} segments'.format(
+            s=self, n=self.segments.rows))
@@ -0,0 +1,289 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from collections import OrderedDict
+from queue import Queue, Empty, Full
+import threading
+import logging
+import time
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# end of stream marker
+_DONE = object()
+
+# interval of checking stop event while blocked on queue [s]
+POLL_INTERVAL = 0.1
+
+
+class _Failure(object):
+    '''exception raised in stage, passed downstream to consumer'''
+    def __init__(self, stage, error):
+        self.stage = stage
+        self.error = error
+
+
+def chained(funcs):
+    '''apply funcs in sequence, return None to drop item'''
+    def apply(item):
+        for func in funcs:
+            item = func(item)
+            if item is None:
+                break
+        return item
+    return apply
+
+
+class StageMetrics(object):
+    '''Throughput and input queue occupancy of pipeline stage'''
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.count = 0
+        self.busy = 0.
+        self.start = None
+        self.end = None
+        self.occupancy_total = 0
+        self.occupancy_max = 0
+        self.occupancy_samples = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(name={s.name:}, '
+                'count={s.count:d})').format(s=self)
+
+    @property
+    def elapsed(self):
+        if (self.start is None) or (self.end is None):
+            return 0.
+        return self.end - self.start
+
+    @property
+    def throughput(self):
+        '''items per second'''
+        if self.elapsed > 0.:
+            return self.count / self.elapsed
+        else:
+            return 0.
+
+    @property
+    def occupancy(self):
+        '''mean input queue occupancy as fraction of queue size'''
+        if (self.occupancy_samples > 0) and (self.queue_size > 0):
+            return (
+                self.occupancy_total / self.occupancy_samples / self.queue_size
+                )
+        else:
+            return 0.
+
+    def sample(self, qsize):
+        with self.lock:
+            self.occupancy_total += qsize
+            self.occupancy_samples += 1
+            self.occupancy_max = max(self.occupancy_max, qsize)
+
+    def add(self, busy):
+        with self.lock:
+            self.count += 1
+            self.busy += busy
+
+
+class Stage(object):
+    '''Pipeline stage applying steps to items in worker threads'''
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(name={s.name:}, '
+                'workers={s.workers:d})').format(s=self)
+
+
+class Pipeline(object):
+    '''Stages in worker threads connected by bounded queues'''
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self.stages = []
+        self.metrics = OrderedDict()
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(stages={n:d}, '
+                'queue_size={s.queue_size:d})').format(
+            s=self,
+            n=len(self.stages),
+            )
+
+    @classmethod
+    def from_steps(cls, steps, queue_size=64, stages=None):
+        '''build pipeline from named steps as (name, func), grouped in
+        stages given as dicts with keys steps and workers'''
+        pipeline = cls(queue_size=queue_size)
+        funcs = OrderedDict(steps)
+        for stage in (stages or []):
+            names = [n for n in stage['steps'] if n in funcs]
+            if len(names) == 0:
+                continue
+            pipeline.add_stage('+'.join(names),
+                chained([funcs.pop(n) for n in names]),
+                workers=stage.get('workers', 1),
+                )
+
+        # remaining steps in own single worker stage
+        for name, func in funcs.items():
+            pipeline.add_stage(name, func)
+        return pipeline
+
+    def add_stage(self, name, func, workers=1):
+        self.stages.append(Stage(name, func, workers))
+
+    @staticmethod
+    def _put(queue, item, stop):
+        '''put item on queue, False if stopped while queue is full'''
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(queue, stop):
+        '''next item from queue, end of stream marker if stopped'''
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+        return _DONE
+
+    def _read(self, source, output, metrics, stop):
+        metrics.start = time.perf_counter()
+        try:
+            start = time.perf_counter()
+            for item in source:
+                metrics.add(time.perf_counter() - start)
+                if not self._put(output, item, stop):
+                    return
+                start = time.perf_counter()
+        except Exception as e:
+            self._put(output, _Failure('read', e), stop)
+        finally:
+            # close source in this thread, where it was iterated
+            getattr(source, 'close', lambda: None)()
+        metrics.end = time.perf_counter()
+        self._put(output, _DONE, stop)
+
+    def _work(self, stage, input_, output, metrics, remaining, stop):
+        while True:
+            metrics.sample(input_.qsize())
+            item = self._get(input_, stop)
+            if stop.is_set():
+                return
+            if item is _DONE:
+                # pass marker on to other workers, last worker signals output
+                self._put(input_, _DONE, stop)
+                with metrics.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    metrics.end = time.perf_counter()
+                    self._put(output, _DONE, stop)
+                return
+            if isinstance(item, _Failure):
+                self._put(output, item, stop)
+                continue
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                result = _Failure(stage.name, e)
+            metrics.add(time.perf_counter() - start)
+            if result is not None:
+                self._put(output, result, stop)
+
+    def run(self, source):
+        '''feed items from source through stages and yield results, threads
+        are stopped when consumer stops early or a stage fails'''
+        stop = threading.Event()
+        queues = [Queue(maxsize=self.queue_size)]
+        self.metrics['read'] = StageMetrics('read', 1, 0)
+        threads = [threading.Thread(
+            target=self._read,
+            args=(source, queues[0], self.metrics['read'], stop),
+            daemon=True,
+            )]
+        for stage in self.stages:
+            input_ = queues[-1]
+            output = Queue(maxsize=self.queue_size)
+            queues.append(output)
+            metrics = StageMetrics(stage.name, stage.workers, self.queue_size)
+            metrics.start = time.perf_counter()
+            self.metrics[stage.name] = metrics
+            remaining = [stage.workers]
+            for i in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, input_, output, metrics, remaining, stop),
+                    daemon=True,
+                    ))
+        for thread in threads:
+            thread.start()
+
+        # consume output of last stage
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    log.error('pipeline stage {} failed'.format(item.stage))
+                    raise item.error
+                yield item
+        finally:
+            # stop threads and drain queues to release blocked puts
+            stop.set()
+            for queue in queues:
+                while True:
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        break
+            for thread in threads:
+                thread.join(timeout=POLL_INTERVAL * 10)
+
+    def report(self):
+        '''log throughput and queue occupancy per stage'''
+        for metrics in self.metrics.values():
+            log.info((
+                '{m.name:}: {m.count:d} items, '
+                '{m.workers:d} workers, '
+                '{m.throughput:.1f} items/s, '
+                'busy {m.busy:.2f} s, '
+                'input queue {occupancy:.0%} mean, '
+                '{m.occupancy_max:d} max'
+                ).format(m=metrics, occupancy=metrics.occupancy))
+
+
+def apply_steps(items, steps, config=None):
+    '''apply named steps to items, in pipeline stages if enabled in config'''
+    config = config or {}
+    if not config.get('enabled', False):
+        func = chained([f for n, f in steps])
+        for item in items:
+            item = func(item)
+            if item is not None:
+                yield item
+        return
+
+    pipeline = Pipeline.from_steps(steps,
+        queue_size=config.get('queue_size', 64),
+        stages=config.get('stages'),
+        )
+    for item in pipeline.run(items):
+        yield item
+    pipeline.report()
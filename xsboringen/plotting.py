@@ -1,18 +1,61 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.solid import get_solid_data
-from xsboringen.surface import get_surface_data
+from xsboringen.labels import LabelLayout
+from xsboringen.parallel import Executor
+from xsboringen.rasterfiles import sample_linestring
 
 import matplotlib.patheffects as PathEffects
+from matplotlib.collections import LineCollection
 from matplotlib import pyplot as plt
 from matplotlib import transforms
-import joblib
+from shapely.geometry import shape
 import numpy as np
 
+from collections import defaultdict
 import logging
 import os
 
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def minmax_decimate(depth, values, nbuckets):
+    '''keep first, last, min and max value per depth bucket'''
+    depth = np.asarray(depth, dtype=float)
+    values = np.asarray(values, dtype=float)
+    nvalues = len(depth)
+    if (nbuckets < 1) or (nvalues <= nbuckets):
+        return depth, values
+
+    valid = ~np.isnan(depth)
+    if not valid.any():
+        return depth, values
+    dmin, dmax = depth[valid].min(), depth[valid].max()
+    if not dmax > dmin:
+        return depth, values
+
+    # bucket index along depth, -1 for missing depth
+    bucket = np.full(nvalues, -1, dtype=int)
+    bucket[valid] = np.clip(
+        ((depth[valid] - dmin) / (dmax - dmin) * nbuckets).astype(int),
+        0, nbuckets - 1,
+        )
+
+    # runs of consecutive values in the same bucket
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(bucket) != 0]))
+    ends = np.concatenate([starts[1:], [nvalues]])
+    run = np.repeat(np.arange(len(starts)), ends - starts)
+
+    # first and last index of each run and index of min and max value
+    keep = [starts, ends - 1]
+    for reduce_ in (np.fmin, np.fmax):
+        extreme = reduce_.reduceat(values, starts)
+        hit = np.flatnonzero(values == extreme[run])
+        _, first = np.unique(run[hit], return_index=True)
+        keep.append(hit[first])
+    keep = np.unique(np.concatenate(keep))
+    return depth[keep], values[keep]
+
 
 class Extensions(object):
     def __init__(self, xp, yp):
@@ -26,10 +69,12 @@ class Extensions(object):
 class CrossSectionPlot(object):
     def __init__(self, cross_section, styles, config,
         xtickstep=None, xlim=None, ylim=None, xlabel=None, ylabel=None, legend_ncol=1,
+        executor=None,
         ):
         self.cs = cross_section
         self.styles = styles
         self.cfg = config
+        self.executor = executor or Executor()
 
         self.xtickstep = xtickstep
         self.xlim = xlim or [0., self.cs.shape.length]
@@ -104,6 +149,46 @@ class CrossSectionPlot(object):
             )
         return txt
 
+    def layout_codes(self, ax, txts):
+        '''lay out code labels in batch with final axis limits, staggered
+        labels are moved up and culled labels are removed, return the
+        surviving labels'''
+        layout = LabelLayout(
+            fontsize=self.cfg.get('codelabel_fontsize'),
+            policy=self.cfg.get('codelabel_policy', 'all'),
+            max_levels=self.cfg.get('codelabel_levels', 2),
+            )
+
+        # axes size in points
+        figure_width, figure_height = ax.figure.get_size_inches()
+        position = ax.get_position()
+        axes_width = position.width * figure_width * 72.
+        axes_height = position.height * figure_height * 72.
+
+        xmin, xmax = ax.get_xlim()
+        points_per_unit = axes_width / (xmax - xmin)
+        labels = [(t.get_position()[0], t.get_text()) for t in txts]
+        offsets = {
+            label.index: label.offset
+            for label in layout.layout(labels, points_per_unit)
+            }
+        surviving = []
+        for i, txt in enumerate(txts):
+            if i in offsets:
+                if offsets[i] > 0.:
+                    txt.set_y(txt.get_position()[1] + offsets[i] / axes_height)
+                surviving.append(txt)
+            else:
+                txt.remove()
+        dropped = len(txts) - len(surviving)
+        if dropped > 0:
+            log.info((
+                'dropped {d:d} of {n:d} overlapping code labels in '
+                'cross-section {s.cs.label:}, set codelabel_policy to all '
+                'to plot all labels'
+                ).format(d=dropped, n=len(txts), s=self))
+        return surviving
+
     def plot_label(self, ax):
         if len(self.cs.label.split("_")) > 1:
             leftlabel, rightlabel = self.cs.label.split("_")[1]
@@ -185,10 +270,37 @@ class CrossSectionPlot(object):
         txt = self.plot_code(ax, plot_distance, borehole.code)
         return txt
 
+    def vertical_resolution(self, ax, depth):
+        '''number of pixel rows covered by vertical depth range'''
+        depth = np.asarray(depth, dtype=float)
+        if np.isnan(depth).all():
+            return 0
+        depth_range = np.nanmax(depth) - np.nanmin(depth)
+        if self.ylim is not None:
+            ymin, ymax = self.ylim
+            y_range = abs(ymax - ymin)
+        else:
+            y_range = depth_range
+        if not y_range > 0.:
+            return 0
+        _, figure_height = ax.figure.get_size_inches()
+        axes_height = ax.get_position().height * figure_height
+        pixels = axes_height * self.cfg.get('figure_dpi', 200)
+        return int(pixels * min(depth_range / y_range, 1.))
+
     def plot_vertical(self, ax, distance, vertical, extensions, width, style):
         plot_distance = extensions.extend(distance)
-        depth = np.array(vertical.depth, dtype=np.float)
-        rescaled = np.array(vertical.rescaled().values, dtype=np.float)
+        depth = np.array(vertical.depth, dtype=float)
+        rescaled = np.array(vertical.rescaled().values, dtype=float)
+
+        # level of detail: keep only as many points as pixel rows
+        if self.cfg.get('decimate_verticals', True):
+            nbuckets = int(
+                self.vertical_resolution(ax, depth) *
+                self.cfg.get('decimation_buckets_per_pixel', 0.5)
+                )
+            depth, rescaled = minmax_decimate(depth, rescaled, nbuckets)
+
         transformed = plot_distance + (rescaled - 0.5)*width
         vert = ax.plot(transformed, depth, **style)
         return vert
@@ -246,17 +358,22 @@ class CrossSectionPlot(object):
         else:
             return None
 
-    def plot_surface(self, ax, surface, extensions):
-        if not surface.has_data:
-            distance, values = surface.sample(self.cs.shape) 
+    def plot_surface(self, ax, surface, extensions, sampled=None):
+        if sampled is not None:
+            distance, values = sampled
+        elif not surface.has_data:
+            distance, values = surface.sample(self.cs.shape)
         else:
-            distance, values = surface.data        
+            distance, values = surface.data
         plot_distance = extensions.extend(distance)
         style = self.styles['surfaces'].lookup(surface.stylekey)
         sf = ax.plot(plot_distance, values, **style)
 
-    def plot_solid(self, ax, solid, extensions, min_thickness=0.):
-        if not solid.has_data:
+    def plot_solid(self, ax, solid, extensions, min_thickness=0.,
+            sampled=None):
+        if sampled is not None:
+            distance, top, base = sampled
+        elif not solid.has_data:
             distance, top, base = solid.sample(self.cs.shape)
         else:
             distance, top, base = solid.data
@@ -307,6 +424,40 @@ class CrossSectionPlot(object):
         # txt = ax.text(labelx, labely, solid.name, horizontalalignment="center", verticalalignment="center", size="small")
         # return txt
 
+    def sample_rasters(self):
+        '''sample rasters of surfaces and solids without data along line of
+        this cross-section as one batch of tasks, return sampled data per
+        surface and per solid, None if data is given, surfaces and solids
+        are shared between cross-sections and are not modified'''
+        linestring = self.cs.shape
+        rasterfiles = [
+            s.file for s in self.cs.surfaces if not s.has_data
+            ]
+        for solid in self.cs.solids:
+            if not solid.has_data:
+                rasterfiles.extend([solid.topfile, solid.basefile])
+
+        # workers only receive file and line and return sampled arrays
+        sampled = iter(self.executor.map(sample_linestring,
+            [(f, linestring) for f in rasterfiles],
+            stage='sample_linestring',
+            ))
+        surfaces_data = []
+        for surface in self.cs.surfaces:
+            if surface.has_data:
+                surfaces_data.append(None)
+            else:
+                surfaces_data.append(next(sampled))
+        solids_data = []
+        for solid in self.cs.solids:
+            if solid.has_data:
+                solids_data.append(None)
+            else:
+                distance, top = next(sampled)
+                distance, base = next(sampled)
+                solids_data.append((distance, top, base))
+        return surfaces_data, solids_data
+
     def plot(self, ax):
         # bounding box extra artists (title, legend, labels, etc.)
         bxa = []
@@ -333,12 +484,15 @@ class CrossSectionPlot(object):
         # get plot_distance and x-axis extensions     
         extensions = self.get_extensions(obj_distance)
 
+        # code labels, laid out with final axis limits
+        codelabels = []
+
         # plot boreholes
         for distance, borehole in self.cs.boreholes:
 
             # plot borehole
             txt = self.plot_borehole(ax, distance, borehole, extensions, self.barwidth)
-            bxa.append(txt)
+            codelabels.append(txt)
 
             # plot verticals
             for key in self.styles['verticals'].records:
@@ -377,7 +531,7 @@ class CrossSectionPlot(object):
                 extensions=extensions,
                 width=self.wellfilterwidth,
                 )
-            bxa.append(txt)
+            codelabels.append(txt)
 
         # plot points
         for distance, point in self.cs.points:
@@ -389,30 +543,23 @@ class CrossSectionPlot(object):
                 extensions=extensions,
                 )
 
+        # sample surfaces and solids along cross-section line
+        surfaces_data, solids_data = self.sample_rasters()
+
         # plot surfaces
-        if self.cfg["n_jobs"] > 1:
-            parallel = joblib.Parallel(n_jobs=self.cfg["n_jobs"])
-            get_data = joblib.delayed(get_surface_data)
-            self.cs.surfaces = parallel(get_data(s, self.cs.geometry) for s in self.cs.surfaces)
-        else:
-            self.cs.surfaces = [get_surface_data(s, self.cs.geometry) for s in self.cs.surfaces]
-        for surface in self.cs.surfaces:
+        for surface, sampled in zip(self.cs.surfaces, surfaces_data):
             self.plot_surface(ax,
                 surface=surface,
                 extensions=extensions,
+                sampled=sampled,
                 )
 
         # plot solids
-        if self.cfg["n_jobs"] > 1:
-            parallel = joblib.Parallel(n_jobs=self.cfg["n_jobs"])
-            get_data = joblib.delayed(get_solid_data)
-            self.cs.solids = parallel(get_data(s, self.cs.geometry) for s in self.cs.solids)
-        else:
-            self.cs.solids = [get_solid_data(s, self.cs.geometry) for s in self.cs.solids]
-        for solid in self.cs.solids:
+        for solid, sampled in zip(self.cs.solids, solids_data):
             self.plot_solid(ax,
                 solid=solid,
                 extensions=extensions,
+                sampled=sampled,
                 )
 
         # plot labels
@@ -442,6 +589,9 @@ class CrossSectionPlot(object):
         else:
             ax.autoscale(axis='y')
 
+        # lay out code labels with final axis limits
+        bxa.extend(self.layout_codes(ax, codelabels))
+
         # grid lines |--|--|--|
         ax.grid(linestyle='--', linewidth=0.5, color='black', zorder=0)
 
@@ -484,5 +634,178 @@ class CrossSectionPlot(object):
         plt.close()
 
 
-def MapPlot(object):
-    pass
+class MapPlot(object):
+    '''Overview map of boreholes, CPT's and wells with cross-section lines'''
+    def __init__(self, boreholes, config, wells=None, lines=None,
+        extent=None,
+        ):
+        self.boreholes = boreholes
+        self.wells = wells or []
+        self.lines = lines or []
+        self.cfg = config
+        self.extent = extent
+
+        # coordinates and codes per format
+        self.locations = defaultdict(lambda: ([], [], []))
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(formats={n:d}, '
+                'lines={l:d})').format(
+            s=self,
+            n=len(self.locations),
+            l=len(self.lines),
+            )
+
+    @staticmethod
+    def get_format(an_object):
+        return getattr(an_object, 'format', None) or an_object.__class__.__name__
+
+    def collect(self):
+        '''consume boreholes and wells in a single pass, keeping coordinates'''
+        count = 0
+        for an_object in self.boreholes:
+            if (an_object.x is None) or (an_object.y is None):
+                continue
+            xs, ys, codes = self.locations[self.get_format(an_object)]
+            xs.append(an_object.x)
+            ys.append(an_object.y)
+            codes.append(an_object.code)
+            count += 1
+        for well in self.wells:
+            if (well.x is None) or (well.y is None):
+                continue
+            xs, ys, codes = self.locations['Well']
+            xs.append(well.x)
+            ys.append(well.y)
+            codes.append(well.code)
+            count += 1
+        log.info('collected {:d} locations'.format(count))
+
+    def get_extent(self):
+        '''map extent as xmin, xmax, ymin, ymax'''
+        if self.extent is not None:
+            return self.extent
+        xs = [np.asarray(x, dtype=float) for x, y, c in self.locations.values()]
+        ys = [np.asarray(y, dtype=float) for x, y, c in self.locations.values()]
+        for label, geometry in self.lines:
+            xmin, ymin, xmax, ymax = shape(geometry).bounds
+            xs.append(np.array([xmin, xmax]))
+            ys.append(np.array([ymin, ymax]))
+        if len(xs) == 0:
+            return None
+        x = np.concatenate(xs)
+        y = np.concatenate(ys)
+        return x.min(), x.max(), y.min(), y.max()
+
+    def thin_labels(self, ax, x, y):
+        '''indices of labels to plot, at most one per grid cell of
+        label_spacing points, so more labels appear when zoomed in'''
+        xmin, xmax = ax.get_xlim()
+        ymin, ymax = ax.get_ylim()
+        inside = np.flatnonzero(
+            (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+            )
+        figure_width, figure_height = ax.figure.get_size_inches()
+        axes_width = ax.get_position().width * figure_width * 72.
+        cellsize = self.cfg.get('label_spacing', 50.) * (xmax - xmin) / axes_width
+        ix = np.floor((x[inside] - xmin) / cellsize).astype(np.int64)
+        iy = np.floor((y[inside] - ymin) / cellsize).astype(np.int64)
+        _, first = np.unique(ix * (iy.max(initial=0) + 1) + iy, return_index=True)
+        return inside[np.sort(first)]
+
+    def plot_locations(self, ax):
+        markers = self.cfg.get('markers') or {}
+        default_marker = self.cfg.get('default_marker', 'o')
+        markersize = self.cfg.get('markersize', 4.)
+        for fmt, (xs, ys, codes) in sorted(self.locations.items()):
+            ax.scatter(xs, ys,
+                s=markersize,
+                marker=markers.get(fmt, default_marker),
+                label=fmt,
+                rasterized=True,
+                zorder=2,
+                )
+
+    def plot_lines(self, ax):
+        if len(self.lines) == 0:
+            return
+        segments = []
+        for label, geometry in self.lines:
+            line = shape(geometry)
+
+            # parts of multi-part lines, labels at start and end of line
+            parts = [
+                np.asarray(part.coords)[:, :2]
+                for part in getattr(line, 'geoms', [line])
+                ]
+            segments.extend(parts)
+            for (x, y), text in zip(
+                    (parts[0][0], parts[-1][-1]), (label, label + '`')
+                    ):
+                ax.text(x, y, text, weight='bold', zorder=4,
+                    ha='center', va='bottom')
+        lc = LineCollection(segments, zorder=3,
+            **(self.cfg.get('line_style') or {}),
+            )
+        ax.add_collection(lc)
+
+    def plot_codes(self, ax):
+        xs, ys, codes = [], [], []
+        for x, y, c in self.locations.values():
+            xs.extend(x)
+            ys.extend(y)
+            codes.extend(c)
+        if len(codes) == 0:
+            return
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        selected = self.thin_labels(ax, x, y)
+        max_labels = self.cfg.get('max_labels', 2000)
+        if len(selected) > max_labels:
+            log.info('{:d} labels exceed max_labels, skipping labels'.format(
+                len(selected)))
+            return
+        fontsize = self.cfg.get('codelabel_fontsize', 4.)
+        for i in selected:
+            ax.text(x[i], y[i], codes[i], size=fontsize, color='gray',
+                ha='left', va='bottom', zorder=2)
+
+    def plot(self, ax):
+        self.collect()
+        self.plot_locations(ax)
+        self.plot_lines(ax)
+
+        # axis limits
+        extent = self.get_extent()
+        if extent is not None:
+            xmin, xmax, ymin, ymax = extent
+            ax.set_xlim(xmin, xmax)
+            ax.set_ylim(ymin, ymax)
+        ax.set_aspect('equal', adjustable='box')
+        ax.grid(linestyle='--', linewidth=0.5, color='black', zorder=0)
+
+        # code labels thinned to current zoom
+        ax.apply_aspect()
+        if self.cfg.get('plot_codes', True):
+            self.plot_codes(ax)
+
+        if len(self.locations) > 0:
+            ax.legend(loc='upper left', bbox_to_anchor=(1.01, 1.))
+
+    def to_image(self, imagefile, **save_kwargs):
+        # figure
+        figsize = self.cfg.get('figure_size')
+        fig, ax = plt.subplots(figsize=figsize)
+
+        # plot map
+        self.plot(ax)
+
+        # save figure
+        plt.savefig(imagefile,
+            bbox_inches='tight',
+            dpi=self.cfg.get('figure_dpi', 200),
+            **save_kwargs,
+            )
+
+        # close figure
+        plt.close()
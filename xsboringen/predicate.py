@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import nan_to_none
+from xsboringen import utils
+
+from shapely.geometry import Point
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# value not known yet when predicate is applied
+MISSING = object()
+
+
+class Predicate(object):
+    '''Selection of boreholes, points and wells by location, code, minimum
+    depth and quality, applied by readers on the values known at the
+    cheapest point, before segments and verticals are read'''
+    def __init__(self, bbox=None, polygon=None, min_depth=None,
+            quality=None, codes=None,
+            ):
+        self.polygon = utils.as_geometry(polygon)
+        self.bbox = utils.bounds(bbox, self.polygon)
+        self.min_depth = min_depth
+        self.quality = set(quality) if quality is not None else None
+        self.codes = set(str(c) for c in codes) if codes is not None else None
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(bbox={s.bbox:}, '
+                'min_depth={s.min_depth:}, quality={s.quality:}, '
+                'codes={n:})').format(
+            s=self, n=None if self.codes is None else len(self.codes))
+
+    @classmethod
+    def from_spec(cls, spec=None, **kwargs):
+        '''predicate from Predicate or dict with bbox, polygon, min_depth,
+        quality and codes, combined with keyword arguments, None if nothing
+        is selected'''
+        if isinstance(spec, Predicate):
+            spec = spec.as_dict()
+        spec = dict(spec or {})
+        for key, value in kwargs.items():
+            if value is None:
+                continue
+            if spec.get(key) is None:
+                spec[key] = value
+            elif key == 'bbox':
+                bbox = spec[key]
+                spec[key] = (
+                    max(bbox[0], value[0]), max(bbox[1], value[1]),
+                    min(bbox[2], value[2]), min(bbox[3], value[3]),
+                    )
+            elif key == 'polygon':
+                spec[key] = utils.as_geometry(spec[key]).intersection(
+                    utils.as_geometry(value))
+            elif key == 'min_depth':
+                spec[key] = max(spec[key], value)
+            elif key == 'codes':
+                spec[key] = (
+                    set(str(c) for c in spec[key]) &
+                    set(str(c) for c in value)
+                    )
+            else:
+                spec[key] = set(spec[key]) & set(value)
+        if all(v is None for v in spec.values()):
+            return None
+        return cls(**spec)
+
+    def as_dict(self):
+        return {
+            'bbox': self.bbox,
+            'polygon': self.polygon,
+            'min_depth': self.min_depth,
+            'quality': self.quality,
+            'codes': self.codes,
+            }
+
+    def spatial_dict(self):
+        '''selection by location and code only'''
+        return {
+            'bbox': self.bbox,
+            'polygon': self.polygon,
+            'codes': self.codes,
+            }
+
+    @property
+    def is_spatial(self):
+        return self.bbox is not None
+
+    def accepts_location(self, x, y):
+        if self.bbox is None:
+            return True
+        if (x is None) or (y is None):
+            return False
+        xmin, ymin, xmax, ymax = self.bbox
+        if not ((xmin <= x <= xmax) and (ymin <= y <= ymax)):
+            return False
+        if self.polygon is not None:
+            return self.polygon.intersects(Point(x, y))
+        return True
+
+    def accepts_code(self, code):
+        return (self.codes is None) or (str(code) in self.codes)
+
+    def accepts_depth(self, depth):
+        if self.min_depth is None:
+            return True
+        return (depth is not None) and (depth >= self.min_depth)
+
+    def accepts_quality(self, quality):
+        '''records without quality are accepted'''
+        return (
+            (self.quality is None) or (quality is None) or
+            (quality in self.quality)
+            )
+
+    def accepts(self, code=MISSING, x=MISSING, y=MISSING, depth=MISSING,
+            quality=MISSING,
+            ):
+        '''check values known so far, missing values are not checked'''
+        if (code is not MISSING) and not self.accepts_code(code):
+            return False
+        if ((x is not MISSING) and (y is not MISSING) and
+                not self.accepts_location(x, y)):
+            return False
+        if (depth is not MISSING) and not self.accepts_depth(depth):
+            return False
+        if (quality is not MISSING) and not self.accepts_quality(quality):
+            return False
+        return True
+
+    def accepts_borehole(self, borehole):
+        return self.accepts(
+            code=borehole.code,
+            x=borehole.x,
+            y=borehole.y,
+            depth=borehole.depth,
+            quality=getattr(borehole, 'quality', None),
+            )
+
+    def select(self, table):
+        '''SegmentTable with accepted boreholes only'''
+        columns = {
+            k: nan_to_none(table.boreholes[k])
+            for k in ('code', 'x', 'y', 'depth', 'quality')
+            if k in table.boreholes
+            }
+        indices = [
+            i for i in range(len(table))
+            if self.accepts(**{k: v[i] for k, v in columns.items()})
+            ]
+        if len(indices) == len(table):
+            return table
+        return table.take(indices)
+
+    def spatial(self):
+        '''predicate on location and code only, for points and wells'''
+        return Predicate.from_spec(self.spatial_dict())
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.archives import ArchiveMember
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from pathlib import Path
+import logging
+import io
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def read_bytes(source):
+    '''raw bytes of source file or archive member'''
+    if isinstance(source, ArchiveMember):
+        with source.open('rb') as f:
+            return f.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def source_size(source):
+    '''size of source file or archive member in bytes, None if unknown'''
+    try:
+        if isinstance(source, ArchiveMember):
+            return source.stat().st_size
+        return os.stat(source).st_size
+    except OSError:
+        return None
+
+
+def buffer_source(source):
+    '''source read into memory, or source itself if it cannot be read so
+    that the reader reports the error'''
+    try:
+        return BufferedSource(source, read_bytes(source))
+    except OSError:
+        return source
+
+
+def prefetched(sources, depth=0, memory_mb=256, max_file_mb=16):
+    '''sources read ahead into memory if depth > 0, else sources as is'''
+    if depth <= 0:
+        for source in sources:
+            yield source
+        return
+    prefetcher = Prefetcher(depth=depth,
+        memory_mb=memory_mb,
+        max_file_mb=max_file_mb,
+        )
+    for source, buffered in prefetcher.imap(sources):
+        yield buffered if buffered is not None else source
+
+
+class BufferedSource(object):
+    '''Source file or archive member read into memory, opened by readers in
+    place of the source'''
+    def __init__(self, source, data):
+        self.source = source
+        self.data = data
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(source=\'{s.name:}\', '
+                'size={s.size:d})').format(s=self)
+
+    def __str__(self):
+        return str(self.source)
+
+    @property
+    def name(self):
+        if isinstance(self.source, ArchiveMember):
+            return self.source.name
+        return Path(self.source).name
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def open(self, mode='r', encoding=None, errors=None):
+        '''binary or text stream of buffered data'''
+        handle = io.BytesIO(self.data)
+        if 'b' in mode:
+            return handle
+        return io.TextIOWrapper(handle, encoding=encoding, errors=errors)
+
+
+class Prefetcher(object):
+    '''Read-ahead of source files on a thread pool, up to depth files and
+    while submitted bytes are within memory budget, so that open and read
+    latency overlaps with parsing, files larger than max_file_mb are not
+    read ahead'''
+    def __init__(self, depth=8, memory_mb=256, max_file_mb=16,
+            n_workers=None,
+            ):
+        self.depth = max(int(depth), 1)
+        self.memory = memory_mb * 1024 ** 2
+        self.max_file_size = max_file_mb * 1024 ** 2
+        self.n_workers = n_workers or self.depth
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(depth={s.depth:d}, '
+                'memory_mb={m:.0f})').format(s=self, m=self.memory / 1024 ** 2)
+
+    @staticmethod
+    def buffered(pending):
+        '''bytes submitted for reading ahead and not yet consumed'''
+        return sum(size for _, _, size in pending)
+
+    def imap(self, items, source=None, size=None):
+        '''yield each item with its source read into memory, function source
+        returns source of item or None to skip reading ahead, item is source
+        if function is None, function size returns known size of source of
+        item or None'''
+        source = source or (lambda i: i)
+        size = size or (lambda i: None)
+        pool = ThreadPoolExecutor(max_workers=self.n_workers)
+        pending = deque()
+        items = iter(items)
+        exhausted = False
+        try:
+            while True:
+                # read ahead up to depth and memory budget
+                while ((not exhausted) and (len(pending) < self.depth) and
+                        (self.buffered(pending) < self.memory)):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    item_source = source(item)
+                    item_size = None
+                    if item_source is not None:
+                        item_size = size(item)
+                        if item_size is None:
+                            item_size = source_size(item_source) or 0
+                        if item_size > self.max_file_size:
+                            item_source = None
+                    if item_source is not None:
+                        future = pool.submit(buffer_source, item_source)
+                    else:
+                        future = Future()
+                        future.set_result(None)
+                        item_size = 0
+                    pending.append((item, future, item_size))
+
+                if len(pending) == 0:
+                    break
+
+                item, future, _ = pending.popleft()
+                yield item, future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
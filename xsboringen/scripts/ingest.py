@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.calc import AdmixClassifier
+from xsboringen.database import BoreholeDatabase
+from xsboringen.discovery import Discovery
+from xsboringen.datasources import borehole_tasks, point_tasks, well_tasks
+from xsboringen.datasources import read_task, log_failure
+from xsboringen.parallel import Executor
+
+from itertools import chain
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def ingest(**kwargs):
+    # args
+    datasources = kwargs['datasources']
+    result = kwargs['result']
+    config = kwargs['config']
+
+    # reading tasks per kind, sources already in a database are skipped
+    admixclassifier = AdmixClassifier(
+        config['admix_fieldnames']
+        )
+    ingest_config = config['ingest']
+    discovery = Discovery(
+        ingest_config.get('listing_cache_file'),
+        n_workers=ingest_config.get('discovery_workers', 8),
+        )
+    is_file = lambda d: d['format'] != 'Database'
+    tasks = {
+        'boreholes': chain(*[
+            borehole_tasks(d, admixclassifier, discovery=discovery)
+            for d in datasources.get('boreholes') or [] if is_file(d)
+            ]),
+        'points': chain(*[
+            point_tasks(d)
+            for d in datasources.get('points') or [] if is_file(d)
+            ]),
+        'wells': chain(*[
+            well_tasks(d)
+            for d in datasources.get('wells') or [] if is_file(d)
+            ]),
+        }
+
+    with BoreholeDatabase(result['database']) as database:
+        pruned = database.prune()
+        if pruned > 0:
+            log.info('removed {:d} missing files'.format(pruned))
+
+        for kind, kind_tasks in tasks.items():
+            kind_tasks = list(kind_tasks)
+            stale = database.stale(kind_tasks)
+            stale_tasks = {str(t.file): t for t in stale}
+
+            # parse new and modified files, on process pool if n_jobs > 1
+            failed = 0
+            executor = Executor(
+                n_jobs=ingest_config.get('n_jobs', 1),
+                backend='processes',
+                )
+            try:
+                for file, objects, error in executor.imap(read_task, stale,
+                        ordered=False,
+                        queue_size=ingest_config.get('queue_size'),
+                        ):
+                    if error is not None:
+                        log_failure(file, error)
+                        failed += 1
+                        continue
+                    database.store(stale_tasks[str(file)], kind, objects)
+            finally:
+                executor.close()
+
+            log.info((
+                '{kind:}: {n:d} files ingested, {u:d} unchanged, '
+                '{f:d} failed').format(
+                    kind=kind,
+                    n=len(stale) - failed,
+                    u=len(kind_tasks) - len(stale),
+                    f=failed,
+                    ))
+
+    # save folder listings
+    discovery.close()
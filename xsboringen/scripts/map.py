@@ -2,11 +2,10 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
+from xsboringen.datasources import boreholes_from_sources, wells_from_sources
 from xsboringen import plotting
 from xsboringen import shapefiles
 
-import yaml
-
 from pathlib import Path
 import logging
 import os
@@ -17,13 +16,46 @@ log = logging.getLogger(os.path.basename(__file__))
 def plot_map(**kwargs):
     # args
     datasources = kwargs['datasources']
-    cross_section_lines = kwargs['cross_section_lines']
     result = kwargs['result']
     config = kwargs['config']
 
-    css = []
-    for row in shapefiles.read(cross_section_lines['file']):
-        plt = plotting.MapPlot(
-
-            )
-
+    # optional args
+    cross_section_lines = kwargs.get('cross_section_lines')
+    extent = kwargs.get('extent')
+
+    # read boreholes and CPT's from data folders, header fields only,
+    # consumed in a single pass
+    borehole_sources = datasources.get('boreholes') or []
+    boreholes = boreholes_from_sources(borehole_sources,
+        lazy=True,
+        **config['ingest'],
+        )
+
+    # read wells
+    wells_sources = datasources.get('wells') or []
+    wells = wells_from_sources(wells_sources)
+
+    # cross-section lines as (label, geometry)
+    lines = []
+    if cross_section_lines is not None:
+        defaultlabels = iter(config['defaultlabels'])
+        for row in shapefiles.read(cross_section_lines['file']):
+            if cross_section_lines.get('labelfield') is not None:
+                label = row['properties'][cross_section_lines['labelfield']]
+            else:
+                label = next(defaultlabels)
+            lines.append((label, row['geometry']))
+
+    # define map plot
+    plt = plotting.MapPlot(
+        boreholes=boreholes,
+        wells=wells,
+        lines=lines,
+        config=config['map_plot'],
+        extent=extent,
+        )
+
+    # plot and save to image file
+    imagefile = Path(result['imagefile'])
+    log.info('saving {f.name:}'.format(f=imagefile))
+    plt.to_image(str(imagefile))
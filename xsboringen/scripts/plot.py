@@ -6,9 +6,13 @@ from xsboringen import cross_section
 from xsboringen.calc import SandmedianClassifier, AdmixClassifier, LithologyClassifier
 from xsboringen.csvfiles import cross_section_to_csv
 from xsboringen.datasources import boreholes_from_sources, points_from_sources, wells_from_sources
+from xsboringen.pipeline import apply_steps
 from xsboringen.surface import Surface
 from xsboringen.solid import Solid
 from xsboringen.groundlayermodel import GroundLayerModel
+from xsboringen.manifest import PlotManifest, cross_section_fingerprint
+from xsboringen.manifest import digest, file_stamp
+from xsboringen.parallel import Executor
 from xsboringen import plotting
 from xsboringen import shapefiles
 from xsboringen import styles
@@ -39,17 +43,84 @@ def plot_cross_section(**kwargs):
     ylim = kwargs.get('ylim')
     xlabel = kwargs.get('xlabel')
     ylabel = kwargs.get('ylabel')
+    force = kwargs.get('force', False)
 
     # create image folder
     folder = Path(result['folder'])
     folder.mkdir(exist_ok=True)
 
-    # read boreholes and CPT's from data folders
+    # manifest of plotted cross-sections for incremental builds
+    manifest = PlotManifest(folder / config['manifest_filename'])
+
+    # digest of settings, before styles lookups consume the style records
+    regisindexfile = (datasources.get('regismodel') or {}).get('indexfile')
+    settings = digest(
+        dict(config['cross_section_plot']),
+        config['styles'],
+        config['image_filename_format'],
+        config['csv_filename_format'],
+        result,
+        datasources.get('regismodel'),
+        regisindexfile and file_stamp(regisindexfile),
+        xtickstep, xlabel, ylabel,
+        )
+
+    # default labels
+    defaultlabels = iter(config['defaultlabels'])
+
+    # selected set
+    selected = cross_section_lines.get('selected')
+    if selected is not None:
+        selected = set(selected)
+
+    # read cross-section lines first, to select data within buffers
+    lines = []
+    for row in shapefiles.read(cross_section_lines['file']):
+        # get label
+        if cross_section_lines.get('labelfield') is not None:
+            label = row['properties'][cross_section_lines['labelfield']]
+        else:
+            label = next(defaultlabels)
+
+        if (selected is not None) and (label not in selected):
+            log.warning('skipping {label:}'.format(label=label))
+            continue
+
+        lines.append((label, row))
+
+    # union of buffers, data outside is skipped by readers
+    sections_area = cross_section.buffer_union(
+        [row['geometry'] for label, row in lines],
+        buffer_distance,
+        )
+
+    # read boreholes and CPT's from data folders, boreholes outside buffers
+    # or less than minimal depth or quality are skipped by readers
     admixclassifier = AdmixClassifier(
         config['admix_fieldnames']
         )
     borehole_sources = datasources.get('boreholes') or []
-    boreholes = boreholes_from_sources(borehole_sources, admixclassifier)
+    boreholes = boreholes_from_sources(borehole_sources, admixclassifier,
+        predicate={
+            'polygon': sections_area,
+            'min_depth': min_depth,
+            'quality': min_quality,
+            },
+        **config['ingest'],
+        )
+
+    # filter missing coordinates and less than minimal depth, before
+    # processing steps
+    boreholes = (
+        b for b in boreholes
+        if
+        (b.x is not None) and
+        (b.y is not None) and
+        (b.z is not None) and
+        (b.depth is not None) and
+        (b.depth >= min_depth) and
+        ((min_quality is None) or (not hasattr(b, "quality")) or (b.quality in min_quality))
+        )
 
     # segment styles lookup
     segmentstyles = styles.SegmentStylesLookup(**config['styles']['segments'])
@@ -66,39 +137,46 @@ def plot_cross_section(**kwargs):
     # solid styles lookup
     solidstyles = styles.SimpleStylesLookup(**config['styles']['solids'])
 
+    # processing steps, run in pipeline stages if configured
+    steps = []
+
     # translate CPT to lithology if needed
     if result.get('translate_cpt', True):
         table = config['cpt_classification']
         lithologyclassifier = LithologyClassifier(table)
-        boreholes = (
-            b.to_lithology(lithologyclassifier, admixclassifier)
-            for b in boreholes
-            )
+        steps.append(('to_lithology',
+            lambda b: b.to_lithology(lithologyclassifier, admixclassifier),
+            ))
 
     # classify sandmedian if needed
     if result.get('classify_sandmedian', True):
         bins = config['sandmedianbins']
         sandmedianclassifier = SandmedianClassifier(bins)
-        boreholes = (
-            b.update_sandmedianclass(sandmedianclassifier) for b in boreholes
-            )
+        steps.append(('update_sandmedianclass',
+            lambda b: b.update_sandmedianclass(sandmedianclassifier),
+            ))
 
     # simplify if needed
     if result.get('simplify', True):
         min_thickness = result.get('min_thickness')
         by_legend = lambda s: {'record': segmentstyles.lookup(s)}
-        boreholes = (
-            b.simplified(min_thickness=min_thickness, by=by_legend)
-            for b in boreholes
-            )
+        steps.append(('simplified',
+            lambda b: b.simplified(min_thickness=min_thickness, by=by_legend),
+            ))
 
-    # read points
+    boreholes = apply_steps(boreholes, steps, config.get('pipeline'))
+
+    # read points within buffers
     point_sources = datasources.get('points') or []
-    points = points_from_sources(point_sources)
+    points = points_from_sources(point_sources,
+        predicate={'polygon': sections_area},
+        )
 
-    # read wells
+    # read wells within buffers
     wells_sources = datasources.get('wells') or []
-    wells = wells_from_sources(wells_sources)
+    wells = wells_from_sources(wells_sources,
+        predicate={'polygon': sections_area},
+        )
 
     # surfaces
     surfaces = datasources.get('surfaces') or []
@@ -125,17 +203,8 @@ def plot_cross_section(**kwargs):
     else:
         regismodel = None
 
-    # filter missing coordinates and less than minimal depth
-    boreholes = [
-        b for b in boreholes
-        if
-        (b.x is not None) and
-        (b.y is not None) and
-        (b.z is not None) and
-        (b.depth is not None) and
-        (b.depth >= min_depth) and
-        ((min_quality is None) or (not hasattr(b, "quality")) or (b.quality in min_quality))
-        ]
+    # processed boreholes as list
+    boreholes = [b for b in boreholes]
 
     points = [
         p for p in points
@@ -153,121 +222,149 @@ def plot_cross_section(**kwargs):
         (w.filterbottomlevel is not None)
         ]
 
-    # default labels
-    defaultlabels = iter(config['defaultlabels'])
-
-    # selected set
-    selected = cross_section_lines.get('selected')
-    if selected is not None:
-        selected = set(selected)
+    # run-wide executor for raster sampling, shared by all cross-sections
+    plot_config = config['cross_section_plot']
+    executor = Executor(
+        n_jobs=plot_config.get('n_jobs', 1),
+        backend=plot_config.get('parallel_backend', 'threads'),
+        )
+    executor.start()
 
     css = []
-    for row in shapefiles.read(cross_section_lines['file']):
-        # get label
-        if cross_section_lines.get('labelfield') is not None:
-            label = row['properties'][cross_section_lines['labelfield']]
-        else:
-            label = next(defaultlabels)
-
-        if ('yminfield' in cross_section_lines) and ('ymaxfield' in cross_section_lines):
-            ymin = row['properties'][cross_section_lines['yminfield']]
-            ymax = row['properties'][cross_section_lines['ymaxfield']]
-            ylim = [ymin, ymax]
-
-        if (selected is not None) and (label not in selected):
-            log.warning('skipping {label:}'.format(label=label))
-            continue
-
-        # log message
-        log.info('cross-section {label:}'.format(label=label))
-
-        # define cross-section
-        cs = cross_section.CrossSection(
-            geometry=row['geometry'],
-            label=label,
-            buffer_distance=buffer_distance,
-            )
-
-        # add boreholes to cross-section
-        cs.add_boreholes(boreholes)
-
-        # add points to cross_section
-        cs.add_points(points)
-
-        # add wells to cross-section
-        if cross_section_lines.get('locationfield') is not None:
-            wells_selector = lambda w: w.location == row['properties'][cross_section_lines['locationfield']]
-            cs.add_wells(wells, wells_selector)
-        else:
-            cs.add_wells(wells)
-
-        # add surfaces to cross-section
-        for surface in surfaces:
-            cs.add_surface(Surface(
-                name=surface['name'],
-                surfacefile=surface['file'],
-                stylekey=surface['style'],
-                ))
-
-        # add solids to cross-section
-        for solid in solids:
-            cs.add_solid(Solid(
-                name=solid['name'],
-                topfile=solid['topfile'],
-                basefile=solid['basefile'],
-                stylekey=solid['style'],
-                ))
-
-        # add regis solids to cross-section
-        solidstyles_with_regis = solidstyles.copy(deep=True)
-        if (regismodel is not None):
-            for number, solid in regismodel.solids:
-                cs.add_solid(solid)
-                solidstyles_with_regis.add(
-                    key=solid.name,
-                    label=solid.name,
-                    record=regismodel.styles.get(solid.name) or {},
-                    )
-
-        # definest styles lookup
-        plotting_styles = {
-            'segments': segmentstyles,
-            'wells': wellstyles,
-            'verticals': verticalstyles,
-            'surfaces': surfacestyles,
-            'solids': solidstyles_with_regis,
-            }
-
-        # define plot
-        plt = plotting.CrossSectionPlot(
-            cross_section=cs,
-            config=config['cross_section_plot'],
-            styles=plotting_styles,
-            xtickstep=xtickstep,
-            ylim=ylim,
-            xlabel=xlabel,
-            ylabel=ylabel,
-            legend_ncol=int(regismodel is not None) + 1,
-            )
-
-        # plot and save to PNG file
-        imagefilename = config['image_filename_format'].format(label=label)
-        imagefile = folder / imagefilename
-        log.info('saving {f.name:}'.format(f=imagefile))
-        plt.to_image(str(imagefile))
-
-        # save to CSV file
-        csvfilename = config['csv_filename_format'].format(label=label)
-        csvfile = folder / csvfilename
-        log.info('saving {f.name:}'.format(f=csvfile))
-        extra_fields = result.get('extra_fields') or {}
-        extra_fields = {k: tuple(v) for k, v in extra_fields.items()}
-        cross_section_to_csv(cs, str(csvfile),
-            extra_fields=extra_fields,
-            )
-
-        # collect cross-sections
-        css.append(cs)
+    try:
+        for label, row in lines:
+            if ('yminfield' in cross_section_lines) and ('ymaxfield' in cross_section_lines):
+                ymin = row['properties'][cross_section_lines['yminfield']]
+                ymax = row['properties'][cross_section_lines['ymaxfield']]
+                ylim = [ymin, ymax]
+
+            # log message
+            log.info('cross-section {label:}'.format(label=label))
+
+            # define cross-section
+            cs = cross_section.CrossSection(
+                geometry=row['geometry'],
+                label=label,
+                buffer_distance=buffer_distance,
+                )
+
+            # add boreholes to cross-section
+            cs.add_boreholes(boreholes)
+
+            # add points to cross_section
+            cs.add_points(points)
+
+            # add wells to cross-section
+            if cross_section_lines.get('locationfield') is not None:
+                wells_selector = lambda w: w.location == row['properties'][cross_section_lines['locationfield']]
+                cs.add_wells(wells, wells_selector)
+            else:
+                cs.add_wells(wells)
+
+            # add surfaces to cross-section
+            for surface in surfaces:
+                cs.add_surface(Surface(
+                    name=surface['name'],
+                    surfacefile=surface['file'],
+                    stylekey=surface['style'],
+                    ))
+
+            # add solids to cross-section
+            for solid in solids:
+                cs.add_solid(Solid(
+                    name=solid['name'],
+                    topfile=solid['topfile'],
+                    basefile=solid['basefile'],
+                    stylekey=solid['style'],
+                    ))
+
+            # add regis solids to cross-section
+            solidstyles_with_regis = solidstyles.copy(deep=True)
+            if (regismodel is not None):
+                for number, solid in regismodel.solids:
+                    cs.add_solid(solid)
+                    solidstyles_with_regis.add(
+                        key=solid.name,
+                        label=solid.name,
+                        record=regismodel.styles.get(solid.name) or {},
+                        )
+
+            # definest styles lookup
+            plotting_styles = {
+                'segments': segmentstyles,
+                'wells': wellstyles,
+                'verticals': verticalstyles,
+                'surfaces': surfacestyles,
+                'solids': solidstyles_with_regis,
+                }
+
+            # output files
+            imagefilename = config['image_filename_format'].format(label=label)
+            imagefile = folder / imagefilename
+            csvfilename = config['csv_filename_format'].format(label=label)
+            csvfile = folder / csvfilename
+
+            # skip cross-section if inputs and settings did not change
+            fingerprint = cross_section_fingerprint(cs, settings=[settings, ylim])
+            if (not force) and manifest.is_current(label, fingerprint,
+                    imagefile, csvfile):
+                log.info('cross-section {label:} unchanged, skipping'.format(
+                    label=label))
+                cs.sort()
+                cs.drop_duplicates()
+                css.append(cs)
+                continue
+
+            # define plot
+            plt = plotting.CrossSectionPlot(
+                cross_section=cs,
+                config=config['cross_section_plot'],
+                styles=plotting_styles,
+                xtickstep=xtickstep,
+                ylim=ylim,
+                xlabel=xlabel,
+                ylabel=ylabel,
+                legend_ncol=int(regismodel is not None) + 1,
+                executor=executor,
+                )
+
+            # plot and save to PNG file
+            log.info('saving {f.name:}'.format(f=imagefile))
+            plt.to_image(str(imagefile))
+
+            # save to CSV file
+            log.info('saving {f.name:}'.format(f=csvfile))
+            extra_fields = result.get('extra_fields') or {}
+            extra_fields = {k: tuple(v) for k, v in extra_fields.items()}
+            cross_section_to_csv(cs, str(csvfile),
+                extra_fields=extra_fields,
+                )
+
+            # update manifest after both files are saved
+            manifest.update(label, fingerprint)
+            manifest.save()
+
+            # collect cross-sections
+            css.append(cs)
+    finally:
+        # stop workers, also if plotting fails
+        executor.close()
+
+    # report task timings
+    executor.report()
+
+    # report of data read within buffers and used in cross-sections
+    log.info((
+        'read {nb:d} boreholes, {np:d} points and {nw:d} wells within '
+        '{d:.0f} m of {nl:d} cross-sections, {ub:d} boreholes used'
+        ).format(
+            nb=len(boreholes),
+            np=len(points),
+            nw=len(wells),
+            d=buffer_distance,
+            nl=len(lines),
+            ub=len({id(b) for cs in css for d, b in cs.boreholes}),
+            ))
 
     # export endpoints
     endpointsfile = folder / 'endpoints.shp'
@@ -5,6 +5,7 @@
 from xsboringen.calc import SandmedianClassifier, AdmixClassifier, LithologyClassifier
 from xsboringen.csvfiles import boreholes_to_csv
 from xsboringen.datasources import boreholes_from_sources
+from xsboringen.pipeline import apply_steps
 
 import logging
 import os
@@ -23,24 +24,42 @@ def write_csv(**kwargs):
         config['admix_fieldnames']
         )
     borehole_sources = datasources.get('boreholes') or []
-    boreholes = boreholes_from_sources(borehole_sources, admixclassifier)
+    boreholes = boreholes_from_sources(borehole_sources, admixclassifier,
+        **config['ingest'],
+        )
+
+    # processing steps, run in pipeline stages if configured
+    steps = processing_steps(result, config, admixclassifier)
+    boreholes = apply_steps(boreholes, steps, config.get('pipeline'))
+
+    # write output to csv
+    extra_fields = result.get('extra_fields') or {}
+    extra_fields = {k: tuple(v) for k, v in extra_fields.items()}
+    boreholes_to_csv(boreholes, result['csvfile'],
+        extra_fields=extra_fields,
+        compress=result.get('compress'),
+        )
+
+
+def processing_steps(result, config, admixclassifier):
+    '''named processing steps of boreholes as configured for result'''
+    steps = []
 
     # translate CPT to lithology if needed
     if result.get('translate_cpt', False):
         table = config['cpt_classification']
         lithologyclassifier = LithologyClassifier(table)
-        boreholes = (
-            b.to_lithology(lithologyclassifier, admixclassifier)
-            for b in boreholes
-            )
+        steps.append(('to_lithology',
+            lambda b: b.to_lithology(lithologyclassifier, admixclassifier),
+            ))
 
     # classify sandmedian if needed
     if result.get('classify_sandmedian', False):
         bins = config['sandmedianbins']
         sandmedianclassifier = SandmedianClassifier(bins)
-        boreholes = (
-            b.update_sandmedianclass(sandmedianclassifier) for b in boreholes
-            )
+        steps.append(('update_sandmedianclass',
+            lambda b: b.update_sandmedianclass(sandmedianclassifier),
+            ))
 
     # simplify if needed
     if result.get('simplify', False):
@@ -49,15 +68,7 @@ def write_csv(**kwargs):
         if not isinstance(simplify_by, list):
             simplify_by = [simplify_by,]
         by = lambda s: {a: getattr(s, a) for a in simplify_by}
-        boreholes = (
-            b.simplified(min_thickness=min_thickness, by=by)
-            for b in boreholes
-            )
-
-    # write output to csv
-    extra_fields = result.get('extra_fields') or {}
-    extra_fields = {k: tuple(v) for k, v in extra_fields.items()}
-    boreholes_to_csv(boreholes, result['csvfile'],
-        extra_fields=extra_fields,
-        )
-
+        steps.append(('simplified',
+            lambda b: b.simplified(min_thickness=min_thickness, by=by),
+            ))
+    return steps
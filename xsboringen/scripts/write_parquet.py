@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.calc import AdmixClassifier
+from xsboringen.datasources import boreholes_from_sources
+from xsboringen.parquetfiles import boreholes_to_parquet, DICTIONARY_FIELDS
+from xsboringen.pipeline import apply_steps
+from xsboringen.scripts.write_csv import processing_steps
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def write_parquet(**kwargs):
+    # args
+    datasources = kwargs['datasources']
+    result = kwargs['result']
+    config = kwargs['config']
+
+    # read boreholes and CPT's from data folders
+    admixclassifier = AdmixClassifier(
+        config['admix_fieldnames']
+        )
+    borehole_sources = datasources.get('boreholes') or []
+    boreholes = boreholes_from_sources(borehole_sources, admixclassifier,
+        **config['ingest'],
+        )
+
+    # processing steps, run in pipeline stages if configured
+    steps = processing_steps(result, config, admixclassifier)
+    boreholes = apply_steps(boreholes, steps, config.get('pipeline'))
+
+    # lithology and admix columns dictionary encoded
+    dictionary_fields = (
+        list(DICTIONARY_FIELDS) +
+        list(config['admix_fieldnames'].values()) +
+        (result.get('dictionary_fields') or [])
+        )
+
+    # write boreholes and segments tables to folder
+    parquet = dict(config['parquet'])
+    parquet.update({k: result[k] for k in parquet if k in result})
+    boreholes_to_parquet(boreholes, result['folder'],
+        extra_fields=result.get('extra_fields'),
+        dictionary_fields=dictionary_fields,
+        **parquet,
+        )
@@ -17,9 +17,12 @@ def write_shape(**kwargs):
     result = kwargs['result']
     config = kwargs['config']
 
-    # read boreholes and CPT's from data folders
+    # read boreholes and CPT's from data folders, header fields only
     borehole_sources = datasources.get('boreholes') or []
-    boreholes = boreholes_from_sources(borehole_sources)
+    boreholes = boreholes_from_sources(borehole_sources,
+        lazy=True,
+        **config['ingest'],
+        )
 
     # write output to shapefile
     shape_fields=result.get('shape_fields') or []
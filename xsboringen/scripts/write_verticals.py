@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.cpt import CPT
+from xsboringen.datasources import boreholes_from_sources
+from xsboringen.verticalstore import COMPACT_RATIO, cpts_to_store
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def write_verticals(**kwargs):
+    # args
+    datasources = kwargs['datasources']
+    result = kwargs['result']
+    config = kwargs['config']
+
+    # read CPT's from data folders
+    borehole_sources = datasources.get('boreholes') or []
+    boreholes = boreholes_from_sources(borehole_sources,
+        **config['ingest'],
+        )
+    cpts = (b for b in boreholes if isinstance(b, CPT))
+
+    # write verticals to chunked store
+    count = cpts_to_store(cpts, result['folder'],
+        compress=result.get('compress', True),
+        chunk_size_mb=result.get('chunk_size_mb', 64),
+        compact_ratio=result.get('compact_ratio', COMPACT_RATIO),
+        )
+    log.info('stored verticals of {:d} CPT\'s'.format(count))
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 # Royal HaskoningDHV
 
+from xsboringen.scripts.ingest import ingest
 from xsboringen.scripts.write_csv import write_csv
+from xsboringen.scripts.write_parquet import write_parquet
 from xsboringen.scripts.write_shape import write_shape
+from xsboringen.scripts.write_verticals import write_verticals
 from xsboringen.scripts.plot import plot_cross_section
+from xsboringen.scripts.map import plot_map
 
 import click
 import yaml
@@ -17,7 +21,8 @@ log = logging.getLogger(os.path.basename(__file__))
 
 @click.command()
 @click.argument('function',
-    type=click.Choice(['write_csv', 'write_shape', 'plot']),
+    type=click.Choice(['ingest', 'write_csv', 'write_parquet', 'write_shape',
+        'write_verticals', 'plot', 'map']),
     )
 @click.argument('inputfile',
     )
@@ -26,7 +31,10 @@ log = logging.getLogger(os.path.basename(__file__))
     default='info',
     help='log messages level'
     )
-def main(function, inputfile, level):
+@click.option('--force', is_flag=True,
+    help='rebuild all cross-sections, also when unchanged'
+    )
+def main(function, inputfile, level, force):
     '''plot geological cross-sections'''
     logging.basicConfig(level=level.upper())
 
@@ -48,12 +56,21 @@ def main(function, inputfile, level):
     kwargs['config'] = ChainMap(userconfig, defaultconfig)
 
     # dispatch function
-    if function == 'write_csv':
+    if function == 'ingest':
+        ingest(**kwargs)
+    elif function == 'write_csv':
         write_csv(**kwargs)
+    elif function == 'write_parquet':
+        write_parquet(**kwargs)
     elif function == 'write_shape':
         write_shape(**kwargs)
+    elif function == 'write_verticals':
+        write_verticals(**kwargs)
     elif function == 'plot':
+        kwargs['force'] = force
         plot_cross_section(**kwargs)
+    elif function == 'map':
+        plot_map(**kwargs)
 
 if __name__ == '__main__':
     main()
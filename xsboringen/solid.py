@@ -4,14 +4,6 @@
 
 from xsboringen.rasterfiles import sample_linestring
 
-from shapely.geometry import shape
-
-
-def get_solid_data(solid, linestring):
-    linestring = shape(linestring)
-    solid.data = solid.sample(linestring)
-    return solid
-
 
 class Solid(object):
     def __init__(self, name, topfile, basefile, data=None, stylekey=None):
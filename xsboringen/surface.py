@@ -4,14 +4,6 @@
 
 from xsboringen.rasterfiles import sample_linestring
 
-from shapely.geometry import shape
-
-
-def get_surface_data(surface, linestring):
-    linestring = shape(linestring)
-    surface.data = surface.sample(linestring)
-    return surface
-
 
 class Surface(object):
     def __init__(self, name, surfacefile, data=None, stylekey=None):
@@ -0,0 +1,204 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import SegmentTable, nan_to_none
+from xsboringen import utils
+
+import numpy as np
+
+from itertools import islice
+from pathlib import Path
+import threading
+import logging
+import locale
+import queue
+import gzip
+import csv
+import io
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class RowGetter(object):
+    '''Getter of attribute values as tuple, missing attributes are None like
+    AsDictMixin.as_dict'''
+    def __init__(self, fieldnames):
+        self.fieldnames = tuple(fieldnames)
+
+    def get(self, an_object):
+        return tuple(getattr(an_object, f, None) for f in self.fieldnames)
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(fieldnames={s.fieldnames:})'
+            ).format(s=self)
+
+    def __call__(self, an_object):
+        return self.get(an_object)
+
+
+class BackgroundWriter(object):
+    '''Write chunks to file object on background thread, so compression
+    overlaps with formatting of rows'''
+    def __init__(self, handle, queue_size=8):
+        self.handle = handle
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def _write(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.handle.write(chunk)
+            except Exception as e:
+                self.error = e
+
+    def write(self, chunk):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(chunk)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.handle.close()
+        if self.error is not None:
+            raise self.error
+
+
+class TableWriter(object):
+    '''Write rows of borehole and segment fields to CSV in batches, with
+    field getters compiled once and a columnar path for SegmentTable'''
+    def __init__(self, handle, borehole_fields, segment_fields,
+            prefix_fields=(), batchsize=10000,
+            ):
+        self.handle = handle
+        self.borehole_fields = tuple(borehole_fields)
+        self.segment_fields = tuple(segment_fields)
+        self.prefix_fields = tuple(prefix_fields)
+        self.batchsize = batchsize
+
+        self.borehole_getter = RowGetter(self.borehole_fields)
+        self.segment_getter = RowGetter(self.segment_fields)
+
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.batch = []
+        self.rows = 0
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(rows={s.rows:d})').format(s=self)
+
+    @property
+    def fieldnames(self):
+        return self.prefix_fields + self.borehole_fields + self.segment_fields
+
+    def writeheader(self):
+        self.writer.writerow(self.fieldnames)
+
+    def write_borehole(self, borehole, prefix=()):
+        '''add row per segment of borehole'''
+        head = tuple(prefix) + self.borehole_getter.get(borehole)
+        get = self.segment_getter.get
+        self.batch.extend(head + get(s) for s in borehole)
+        if len(self.batch) >= self.batchsize:
+            self.flush()
+
+    def write_table(self, table, prefix=()):
+        '''add rows of SegmentTable column by column, without creating
+        Borehole and Segment objects'''
+        self.flush()
+        counts = np.diff(table.offsets)
+        nsegments = table.nsegments
+
+        def borehole_column(name):
+            if name in table.boreholes:
+                values = np.asarray(table.boreholes[name])
+                return nan_to_none(np.repeat(values, counts))
+            return [table.attrs.get(name)] * nsegments
+
+        def segment_column(name):
+            if name in table.segments:
+                return nan_to_none(table.segments[name])
+            return [None] * nsegments
+
+        columns = (
+            [[v] * nsegments for v in prefix] +
+            [borehole_column(f) for f in self.borehole_fields] +
+            [segment_column(f) for f in self.segment_fields]
+            )
+        rows = zip(*columns)
+        while True:
+            self.batch.extend(islice(rows, self.batchsize))
+            if len(self.batch) == 0:
+                break
+            self.flush()
+
+    def write(self, boreholes, prefix=()):
+        '''write boreholes, items that are SegmentTable are written by
+        column'''
+        for item in boreholes:
+            if isinstance(item, SegmentTable):
+                self.write_table(item, prefix)
+            else:
+                self.write_borehole(item, prefix)
+        self.flush()
+
+    def flush(self):
+        '''format batch of rows and write as single chunk'''
+        self.writer.writerows(self.batch)
+        self.rows += len(self.batch)
+        self.batch = []
+        chunk = self.buffer.getvalue()
+        if len(chunk) > 0:
+            self.handle.write(chunk)
+            self.buffer.seek(0)
+            self.buffer.truncate()
+
+
+class TableFile(object):
+    '''Open CSV file for TableWriter, gzip compressed on background thread
+    if compress is True or filename ends with .gz'''
+    def __init__(self, csvfile, compress=None, compresslevel=6):
+        self.file = Path(csvfile)
+        if compress is None:
+            compress = self.file.suffix == '.gz'
+        self.compress = compress
+        self.compresslevel = compresslevel
+        self.opener = None
+        self.handle = None
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file=\'{s.file.name:}\', '
+                'compress={s.compress:})').format(s=self)
+
+    def __enter__(self):
+        if self.compress:
+            self.opener = utils.careful_open(self.file, 'wb')
+            raw = self.opener.__enter__()
+            text = io.TextIOWrapper(
+                gzip.GzipFile(fileobj=raw, mode='wb',
+                    compresslevel=self.compresslevel,
+                    ),
+                encoding=locale.getpreferredencoding(False),
+                )
+            self.handle = BackgroundWriter(text)
+        else:
+            self.opener = utils.careful_open(self.file, 'w')
+            self.handle = self.opener.__enter__()
+        return self.handle
+
+    def __exit__(self, type, value, traceback):
+        try:
+            if self.compress:
+                self.handle.close()
+        finally:
+            self.opener.__exit__(type, value, traceback)
+            self.handle = None
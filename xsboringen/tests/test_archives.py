@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.archives import ArchiveMember, split_archive
+from xsboringen.csvfiles import boreholes_from_csvfile
+from xsboringen.datasources import boreholes_from_sources
+from xsboringen.geffiles import cpts_from_geffile
+from xsboringen import utils
+
+from xsboringen.tests.test_catalog import GEF
+from xsboringen.tests.test_csvfiles import CSV, FIELDNAMES, EXTRA_FIELDS
+
+from pathlib import Path
+import pickle
+import zipfile
+
+
+def write_archive(tmpdir):
+    archive = tmpdir.join('data.zip')
+    with zipfile.ZipFile(str(archive), 'w',
+            compression=zipfile.ZIP_DEFLATED) as zf:
+        for i in range(3):
+            zf.writestr('gef/S{:d}.gef'.format(i),
+                GEF.format(code='S{:d}'.format(i), x=float(i), y=0.))
+        zf.writestr('gef/readme.txt', 'x')
+        zf.writestr('csv/boreholes.csv', CSV)
+    return archive
+
+
+class TestArchives(object):
+    def test_split_archive(self, tmpdir):
+        archive = write_archive(tmpdir)
+        assert split_archive(Path(str(archive), 'gef', '*')) == (
+            Path(str(archive)), ['gef', '*'])
+        assert split_archive(str(tmpdir))[0] is None
+
+    def test_member(self, tmpdir):
+        archive = write_archive(tmpdir)
+        member = ArchiveMember.from_path(
+            str(archive.join('gef', 'S1.gef')))
+        assert member.name == 'S1.gef'
+        assert member.exists()
+        assert utils.source_exists(str(member))
+        assert not utils.source_exists(str(archive.join('gef', 'S9.gef')))
+        assert pickle.loads(pickle.dumps(member)) == member
+        with utils.open_source(member) as f:
+            assert f.readline().startswith('#GEFID')
+
+    def test_glob(self, tmpdir):
+        archive = write_archive(tmpdir)
+        files = utils.careful_glob(Path(str(archive), 'gef'), '*.gef')
+        assert [f.name for f in files] == ['S0.gef', 'S1.gef', 'S2.gef']
+        files = utils.careful_glob(Path(str(archive), '*'), '*.csv')
+        assert [f.member for f in files] == ['csv/boreholes.csv']
+
+    def test_readers(self, tmpdir):
+        archive = write_archive(tmpdir)
+        member = ArchiveMember(str(archive), 'gef/S2.gef')
+        cpt, = cpts_from_geffile(member,
+            datacolumns={
+                'depth': 'sondeertrajectlengte',
+                'cone_resistance': 'conusweerstand',
+                },
+            )
+        assert (cpt.code, cpt.x, cpt.source) == ('S2', 2., 'S2.gef')
+
+        member = ArchiveMember(str(archive), 'csv/boreholes.csv')
+        codes = [b.code for b in boreholes_from_csvfile(member,
+            fieldnames=FIELDNAMES,
+            extra_fields=EXTRA_FIELDS,
+            delimiter=';',
+            decimal=',',
+            )]
+        assert codes == ['B1', 'B2', 'B3']
+
+    def test_sources(self, tmpdir):
+        archive = write_archive(tmpdir)
+        datasource = {
+            'format': 'GEF sonderingen',
+            'folder': str(archive.join('gef')),
+            'datacolumns': {'depth': 'sondeertrajectlengte'},
+            }
+        boreholes = boreholes_from_sources([datasource], n_jobs=2,
+            bbox=(0.5, -1., 5., 1.),
+            )
+        assert sorted(b.code for b in boreholes) == ['S1', 'S2']
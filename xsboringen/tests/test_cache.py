@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.cache import SourceCache
+from xsboringen.calc import AdmixClassifier
+from xsboringen.datasources import Task, boreholes_from_sources
+
+from xsboringen.tests.test_catalog import write_gefs
+
+import logging
+
+
+def lines_from_file(file, prefix=''):
+    with open(file) as f:
+        for line in f:
+            yield prefix + line.strip()
+
+
+class TestSourceCache(object):
+    def test_get_put(self, tmpdir):
+        file = tmpdir.join('source.txt')
+        file.write('a\nb\n')
+        task = Task(lines_from_file, str(file), {'prefix': '_'})
+        with SourceCache(str(tmpdir.join('cache.sqlite'))) as cache:
+            key = cache.key(task)
+            assert cache.get(key) is None
+            cache.put(key, task.file, list(lines_from_file(task.file)))
+            assert cache.get(key) == ['a', 'b']
+            assert cache.stats.hits == 1
+            assert cache.stats.misses == 1
+
+    def test_key(self, tmpdir):
+        file = tmpdir.join('source.txt')
+        file.write('a\n')
+        task = Task(lines_from_file, str(file),
+            {'classifier': AdmixClassifier({'gravel': 'GRAVEL'})})
+        other = Task(lines_from_file, str(file),
+            {'classifier': AdmixClassifier({'gravel': 'GRIND'})})
+        key = SourceCache.key(task)
+        assert key == SourceCache.key(task)
+        assert key != SourceCache.key(other)
+        file.write('a\nb\n')
+        assert key != SourceCache.key(task)
+
+    def test_evict(self, tmpdir):
+        cache = SourceCache(str(tmpdir.join('cache.sqlite')), max_size_mb=0)
+        cache.put('first', 'first.txt', list(range(100)))
+        cache.put('second', 'second.txt', list(range(100)))
+        assert len(cache) == 2
+        cache.max_size = cache.size // 2
+        cache.evict()
+        assert len(cache) == 1
+        assert cache.get('first') is None
+        assert cache.get('second') == list(range(100))
+        cache.close()
+
+    def test_predicate_after_lookup(self, tmpdir, caplog):
+        write_gefs(tmpdir)
+        datasource = {
+            'format': 'GEF sonderingen',
+            'folder': str(tmpdir),
+            'datacolumns': {'depth': 'sondeertrajectlengte'},
+            }
+        cache_file = str(tmpdir.join('cache.sqlite'))
+        caplog.set_level(logging.INFO)
+        for codes, misses in ((['S0', 'S1'], 3), (['S2'], 0)):
+            caplog.clear()
+            boreholes = boreholes_from_sources([datasource],
+                cache_file=cache_file,
+                predicate={'codes': codes},
+                )
+            assert [b.code for b in boreholes] == codes
+            assert '{:d} misses'.format(misses) in caplog.text
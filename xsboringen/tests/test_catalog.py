@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.archives import ArchiveMember
+from xsboringen.catalog import GefCatalog
+from xsboringen.cross_section import buffer_union
+
+from shapely.geometry import box
+
+import zipfile
+import os
+
+GEF = '''#GEFID= 1, 1, 0
+#COLUMNSEPARATOR= ;
+#COLUMNINFO= 1, m, sondeertrajectlengte, 1
+#COLUMNINFO= 2, MPa, conusweerstand, 2
+#TESTID= {code:}
+#XYID= 31000, {x:.1f}, {y:.1f}
+#ZID= 31000, 1.0
+#MEASUREMENTVAR= 16, 20.0, m, diepte
+#EOH=
+0.02;0.525;
+'''
+
+
+def write_gefs(tmpdir):
+    files = []
+    for i, (x, y) in enumerate([(0., 0.), (10., 10.), (20., 0.)]):
+        gef = tmpdir.join('S{:d}.gef'.format(i))
+        gef.write(GEF.format(code='S{:d}'.format(i), x=x, y=y))
+        files.append(str(gef))
+    return files
+
+
+class TestGefCatalog(object):
+    def test_read_entry(self, tmpdir):
+        files = write_gefs(tmpdir)
+        entry = GefCatalog.read_entry(files[1])
+        assert entry.code == 'S1'
+        assert entry.x == 10.
+        assert entry.depth == 20.
+        assert entry.columnsep == ';'
+        assert [c[2] for c in entry.columns] == [
+            'sondeertrajectlengte', 'conusweerstand']
+
+    def test_select(self, tmpdir):
+        files = write_gefs(tmpdir)
+        with GefCatalog() as catalog:
+            assert list(catalog.select(files,
+                bbox=(-1., -1., 11., 11.))) == files[:2]
+            polygon = box(5., -1., 25., 11.)
+            assert list(catalog.select(files, polygon=polygon)) == files[1:]
+            assert (catalog.considered, catalog.selected) == (6, 4)
+
+    def test_select_sections(self, tmpdir):
+        files = write_gefs(tmpdir)
+        lines = [
+            {'type': 'LineString', 'coordinates': [(-5., 0.), (5., 0.)]},
+            {'type': 'LineString', 'coordinates': [(15., 0.), (25., 0.)]},
+            ]
+        with GefCatalog() as catalog:
+            polygon = buffer_union(lines, 1.)
+            assert list(catalog.select(files, polygon=polygon)) == [
+                files[0], files[2]]
+
+    def test_refresh(self, tmpdir):
+        files = write_gefs(tmpdir)
+        catalogfile = str(tmpdir.join('catalog.sqlite'))
+        with GefCatalog(catalogfile) as catalog:
+            assert catalog.refresh(files) == 3
+        with GefCatalog(catalogfile) as catalog:
+            assert catalog.refresh(files) == 0
+            with open(files[0], 'w') as f:
+                f.write(GEF.format(code='S0', x=100., y=100.))
+            os.utime(files[0], ns=(0, 0))
+            assert catalog.refresh(files) == 1
+            assert list(catalog.select(files,
+                bbox=(90., 90., 110., 110.))) == files[:1]
+
+    def test_unknown_location(self, tmpdir):
+        files = write_gefs(tmpdir)
+        tmpdir.join('S0.gef').write(
+            GEF.format(code='S0', x=0., y=0.).replace('#XYID', '#NOXYID'))
+        tmpdir.join('S1.gef').write('not a GEF file')
+        with GefCatalog() as catalog:
+            assert list(catalog.select(files,
+                bbox=(15., -1., 25., 1.))) == files
+
+    def test_stream(self, tmpdir):
+        files = write_gefs(tmpdir)
+        def stream():
+            yield files[0]
+            raise RuntimeError('discovery not finished')
+        with GefCatalog() as catalog:
+            selected = catalog.select(stream(), bbox=(-1., -1., 1., 1.))
+            assert next(selected) == files[0]
+
+    def test_prune_archive(self, tmpdir):
+        archive = tmpdir.join('data.zip')
+        with zipfile.ZipFile(str(archive), 'w') as zf:
+            zf.writestr('S0.gef', GEF.format(code='S0', x=0., y=0.))
+        member = ArchiveMember(str(archive), 'S0.gef')
+        with GefCatalog() as catalog:
+            assert catalog.refresh([member]) == 1
+            assert catalog.prune() == 0
+            assert len(catalog) == 1
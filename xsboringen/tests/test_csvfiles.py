@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.csvfiles import CSVBoreholeFile, boreholes_from_csvfile
+
+import numpy as np
+
+CSV = '''code;x;y;z;base;lithology;sandmedianclass;quality;median
+B1;1,0;2,0;3,0;1,5;Z;ZMF;A;150
+B1;1,0;2,0;3,0;2,5;K;;A;x
+;1,0;2,0;3,0;1,0;Z;;;
+B2;4,0;5,0;6,0;0,5;V;;B;200
+B2;4,0;5,0;6,0;1,0;Z;ZMG;B;300
+B2;4,0;5,0;6,0;3,0;Z;ZMG;B
+B3;7,0;8,0;9,0;1,0;L;;C;
+'''
+
+FIELDNAMES = {
+    'code': 'code', 'depth': 'depth', 'x': 'x', 'y': 'y', 'z': 'z',
+    'top': 'top', 'base': 'base', 'lithology': 'lithology',
+    'sandmedianclass': 'sandmedianclass',
+    }
+
+EXTRA_FIELDS = {
+    'borehole': [{'name': 'quality', 'fieldname': 'quality', 'dtype': 'str'}],
+    'segments': [{'name': 'median', 'fieldname': 'median', 'dtype': 'float'}],
+    }
+
+
+def contents(borehole):
+    return (
+        borehole.code, borehole.x, borehole.y, borehole.z, borehole.depth,
+        borehole.quality,
+        [(s.top, s.base, s.lithology, s.sandmedianclass,
+            getattr(s, 'median', None))
+            for s in borehole.segments],
+        )
+
+
+class TestColumnarCSV(object):
+    def test_columnar(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        kwargs = dict(
+            fieldnames=FIELDNAMES,
+            extra_fields=EXTRA_FIELDS,
+            delimiter=';',
+            decimal=',',
+            )
+        expected = [
+            contents(b) for b in boreholes_from_csvfile(str(csvfile), **kwargs)
+            ]
+        assert [e[0] for e in expected] == ['B1', 'B2', 'B3']
+        for chunksize in (1, 2, 100):
+            boreholes = boreholes_from_csvfile(str(csvfile),
+                columnar=True,
+                chunksize=chunksize,
+                **kwargs)
+            assert [contents(b) for b in boreholes] == expected
+
+    def test_segment_table(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        csv_ = CSVBoreholeFile(str(csvfile), delimiter=';', decimal=',')
+        table = csv_.to_segment_table(FIELDNAMES, EXTRA_FIELDS, chunksize=2)
+        assert len(table) == 3
+        assert table.nsegments == 6
+        assert table.offsets.tolist() == [0, 2, 5, 6]
+        assert table.segments['top'].tolist() == [0., 1.5, 0., 0.5, 1., 0.]
+        assert np.isnan(table.segments['median'][1])
+        assert table.boreholes['depth'].tolist() == [2.5, 3., 1.]
+
+    def test_to_floats(self):
+        floats = CSVBoreholeFile.to_floats(['1,5', '', None, 'x'], ',')
+        assert floats[0] == 1.5
+        assert np.isnan(floats[1:]).all()
+
+
+UNSORTED_CSV = '''code;x;y;z;base;lithology;sandmedianclass;quality;median
+B2;4,0;5,0;6,0;0,5;V;;B;200
+B1;1,0;2,0;3,0;1,5;Z;ZMF;A;150
+B2;4,0;5,0;6,0;1,0;Z;ZMG;B;300
+B3;7,0;8,0;9,0;1,0;L;;C;
+B1;1,0;2,0;3,0;2,5;K;;A;x
+B2;4,0;5,0;6,0;3,0;Z;ZMG;B
+'''
+
+
+class TestUnsortedCSV(object):
+    def read(self, tmpdir, **kwargs):
+        csvfile = tmpdir.join('unsorted.csv')
+        csvfile.write(UNSORTED_CSV)
+        return boreholes_from_csvfile(str(csvfile),
+            fieldnames=FIELDNAMES,
+            extra_fields=EXTRA_FIELDS,
+            delimiter=';',
+            decimal=',',
+            **kwargs)
+
+    def test_sorted_fragments(self, tmpdir):
+        boreholes = list(self.read(tmpdir))
+        assert [b.code for b in boreholes] == ['B2', 'B1', 'B2', 'B3', 'B1', 'B2']
+
+    def test_index(self, tmpdir):
+        boreholes = list(self.read(tmpdir, grouping='unsorted'))
+        assert [b.code for b in boreholes] == ['B2', 'B1', 'B3']
+        assert [s.base for s in boreholes[0].segments] == [0.5, 1., 3.]
+        assert [s.top for s in boreholes[0].segments] == [0., 0.5, 1.]
+
+    def test_runs(self, tmpdir):
+        boreholes = list(self.read(tmpdir,
+            grouping='unsorted',
+            memory_mb=1e-4,
+            ))
+        assert [b.code for b in boreholes] == ['B1', 'B2', 'B3']
+        assert [s.lithology for s in boreholes[0].segments] == ['Z', 'K']
+        assert [s.base for s in boreholes[1].segments] == [0.5, 1., 3.]
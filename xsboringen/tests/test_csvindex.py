@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.csvfiles import boreholes_from_csvfile
+from xsboringen.csvindex import CSVIndex, boreholes_from_csvindex
+from xsboringen.datasources import boreholes_from_sources
+
+from xsboringen.tests.test_csvfiles import (
+    CSV, UNSORTED_CSV, FIELDNAMES, EXTRA_FIELDS, contents,
+    )
+
+import os
+
+
+class TestCSVIndex(object):
+    def write(self, tmpdir, text=CSV):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(text)
+        return str(csvfile)
+
+    def read(self, csvfile, **kwargs):
+        return list(boreholes_from_csvindex(csvfile,
+            fieldnames=FIELDNAMES,
+            extra_fields=EXTRA_FIELDS,
+            delimiter=';',
+            decimal=',',
+            **kwargs))
+
+    def test_build(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        with CSVIndex(csvfile, FIELDNAMES, delimiter=';', decimal=',') as index:
+            assert index.update()
+            assert not index.update()
+            assert len(index) == 3
+            rows = index.connection.execute(
+                'SELECT code, x, y, depth FROM ranges ORDER BY start'
+                ).fetchall()
+        assert rows == [
+            ('B1', 1., 2., 2.5), ('B2', 4., 5., 3.), ('B3', 7., 8., 1.),
+            ]
+        assert os.path.exists(csvfile + '.idx')
+
+    def test_codes(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        expected = {
+            b.code: contents(b) for b in boreholes_from_csvfile(csvfile,
+                fieldnames=FIELDNAMES,
+                extra_fields=EXTRA_FIELDS,
+                delimiter=';',
+                decimal=',',
+                )
+            }
+        boreholes = self.read(csvfile, codes=['B3', 'B2'])
+        assert [contents(b) for b in boreholes] == [
+            expected['B2'], expected['B3'],
+            ]
+
+    def test_bbox(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        boreholes = self.read(csvfile, bbox=(0., 0., 5., 5.))
+        assert [b.code for b in boreholes] == ['B1', 'B2']
+
+    def test_unsorted(self, tmpdir):
+        csvfile = self.write(tmpdir, UNSORTED_CSV)
+        boreholes = self.read(csvfile, codes=['B2'])
+        assert len(boreholes) == 1
+        assert [s.base for s in boreholes[0].segments] == [0.5, 1., 3.]
+
+    def test_rebuild_on_change(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        assert [b.code for b in self.read(csvfile)] == ['B1', 'B2', 'B3']
+        self.write(tmpdir, CSV.replace('B3', 'B4'))
+        assert [b.code for b in self.read(csvfile)] == ['B1', 'B2', 'B4']
+
+    def test_indexfile(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        indexfolder = tmpdir.mkdir('index')
+        indexfile = str(indexfolder.join('{name}.idx'))
+        boreholes = self.read(csvfile, indexfile=indexfile)
+        assert [b.code for b in boreholes] == ['B1', 'B2', 'B3']
+        assert indexfolder.join('boreholes.csv.idx').exists()
+        assert not os.path.exists(csvfile + '.idx')
+
+    def test_many_codes(self, tmpdir):
+        csvfile = self.write(tmpdir)
+        # more codes than default limit of SQLite variables in query
+        codes = ['B{:d}'.format(i) for i in range(300000)]
+        boreholes = self.read(csvfile, codes=codes)
+        assert [b.code for b in boreholes] == ['B1', 'B2', 'B3']
+
+    def test_datasource(self, tmpdir):
+        self.write(tmpdir)
+        indexfolder = tmpdir.mkdir('index')
+        datasource = {
+            'format': 'CSV boringen',
+            'folder': str(tmpdir),
+            'fieldnames': FIELDNAMES,
+            'delimiter': ';',
+            'decimal': ',',
+            'index': True,
+            'indexfile': str(indexfolder.join('{name}.idx')),
+            }
+        datasource['codes'] = ['B2']
+        boreholes = list(boreholes_from_sources([datasource]))
+        assert [b.code for b in boreholes] == ['B2']
+        assert indexfolder.join('boreholes.csv.idx').exists()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Vertical
+from xsboringen.cache import SourceCache
+from xsboringen.csvfiles import boreholes_from_csvfile
+from xsboringen.cpt import CPT
+from xsboringen.database import BoreholeDatabase, boreholes_from_database
+from xsboringen.datasources import Task, boreholes_from_sources
+from xsboringen.geffiles import cpts_from_geffile
+
+from xsboringen.tests.test_catalog import write_gefs
+from xsboringen.tests.test_csvfiles import CSV, FIELDNAMES, EXTRA_FIELDS
+
+from shapely.geometry import box
+
+
+class TestBoreholeDatabase(object):
+    def ingest(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        if not csvfile.exists():
+            csvfile.write(CSV)
+        task = Task(boreholes_from_csvfile, str(csvfile), {
+            'fieldnames': FIELDNAMES,
+            'extra_fields': EXTRA_FIELDS,
+            'delimiter': ';',
+            'decimal': ',',
+            })
+        dbfile = str(tmpdir.join('xsb.sqlite'))
+        with BoreholeDatabase(dbfile) as database:
+            stale = database.stale([task])
+            for task in stale:
+                objects = task.reader(task.file, **task.options)
+                database.store(task, 'boreholes', objects)
+        return dbfile, stale
+
+    def test_roundtrip(self, tmpdir):
+        dbfile, stale = self.ingest(tmpdir)
+        assert len(stale) == 1
+        boreholes = list(boreholes_from_database(dbfile))
+        assert [b.code for b in boreholes] == ['B1', 'B2', 'B3']
+        assert [s.base for s in boreholes[1].segments] == [0.5, 1., 3.]
+        assert boreholes[0].segments[0].median == 150.
+        assert boreholes[0].quality == 'A'
+        assert boreholes[0].source == 'boreholes.csv'
+
+    def test_incremental(self, tmpdir):
+        self.ingest(tmpdir)
+        dbfile, stale = self.ingest(tmpdir)
+        assert len(stale) == 0
+        tmpdir.join('boreholes.csv').write(CSV.replace('B3', 'B4'))
+        dbfile, stale = self.ingest(tmpdir)
+        assert len(stale) == 1
+        codes = [b.code for b in boreholes_from_database(dbfile)]
+        assert codes == ['B1', 'B2', 'B4']
+
+    def test_not_cached(self, tmpdir):
+        dbfile, _ = self.ingest(tmpdir)
+        cache_file = str(tmpdir.join('cache.sqlite'))
+        datasource = {'format': 'Database', 'file': dbfile}
+        boreholes = boreholes_from_sources([datasource],
+            cache_file=cache_file,
+            predicate={'codes': ['B1']},
+            )
+        assert [b.code for b in boreholes] == ['B1']
+        with SourceCache(cache_file) as cache:
+            assert len(cache) == 0
+
+    def test_filters(self, tmpdir):
+        dbfile, _ = self.ingest(tmpdir)
+        select = lambda **kwargs: [
+            b.code for b in boreholes_from_database(dbfile, **kwargs)]
+        assert select(bbox=(0., 0., 5., 5.)) == ['B1', 'B2']
+        assert select(polygon=box(3., 4., 8., 9.)) == ['B2', 'B3']
+        assert select(min_depth=2.) == ['B1', 'B2']
+        assert select(quality=['B', 'C']) == ['B2', 'B3']
+        assert select(codes=['B3']) == ['B3']
+
+        # more codes than default limit of SQLite variables in query
+        codes = ['B{:d}'.format(i) for i in range(300000)]
+        assert select(codes=codes) == ['B1', 'B2', 'B3']
+        assert select(codes=codes, bbox=(0., 0., 5., 5.)) == ['B1', 'B2']
+
+    def test_verticals(self, tmpdir):
+        cpt = CPT('S1', 0.2, x=1., y=1., z=0.,
+            verticals={
+                'cone_resistance': Vertical('cone_resistance', [0.1, 0.2],
+                    [1.5, None]),
+                },
+            )
+        task = Task(boreholes_from_csvfile, __file__, {})
+        dbfile = str(tmpdir.join('xsb.sqlite'))
+        with BoreholeDatabase(dbfile) as database:
+            database.store(task, 'boreholes', [cpt])
+            cpt, = database.boreholes()
+        assert isinstance(cpt, CPT)
+        assert cpt.verticals['cone_resistance'].values == [1.5, None]
+        assert cpt.verticals['cone_resistance'].depth == [0.1, 0.2]
+
+    def test_lazy_cpt(self, tmpdir):
+        geffile = write_gefs(tmpdir)[0]
+        datacolumns = {
+            'depth': 'sondeertrajectlengte',
+            'cone_resistance': 'conusweerstand',
+            }
+        cpt, = cpts_from_geffile(geffile, datacolumns, lazy=True)
+        task = Task(cpts_from_geffile, geffile, {})
+        dbfile = str(tmpdir.join('xsb.sqlite'))
+        with BoreholeDatabase(dbfile) as database:
+            database.store(task, 'boreholes', [cpt])
+            stored, = database.boreholes()
+        assert isinstance(stored, CPT)
+        assert stored.verticals['cone_resistance'].values == [0.525]
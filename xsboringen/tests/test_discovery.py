@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.datasources import borehole_tasks
+from xsboringen.discovery import Discovery, split_pattern
+from xsboringen.utils import careful_glob
+
+from pathlib import Path
+import glob
+import os
+
+import pytest
+
+
+def write_tree(tmpdir):
+    for folder in ('a', 'b', 'c/d'):
+        for name in ('S1.gef', 'S2.gef', 'S1.xml', '.hidden.gef'):
+            tmpdir.join(folder, name).write('x', ensure=True)
+    tmpdir.join('b', 'sub.gef').ensure(dir=True)
+
+
+class TestDiscovery(object):
+    def test_split_pattern(self):
+        base, patterns = split_pattern(Path('data/*/gef'), '*.gef')
+        assert base == Path('data')
+        assert patterns == ['*', 'gef', '*.gef']
+
+    def test_glob(self, tmpdir):
+        write_tree(tmpdir)
+        pattern = os.path.join(str(tmpdir), '*', '*.gef')
+        expected = sorted(f for f in glob.glob(pattern) if os.path.isfile(f))
+        with Discovery(n_workers=2) as discovery:
+            entries = list(discovery.glob(Path(str(tmpdir), '*'), '*.gef'))
+        assert [e.path for e in entries] == expected
+        assert all(e.size == 1 for e in entries)
+        assert careful_glob(Path(str(tmpdir), 'a'), '*.xml') == [
+            str(tmpdir.join('a', 'S1.xml'))]
+
+    def test_missing_folder(self, tmpdir):
+        with pytest.raises(ValueError):
+            careful_glob(Path(str(tmpdir), 'missing', '*'), '*.gef')
+
+    def test_datasource_without_folder(self):
+        for fmt in ('Dinoloket XML 1.4', 'GEF boringen', 'CPT store'):
+            with pytest.raises(KeyError):
+                list(borehole_tasks({'format': fmt}))
+
+    def test_cache(self, tmpdir):
+        write_tree(tmpdir)
+        cachefile = str(tmpdir.join('listings.sqlite'))
+        folder = Path(str(tmpdir), 'a')
+        for hits in (0, 1):
+            with Discovery(cachefile) as discovery:
+                paths = [e.path for e in discovery.glob(folder, '*.gef')]
+                assert discovery.cache.hits == hits
+            assert len(paths) == 2
+
+        # new file changes modification time of folder
+        tmpdir.join('a', 'S3.gef').write('x')
+        os.utime(str(folder), ns=(0, 0))
+        with Discovery(cachefile) as discovery:
+            paths = [e.path for e in discovery.glob(folder, '*.gef')]
+            assert discovery.cache.misses == 1
+        assert len(paths) == 3
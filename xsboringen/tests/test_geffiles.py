@@ -2,6 +2,7 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 from xsboringen.geffiles import GefCPTFile, GefBoreholeFile
+from xsboringen.geffiles import columns_from_layout, decoding_plan
 
 import numpy as np
 
@@ -47,3 +48,28 @@ class TestCPTFromGEF(object):
 
         cpt = gef.to_cpt(geffile, fieldnames, columns)
 
+
+
+class TestDecodingPlan(object):
+    layout = (
+        ('COLUMNINFO', '1, m, sondeertrajectlengte, 1'),
+        ('COLUMNINFO', '2, MPa, conusweerstand, 2'),
+        ('COLUMNINFO', '3, m, gecorrigeerde diepte, 11'),
+        ('COLUMNVOID', '2, -9999.000'),
+        )
+    datacolumns = (
+        ('cone_resistance', 'conusweerstand'),
+        ('depth', 'gecorrigeerde diepte'),
+        )
+
+    def test_decode(self):
+        plan = decoding_plan(self.layout, self.datacolumns, ';', '!')
+        verticals = plan.decode(['0.1;1.5;0.1;!', '0.2;-9999.000;0.2;!'])
+        assert verticals['cone_resistance'].values == [1.5, None]
+        assert verticals['cone_resistance'].depth == [0.1, 0.2]
+        assert 'depth' not in verticals
+
+    def test_reuse(self):
+        plan = decoding_plan(self.layout, self.datacolumns, ';', '!')
+        assert decoding_plan(self.layout, self.datacolumns, ';', '!') is plan
+        assert columns_from_layout(self.layout)['COLUMNVOID'][2].value == -9999.
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.labels import LabelLayout
+
+
+class TestLabelLayout(object):
+    labels = [(float(i), 'B{:03d}'.format(i)) for i in range(100)]
+
+    def test_layout_all(self):
+        layout = LabelLayout(fontsize=10., policy='all')
+        placed = layout.layout(self.labels, points_per_unit=1.)
+        assert len(placed) == 100
+
+    def test_layout_cull(self):
+        layout = LabelLayout(fontsize=10., policy='cull')
+        placed = layout.layout(self.labels, points_per_unit=1.)
+        assert 0 < len(placed) < 100
+        assert all(p.offset == 0. for p in placed)
+        xs = [p.x for p in placed]
+        assert all(b - a > layout.extent('B000')[1] for a, b in zip(xs, xs[1:]))
+
+    def test_layout_stagger(self):
+        culled = LabelLayout(fontsize=10., policy='cull').layout(
+            self.labels, points_per_unit=1.)
+        staggered = LabelLayout(fontsize=10., policy='stagger', max_levels=2
+            ).layout(self.labels, points_per_unit=1.)
+        assert len(staggered) > len(culled)
+        assert len({p.offset for p in staggered}) == 2
+
+    def test_layout_no_collisions(self):
+        layout = LabelLayout(fontsize=10., policy='cull')
+        placed = layout.layout(self.labels, points_per_unit=100.)
+        assert len(placed) == 100
+
+    def test_layout_index(self):
+        labels = list(reversed(self.labels))
+        placed = LabelLayout(fontsize=10., policy='cull').layout(
+            labels, points_per_unit=1.)
+        assert all(labels[p.index] == (p.x, p.text) for p in placed)
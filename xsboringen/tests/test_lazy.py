@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import LazyBorehole
+from xsboringen.cpt import LazyCPT
+from xsboringen.datasources import boreholes_from_sources
+from xsboringen.geffiles import cpts_from_geffile
+from xsboringen.xmlfiles import XMLBoreholeFile, boreholes_from_xmlfile
+
+from xsboringen.tests.test_catalog import GEF, write_gefs
+from xsboringen.tests import test_xmlfiles
+
+import pickle
+
+DATACOLUMNS = {
+    'depth': 'sondeertrajectlengte',
+    'cone_resistance': 'conusweerstand',
+    }
+
+
+def verticals(cpt):
+    return {k: (v.depth, v.values) for k, v in cpt.verticals.items()}
+
+
+class TestLazy(object):
+    def test_cpt(self, tmpdir):
+        geffile = write_gefs(tmpdir)[0]
+        eager, = cpts_from_geffile(geffile, DATACOLUMNS)
+        cpt, = cpts_from_geffile(geffile, DATACOLUMNS, lazy=True)
+        assert isinstance(cpt, LazyCPT)
+        assert (cpt.code, cpt.depth, cpt.x) == (eager.code, 20., 0.)
+        assert not cpt.loaded
+        assert verticals(cpt) == verticals(eager)
+        assert cpt.segments == []
+        assert cpt.loaded
+        assert not set(cpt.as_dict()) & set(cpt.state_attrs)
+        assert set(cpt.as_dict()) == set(eager.as_dict())
+
+        # released verticals are read again
+        cpt.release()
+        assert not cpt.loaded
+        cpt = pickle.loads(pickle.dumps(cpt))
+        assert verticals(cpt) == verticals(eager)
+
+    def test_depth_from_data(self, tmpdir):
+        geffile = tmpdir.join('S0.gef')
+        geffile.write(GEF.format(code='S0', x=0., y=0.).replace(
+            '#MEASUREMENTVAR= 16, 20.0, m, diepte\n', ''))
+        cpt, = cpts_from_geffile(str(geffile), DATACOLUMNS, lazy=True)
+        assert cpt._verticals is not None
+        assert cpt.release()._verticals is None
+        assert verticals(cpt)['cone_resistance'] == ([0.02], [0.525])
+
+    def test_xml(self, tmpdir):
+        survey = test_xmlfiles.TestBoreholesFromXMLFile.survey
+        xmlfile = tmpdir.join('bulk_1.4.xml')
+        xmlfile.write('<dinoSurvey>{}{}</dinoSurvey>'.format(
+            survey.format(code='B1', date='', quality=''),
+            survey.format(code='B2', date='', quality=''),
+            ))
+        boreholes = list(boreholes_from_xmlfile(str(xmlfile), lazy=True))
+        assert all(isinstance(b, LazyBorehole) for b in boreholes)
+        assert [b.code for b in boreholes] == ['B1', 'B2']
+        assert [b._loader.index for b in boreholes] == [0, 1]
+        assert [s.lithology for s in boreholes[1].segments] == ['Z']
+        assert boreholes[1].segments[0].base == 2.
+
+    def test_xml_stream_to_index(self, tmpdir, monkeypatch):
+        survey = test_xmlfiles.TestBoreholesFromXMLFile.survey
+        xmlfile = tmpdir.join('bulk_1.4.xml')
+        xmlfile.write('<dinoSurvey>{}</dinoSurvey>'.format(''.join(
+            survey.format(code='B{:d}'.format(i), date='', quality='')
+            for i in range(5)
+            )))
+        boreholes = list(boreholes_from_xmlfile(str(xmlfile), lazy=True))
+
+        # only segments of requested survey are read, file is streamed up
+        # to survey
+        streamed, read = [], []
+        iterchildren = XMLBoreholeFile.iterchildren
+        read_segments = XMLBoreholeFile.read_segments
+        def counted(self, tag):
+            for element in iterchildren(self, tag):
+                streamed.append(element.tag)
+                yield element
+        monkeypatch.setattr(XMLBoreholeFile, 'iterchildren', counted)
+        monkeypatch.setattr(XMLBoreholeFile, 'read_segments', staticmethod(
+            lambda survey, fields: read.append(survey) or read_segments(
+                survey, fields)))
+        assert len(boreholes[2].segments) == 1
+        assert (len(streamed), len(read)) == (3, 1)
+
+        # released segments are read again
+        boreholes[2].release()
+        assert len(boreholes[2].segments) == 1
+        assert (len(streamed), len(read)) == (6, 2)
+
+    def test_sources(self, tmpdir):
+        write_gefs(tmpdir)
+        datasource = {
+            'format': 'GEF sonderingen',
+            'folder': str(tmpdir),
+            'datacolumns': DATACOLUMNS,
+            }
+        expected = [
+            (c.code, verticals(c))
+            for c in boreholes_from_sources([datasource])
+            ]
+        for options in ({}, {'n_jobs': 2}, {'prefetch': 2}):
+            cpts = list(boreholes_from_sources([datasource], lazy=True,
+                **options))
+            assert all(isinstance(c, LazyCPT) for c in cpts)
+            assert [(c.code, verticals(c)) for c in cpts] == expected
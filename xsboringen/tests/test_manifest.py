@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole, Segment
+from xsboringen.cross_section import CrossSection
+from xsboringen.manifest import PlotManifest, cross_section_fingerprint
+
+from shapely.geometry import LineString, mapping
+
+
+def get_cross_section(lithology='Z'):
+    cs = CrossSection(
+        geometry=mapping(LineString([(0., 0.), (100., 0.)])),
+        buffer_distance=10.,
+        label='A',
+        )
+    segments = [Segment(top=0., base=2., lithology=lithology)]
+    cs.add_boreholes([
+        Borehole(code='b', depth=2., x=50., y=1., z=0., segments=segments),
+        ])
+    return cs
+
+
+class TestPlotManifest(object):
+    def test_fingerprint_changes(self):
+        fingerprint = cross_section_fingerprint(get_cross_section('Z'))
+        assert fingerprint == cross_section_fingerprint(get_cross_section('Z'))
+        assert fingerprint != cross_section_fingerprint(get_cross_section('K'))
+        assert fingerprint != cross_section_fingerprint(
+            get_cross_section('Z'), settings={'figure_dpi': 100})
+
+    def test_is_current(self, tmp_path):
+        imagefile = tmp_path / 'cross_section_A.png'
+        manifest = PlotManifest(tmp_path / 'manifest.json')
+        manifest.update('A', 'abc')
+        manifest.save()
+        manifest = PlotManifest(tmp_path / 'manifest.json')
+        assert not manifest.is_current('A', 'abc', imagefile)
+        imagefile.touch()
+        assert manifest.is_current('A', 'abc', imagefile)
+        assert not manifest.is_current('A', 'def', imagefile)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.parallel import Executor
+
+from operator import mul
+
+
+class TestExecutor(object):
+    def test_map_serial(self):
+        executor = Executor(n_jobs=1)
+        results = executor.map(mul, [(i, 2) for i in range(5)])
+        assert results == [0, 2, 4, 6, 8]
+        assert executor.pool is None
+
+    def test_map_threads_ordered(self):
+        with Executor(n_jobs=3, backend='threads') as executor:
+            first = executor.map(mul, [(i, 2) for i in range(20)], stage='mul')
+            second = executor.map(mul, [(i, 3) for i in range(20)], stage='mul')
+        assert first == [i * 2 for i in range(20)]
+        assert second == [i * 3 for i in range(20)]
+        assert executor.timings['mul'].count == 40
+
+    def test_batch_size(self):
+        executor = Executor(n_jobs=4, batch_time=1.)
+        assert executor.batch_size('stage', 100) == 1
+        executor.map(mul, [(1, 1)], stage='stage')
+        executor.timings['stage'].total = 1e-2
+        assert executor.batch_size('stage', 100) == 25
+        assert executor.batch_size('stage', 1000) == 100
+
+    def test_imap_ordered(self):
+        with Executor(n_jobs=3, backend='threads') as executor:
+            results = executor.imap(abs, range(-20, 0), queue_size=4)
+            assert list(results) == list(range(20, 0, -1))
+
+    def test_imap_unordered(self):
+        with Executor(n_jobs=3, backend='threads') as executor:
+            results = executor.imap(abs, range(-20, 0), ordered=False)
+            assert sorted(results) == list(range(1, 21))
+
+    def test_imap_bounded(self):
+        consumed = []
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+        with Executor(n_jobs=2, backend='threads') as executor:
+            results = executor.imap(abs, items(), queue_size=5)
+            next(results)
+            assert len(consumed) <= 6
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.csvfiles import CSVBoreholeFile
+from xsboringen.tests.test_csvfiles import CSV, FIELDNAMES, EXTRA_FIELDS
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+from xsboringen.parquetfiles import boreholes_to_parquet, read_parquet
+
+
+class TestBoreholesToParquet(object):
+    extra_fields = {
+        'borehole': ['quality'],
+        'segments': [{'name': 'median', 'dtype': 'float'}],
+        }
+
+    def read(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        return CSVBoreholeFile(str(csvfile), delimiter=';', decimal=',')
+
+    def write(self, tmpdir, items, format='parquet'):
+        folder = tmpdir.join('out')
+        boreholes_to_parquet(items, str(folder),
+            extra_fields=self.extra_fields,
+            row_group_size=2,
+            format=format,
+            )
+        return read_parquet(str(folder), format=format)
+
+    def test_tables(self, tmpdir):
+        csv_ = self.read(tmpdir)
+        boreholes, segments = self.write(tmpdir,
+            csv_.to_boreholes(FIELDNAMES, EXTRA_FIELDS))
+        assert boreholes.column_names == [
+            'borehole_id', 'code', 'depth', 'x', 'y', 'z', 'quality',
+            ]
+        assert boreholes.column('code').to_pylist() == ['B1', 'B2', 'B3']
+        assert segments.column('borehole_id').to_pylist() == [
+            0, 0, 1, 1, 1, 2]
+        assert segments.column('median').to_pylist() == [
+            150., None, 200., 300., None, None]
+        assert pa.types.is_float64(segments.schema.field('median').type)
+        assert pa.types.is_dictionary(segments.schema.field('lithology').type)
+        assert segments.column('lithology').to_pylist() == [
+            'Z', 'K', 'V', 'Z', 'Z', 'L']
+
+    def test_table_equals_boreholes(self, tmpdir):
+        csv_ = self.read(tmpdir)
+        expected = self.write(tmpdir,
+            csv_.to_boreholes(FIELDNAMES, EXTRA_FIELDS))
+        tables = self.write(tmpdir,
+            [csv_.to_segment_table(FIELDNAMES, EXTRA_FIELDS)])
+        for table, expected_table in zip(tables, expected):
+            assert table.to_pylist() == expected_table.to_pylist()
+
+    def test_arrow(self, tmpdir):
+        csv_ = self.read(tmpdir)
+        boreholes, segments = self.write(tmpdir,
+            csv_.to_boreholes(FIELDNAMES, EXTRA_FIELDS),
+            format='arrow',
+            )
+        assert segments.num_rows == 6
+        assert segments.column('lithology').to_pylist() == [
+            'Z', 'K', 'V', 'Z', 'Z', 'L']
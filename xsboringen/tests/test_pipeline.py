@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.pipeline import Pipeline, apply_steps
+
+import pytest
+
+import threading
+
+
+class TestPipeline(object):
+    steps = [
+        ('double', lambda x: 2 * x),
+        ('odd', lambda x: x + 1),
+        ('drop', lambda x: x if x % 3 else None),
+        ]
+
+    def expected(self, items):
+        return [2 * i + 1 for i in items if (2 * i + 1) % 3]
+
+    def test_serial(self):
+        results = apply_steps(range(20), self.steps, {'enabled': False})
+        assert list(results) == self.expected(range(20))
+
+    def test_stages_ordered(self):
+        config = {'enabled': True, 'queue_size': 2}
+        results = apply_steps(range(100), self.steps, config)
+        assert list(results) == self.expected(range(100))
+
+    def test_stages_workers(self):
+        pipeline = Pipeline.from_steps(self.steps,
+            queue_size=4,
+            stages=[{'steps': ['double', 'odd'], 'workers': 3}],
+            )
+        assert [s.name for s in pipeline.stages] == ['double+odd', 'drop']
+        results = pipeline.run(range(100))
+        assert sorted(results) == self.expected(range(100))
+        assert pipeline.metrics['double+odd'].count == 100
+        assert pipeline.metrics['drop'].count == 100
+        assert pipeline.metrics['drop'].occupancy_max <= 4
+
+    def test_failure(self):
+        steps = [('fail', lambda x: 1 / x)]
+        pipeline = Pipeline.from_steps(steps)
+        with pytest.raises(ZeroDivisionError):
+            list(pipeline.run(range(-5, 5)))
+
+    def test_consumer_stops(self):
+        read = []
+
+        source_closed = []
+
+        def source():
+            try:
+                for i in range(1000):
+                    read.append(i)
+                    yield i
+            finally:
+                source_closed.append(
+                    threading.current_thread() is not threading.main_thread())
+
+        pipeline = Pipeline.from_steps(self.steps, queue_size=2)
+        results = pipeline.run(source())
+        assert next(results) == 1
+        results.close()
+        assert threading.active_count() == self.active_count
+        assert len(read) < 1000
+        assert source_closed == [True]
+
+    def test_failure_stops_reader(self):
+        closed = []
+
+        def source():
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.append(threading.current_thread())
+
+        steps = [('fail', lambda x: 1 / x)]
+        pipeline = Pipeline.from_steps(steps, queue_size=2)
+        with pytest.raises(ZeroDivisionError):
+            list(pipeline.run(source()))
+        assert threading.active_count() == self.active_count
+        assert len(closed) == 1
+        assert closed[0] is not threading.main_thread()
+
+    @pytest.fixture(autouse=True)
+    def count_threads(self):
+        self.active_count = threading.active_count()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole
+from xsboringen.cross_section import CrossSection
+from xsboringen.plotting import CrossSectionPlot, MapPlot, minmax_decimate
+from xsboringen.solid import Solid
+
+from matplotlib import pyplot
+from rasterio.transform import from_origin
+import numpy as np
+import rasterio
+
+
+class TestMinMaxDecimate(object):
+    def test_decimate_count(self):
+        depth = np.linspace(0., 10., 5000)
+        values = np.sin(depth * 7.)
+        decimated_depth, decimated_values = minmax_decimate(depth, values, 100)
+        assert len(decimated_depth) <= 400
+        assert len(decimated_depth) == len(decimated_values)
+
+    def test_decimate_keeps_extremes(self):
+        depth = np.linspace(0., 10., 5000)
+        values = np.zeros_like(depth)
+        values[1234] = 5.
+        values[4321] = -3.
+        decimated_depth, decimated_values = minmax_decimate(depth, values, 50)
+        assert np.isclose(decimated_values.max(), 5.)
+        assert np.isclose(decimated_values.min(), -3.)
+        assert np.isclose(decimated_depth[0], 0.)
+        assert np.isclose(decimated_depth[-1], 10.)
+
+    def test_decimate_missing_values(self):
+        depth = np.linspace(0., 10., 1000)
+        values = np.ones_like(depth)
+        values[:500] = np.nan
+        decimated_depth, decimated_values = minmax_decimate(depth, values, 10)
+        assert np.all(np.diff(decimated_depth) > 0.)
+        assert np.isnan(decimated_values[0])
+
+    def test_no_decimation_below_resolution(self):
+        depth = np.linspace(0., 10., 50)
+        values = np.ones_like(depth)
+        decimated_depth, decimated_values = minmax_decimate(depth, values, 100)
+        assert len(decimated_depth) == 50
+
+
+def write_raster(filename, values):
+    with rasterio.open(filename, 'w', driver='GTiff',
+            height=values.shape[0], width=values.shape[1], count=1,
+            dtype=values.dtype, transform=from_origin(0., 10., 1., 1.),
+            ) as dst:
+        dst.write(values, 1)
+
+
+class TestSampleRasters(object):
+    def test_shared_solid(self, tmpdir):
+        # top increases with x, base is constant
+        topfile = str(tmpdir.join('top.tif'))
+        basefile = str(tmpdir.join('base.tif'))
+        write_raster(topfile, np.tile(np.arange(10., dtype=np.float32), (10, 1)))
+        write_raster(basefile, np.full((10, 10), -1., dtype=np.float32))
+
+        # solid shared by cross-sections, as solids of REGIS model
+        solid = Solid('laag', topfile, basefile)
+        tops = []
+        for x in (1.5, 7.5):
+            geometry = {
+                'type': 'LineString',
+                'coordinates': [(x, 0.5), (x, 9.5)],
+                }
+            cs = CrossSection(geometry, buffer_distance=1.)
+            cs.add_solid(solid)
+            plt = CrossSectionPlot(cs, styles={}, config={})
+            _, solids_data = plt.sample_rasters()
+            distance, top, base = solids_data[0]
+            tops.append(np.nanmean(top))
+        assert not solid.has_data
+        assert tops == [1., 7.]
+
+
+class TestLayoutCodes(object):
+    def plot_codes(self, policy):
+        geometry = {'type': 'LineString', 'coordinates': [(0., 0.), (100., 0.)]}
+        cs = CrossSection(geometry, buffer_distance=1.)
+        config = {
+            'codelabel_position': 1.01,
+            'codelabel_fontsize': 10.,
+            'codelabel_policy': policy,
+            }
+        plt = CrossSectionPlot(cs, styles={}, config=config)
+        fig, ax = pyplot.subplots(figsize=(4, 4))
+        ax.set_xlim(0., 100.)
+        txts = [
+            plt.plot_code(ax, float(i), 'B{:03d}'.format(i))
+            for i in range(100)
+            ]
+        surviving = plt.layout_codes(ax, txts)
+        pyplot.close(fig)
+        return txts, surviving, ax
+
+    def test_all(self):
+        txts, surviving, ax = self.plot_codes('all')
+        assert surviving == txts
+        assert all(t.get_position()[1] == 1.01 for t in txts)
+
+    def test_cull(self):
+        txts, surviving, ax = self.plot_codes('cull')
+        assert 0 < len(surviving) < len(txts)
+        assert len(ax.texts) == len(surviving)
+
+
+class TestMapPlot(object):
+    def test_collect_by_format(self):
+        boreholes = (
+            Borehole('b{:d}'.format(i), 1., x=float(i), y=float(i),
+                format=('GEF CPT' if i % 2 else 'XML Borehole'))
+            for i in range(10)
+            )
+        plt = MapPlot(boreholes, config={})
+        plt.collect()
+        assert set(plt.locations) == {'GEF CPT', 'XML Borehole'}
+        xs, ys, codes = plt.locations['GEF CPT']
+        assert len(codes) == 5
+
+    def test_thin_labels(self):
+        fig, ax = pyplot.subplots(figsize=(4, 4))
+        ax.set_xlim(0., 100.)
+        ax.set_ylim(0., 100.)
+        x, y = np.meshgrid(np.arange(100.), np.arange(100.))
+        plt = MapPlot([], config={'label_spacing': 50.})
+        selected = plt.thin_labels(ax, x.ravel(), y.ravel())
+        pyplot.close(fig)
+        assert 0 < len(selected) < 100
+
+    def test_multi_lines(self):
+        fig, ax = pyplot.subplots(figsize=(4, 4))
+        lines = [
+            ('A', {'type': 'LineString',
+                'coordinates': [(0., 0.), (10., 0.)]}),
+            ('B', {'type': 'MultiLineString',
+                'coordinates': [[(0., 5.), (4., 5.)], [(6., 5.), (10., 5.)]]}),
+            ]
+        plt = MapPlot([], lines=lines, config={})
+        plt.plot_lines(ax)
+        texts = [(t.get_text(), t.get_position()) for t in ax.texts]
+        segments = ax.collections[0].get_segments()
+        pyplot.close(fig)
+        assert len(segments) == 3
+        assert texts[2:] == [('B', (0., 5.)), ('B`', (10., 5.))]
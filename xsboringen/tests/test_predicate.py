@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole
+from xsboringen.csvfiles import CSVBoreholeFile, boreholes_from_csvfile
+from xsboringen.datasources import boreholes_from_sources
+from xsboringen.predicate import Predicate
+
+from xsboringen.tests.test_csvfiles import CSV, FIELDNAMES, EXTRA_FIELDS
+
+from shapely.geometry import box
+
+
+class TestPredicate(object):
+    def test_accepts(self):
+        predicate = Predicate(bbox=(0., 0., 5., 5.), min_depth=2.,
+            quality=['A'],
+            )
+        assert predicate.accepts(x=1., y=1., depth=2., quality='A')
+        assert predicate.accepts(x=1., y=1., quality=None)
+        assert not predicate.accepts(x=6., y=1.)
+        assert not predicate.accepts(x=None, y=None)
+        assert not predicate.accepts(depth=1.)
+        assert not predicate.accepts(quality='B')
+        assert predicate.accepts()
+
+    def test_polygon(self):
+        predicate = Predicate(polygon=box(3., 4., 8., 9.))
+        assert predicate.bbox == (3., 4., 8., 9.)
+        assert predicate.accepts_location(4., 5.)
+        assert not predicate.accepts_location(1., 2.)
+
+    def test_from_spec(self):
+        assert Predicate.from_spec(None, bbox=None) is None
+        predicate = Predicate.from_spec(
+            {'bbox': (0., 0., 5., 5.), 'codes': ['B1', 'B2']},
+            bbox=(2., 2., 8., 8.),
+            codes=['B2', 'B3'],
+            min_depth=1.,
+            )
+        assert predicate.bbox == (2., 2., 5., 5.)
+        assert predicate.codes == {'B2'}
+        assert predicate.min_depth == 1.
+        assert predicate.spatial().min_depth is None
+
+        # numeric codes given twice
+        predicate = Predicate.from_spec(Predicate(codes=[101, 102]),
+            codes=[101],
+            )
+        assert predicate.codes == {'101'}
+
+    def test_accepts_borehole(self):
+        borehole = Borehole('B1', 3., x=1., y=1., quality='B')
+        assert Predicate(codes=['B1']).accepts_borehole(borehole)
+        assert not Predicate(quality=['A']).accepts_borehole(borehole)
+
+
+class TestPushdown(object):
+    kwargs = dict(
+        fieldnames=FIELDNAMES,
+        extra_fields=EXTRA_FIELDS,
+        delimiter=';',
+        decimal=',',
+        )
+
+    def select(self, csvfile, **kwargs):
+        codes = {}
+        for columnar in (False, True):
+            codes[columnar] = [b.code for b in boreholes_from_csvfile(
+                str(csvfile),
+                columnar=columnar,
+                predicate=Predicate(**kwargs),
+                **self.kwargs)]
+        assert codes[False] == codes[True]
+        return codes[False]
+
+    def test_csv(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        assert self.select(csvfile, bbox=(0., 0., 5., 5.)) == ['B1', 'B2']
+        assert self.select(csvfile, min_depth=2.) == ['B1', 'B2']
+        assert self.select(csvfile, quality=['B', 'C']) == ['B2', 'B3']
+        assert self.select(csvfile, codes=['B3']) == ['B3']
+
+    def test_segments_skipped(self, tmpdir, monkeypatch):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        read = []
+        read_segments = CSVBoreholeFile.read_segments.__func__
+        def counting(cls, rows, *args, **kwargs):
+            read.append(rows[0]['code'])
+            return read_segments(cls, rows, *args, **kwargs)
+        monkeypatch.setattr(CSVBoreholeFile, 'read_segments',
+            classmethod(counting))
+        self.select(csvfile, codes=['B2'])
+        assert read == ['B2']
+
+    def test_sources(self, tmpdir):
+        tmpdir.join('boreholes.csv').write(CSV)
+        datasource = {
+            'format': 'CSV boringen',
+            'folder': str(tmpdir),
+            'fieldnames': FIELDNAMES,
+            'extra_fields': EXTRA_FIELDS,
+            'delimiter': ';',
+            'decimal': ',',
+            'quality': ['A', 'B'],
+            }
+        boreholes = boreholes_from_sources([datasource],
+            bbox=(2., 3., 9., 9.),
+            predicate={'min_depth': 2.},
+            )
+        assert [b.code for b in boreholes] == ['B2']
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.datasources import borehole_tasks, boreholes_from_sources
+from xsboringen.geffiles import cpts_from_gef
+from xsboringen.prefetch import BufferedSource, Prefetcher, prefetched
+from xsboringen import utils
+
+from xsboringen.tests.test_catalog import write_gefs
+
+from pathlib import Path
+import os
+
+
+class TestPrefetch(object):
+    def test_buffered_source(self, tmpdir):
+        files = write_gefs(tmpdir)
+        source, = prefetched(files[:1], depth=2)
+        assert isinstance(source, BufferedSource)
+        assert source.name == 'S0.gef'
+        assert str(utils.source_path(source)) == str(Path(files[0]).resolve())
+        with utils.open_source(source) as f:
+            assert f.readline().startswith('#GEFID')
+
+    def test_order(self, tmpdir):
+        files = write_gefs(tmpdir)
+        for memory_mb in (1e-6, 256):
+            prefetcher = Prefetcher(depth=2, memory_mb=memory_mb)
+            buffered = [b for f, b in prefetcher.imap(files)]
+            assert [b.name for b in buffered] == ['S0.gef', 'S1.gef', 'S2.gef']
+
+    def test_memory_on_submit(self, tmpdir):
+        files = write_gefs(tmpdir)
+        pulled = []
+        def sources():
+            for file in files:
+                pulled.append(file)
+                yield file
+        prefetcher = Prefetcher(depth=3, memory_mb=1e-6)
+        results = prefetcher.imap(sources())
+        next(results)
+        assert len(pulled) == 1
+        results.close()
+
+    def test_max_file_size(self, tmpdir):
+        files = write_gefs(tmpdir)
+        assert list(prefetched(files, depth=2, max_file_mb=1e-6)) == files
+        prefetcher = Prefetcher(depth=2, max_file_mb=1e-6)
+        sizes = prefetcher.imap(files, size=lambda f: 0)
+        assert all(isinstance(b, BufferedSource) for f, b in sizes)
+
+    def test_missing(self, tmpdir):
+        missing = str(tmpdir.join('missing.gef'))
+        assert list(prefetched([missing], depth=1)) == [missing]
+
+    def test_readers(self, tmpdir):
+        write_gefs(tmpdir)
+        datacolumns = {'depth': 'sondeertrajectlengte'}
+        expected = [
+            (c.code, c.depth, c.source)
+            for c in cpts_from_gef(Path(str(tmpdir)), datacolumns)
+            ]
+        cpts = cpts_from_gef(Path(str(tmpdir)), datacolumns, prefetch=2)
+        assert [(c.code, c.depth, c.source) for c in cpts] == expected
+
+        datasource = {
+            'format': 'GEF sonderingen',
+            'folder': str(tmpdir),
+            'datacolumns': datacolumns,
+            }
+        cpts = boreholes_from_sources([datasource], prefetch=2)
+        assert [(c.code, c.depth, c.source) for c in cpts] == expected
+
+        # sizes from discovery are passed on to read-ahead
+        tasks = list(borehole_tasks(datasource))
+        assert [t.size for t in tasks] == [os.path.getsize(t.file) for t in tasks]
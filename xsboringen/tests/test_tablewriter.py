@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Borehole, Segment
+from xsboringen.csvfiles import CSVBoreholeFile, boreholes_to_csv
+from xsboringen.tablewriter import RowGetter
+
+from xsboringen.tests.test_csvfiles import CSV, FIELDNAMES, EXTRA_FIELDS
+
+import gzip
+
+EXPECTED = '''code,depth,x,y,z,quality,top,base,lithology,sandmedianclass,median
+B1,2.5,1.0,2.0,3.0,A,0.0,1.5,Z,ZMF,150.0
+B1,2.5,1.0,2.0,3.0,A,1.5,2.5,K,,
+B2,3.0,4.0,5.0,6.0,B,0.0,0.5,V,,200.0
+B2,3.0,4.0,5.0,6.0,B,0.5,1.0,Z,ZMG,300.0
+B2,3.0,4.0,5.0,6.0,B,1.0,3.0,Z,ZMG,
+B3,1.0,7.0,8.0,9.0,C,0.0,1.0,L,,
+'''
+
+
+class TestRowGetter(object):
+    def test_missing(self):
+        segment = Segment(0., 1., 'Z', None, median=150.)
+        getter = RowGetter(('top', 'lithology', 'median', 'color'))
+        assert getter(segment) == (0., 'Z', 150., None)
+
+    def test_property(self):
+        segment = Segment(0., 1.5, 'Z', None)
+        assert RowGetter(('thickness', )).get(segment) == (1.5, )
+
+    def test_fieldname_not_evaluated(self):
+        segment = Segment(0., 1.5, 'Z', None)
+        getter = RowGetter(('top', 'x\'), __import__(\'os\'), (\''))
+        assert getter(segment) == (0., None)
+
+
+class TestBoreholesToCSV(object):
+    extra_fields = {'borehole': ('quality', ), 'segments': ('median', )}
+
+    def read(self, tmpdir):
+        csvfile = tmpdir.join('boreholes.csv')
+        csvfile.write(CSV)
+        return CSVBoreholeFile(str(csvfile), delimiter=';', decimal=',')
+
+    def test_boreholes(self, tmpdir):
+        boreholes = self.read(tmpdir).to_boreholes(FIELDNAMES, EXTRA_FIELDS)
+        outfile = tmpdir.join('out.csv')
+        boreholes_to_csv(boreholes, str(outfile),
+            extra_fields=self.extra_fields,
+            batchsize=2,
+            )
+        assert outfile.read() == EXPECTED
+
+    def test_table(self, tmpdir):
+        table = self.read(tmpdir).to_segment_table(FIELDNAMES, EXTRA_FIELDS)
+        outfile = tmpdir.join('out.csv')
+        boreholes_to_csv([table], str(outfile),
+            extra_fields=self.extra_fields,
+            batchsize=4,
+            )
+        assert outfile.read() == EXPECTED
+
+    def test_gzip(self, tmpdir):
+        boreholes = self.read(tmpdir).to_boreholes(FIELDNAMES, EXTRA_FIELDS)
+        outfile = tmpdir.join('out.csv.gz')
+        boreholes_to_csv(boreholes, str(outfile),
+            extra_fields=self.extra_fields,
+            )
+        with gzip.open(str(outfile), 'rt') as f:
+            assert f.read() == EXPECTED
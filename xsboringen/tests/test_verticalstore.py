@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import Vertical
+from xsboringen.cpt import CPT
+from xsboringen.verticalstore import (
+    VerticalStore, cpts_to_store, cpts_from_store,
+    )
+
+import numpy as np
+
+
+def make_cpt(code, x, y):
+    depth = [0.1, 0.2, 0.3]
+    return CPT(code, 0.3, x=x, y=y, z=1.,
+        verticals={
+            'cone_resistance': Vertical('cone_resistance', depth,
+                [1.5, None, 2.5]),
+            'friction_ratio': Vertical('friction_ratio', depth,
+                [0.5, 0.6, 0.7]),
+            },
+        source='{}.gef'.format(code),
+        format='GEF CPT',
+        )
+
+
+class TestVerticalStore(object):
+    cpts = [make_cpt('S1', 1., 1.), make_cpt('S2', 5., 5.)]
+
+    def test_roundtrip(self, tmpdir):
+        for compress in (True, False):
+            folder = str(tmpdir.join('store{:d}'.format(compress)))
+            assert cpts_to_store(self.cpts, folder, compress=compress) == 2
+            cpts = list(cpts_from_store(folder))
+            assert [c.code for c in cpts] == ['S1', 'S2']
+            vertical = cpts[0].verticals['cone_resistance']
+            assert vertical.depth == [0.1, 0.2, 0.3]
+            assert vertical.values == [1.5, None, 2.5]
+            assert cpts[0].source == 'S1.gef'
+            assert (cpts[0].x, cpts[0].y, cpts[0].z) == (1., 1., 1.)
+
+    def test_select(self, tmpdir):
+        folder = str(tmpdir.join('store'))
+        cpts_to_store(self.cpts, folder)
+        assert [c.code for c in cpts_from_store(folder, codes=['S2'])] == [
+            'S2']
+        assert [c.code for c in cpts_from_store(folder,
+            bbox=(0., 0., 2., 2.))] == ['S1']
+
+
+        # more codes than default limit of SQLite variables in query
+        codes = ['S{:d}'.format(i) for i in range(300000)]
+        assert [c.code for c in cpts_from_store(folder, codes=codes)] == [
+            'S1', 'S2']
+
+    def test_chunks(self, tmpdir):
+        folder = tmpdir.join('store')
+        cpts_to_store(self.cpts, str(folder), chunk_size_mb=1e-5)
+        cpts_to_store([make_cpt('S3', 9., 9.)], str(folder),
+            chunk_size_mb=1e-5)
+        assert len(folder.listdir('chunk*.bin')) == 3
+        with VerticalStore(str(folder)) as store:
+            assert len(store) == 3
+            code, depth, values = next(store.arrays(codes=['S3']))
+            assert np.isnan(values['cone_resistance'][1])
+
+    def test_arrays_outlive_store(self, tmpdir):
+        folder = str(tmpdir.join('store'))
+        cpts_to_store(self.cpts, folder, compress=False)
+        with VerticalStore(folder) as store:
+            code, depth, values = next(store.arrays(codes=['S1']))
+        assert depth.tolist() == [0.1, 0.2, 0.3]
+
+    def test_compact(self, tmpdir):
+        folder = tmpdir.join('store')
+        cpts_to_store(self.cpts, str(folder), chunk_size_mb=1e-5)
+        for i in range(3):
+            cpts_to_store(self.cpts[:1], str(folder), chunk_size_mb=1e-5,
+                compact_ratio=1.,
+                )
+        with VerticalStore(str(folder)) as store:
+            assert store.orphaned() > 0
+            assert store.compact(chunk_size_mb=1e-5) > 0
+            assert store.orphaned() == 0
+            assert len(store.chunks()) == 2
+            assert len(folder.listdir('chunk*.bin')) == 2
+        cpts = list(cpts_from_store(str(folder)))
+        assert [c.code for c in cpts] == ['S2', 'S1']
+        assert cpts[1].verticals['cone_resistance'].values == [1.5, None, 2.5]
+
+    def test_compact_on_write(self, tmpdir):
+        folder = str(tmpdir.join('store'))
+        cpts_to_store(self.cpts, folder)
+        cpts_to_store(self.cpts, folder, compact_ratio=0.3)
+        with VerticalStore(folder) as store:
+            assert store.orphaned() == 0
+            assert len(store) == 2
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.xmlfiles import borehole_from_xml
+from xsboringen.xmlfiles import borehole_from_xml, boreholes_from_xmlfile
+from xsboringen.xmlfiles import BACKENDS, compile_fields
 
 import numpy as np
+import pytest
 
 import glob
 import os
@@ -34,3 +36,78 @@ class TestBoreholeFromXML(object):
         assert len(b) == 82
         assert np.isclose(b.segments[0].length, 2.)
         assert b.segments[-1].lithology == 'K'
+
+
+class TestBoreholesFromXMLFile(object):
+    survey = (
+        '<pointSurvey><identification id="{code:}"/>'
+        '<surveyLocation><coordinates><coordinateX>1.0</coordinateX>'
+        '<coordinateY>2.0</coordinateY></coordinates></surveyLocation>'
+        '<borehole baseDepth="200">{date:}{quality:}<lithoDescr>'
+        '<lithoInterval topDepth="0" baseDepth="200"><lithology code="Z"/>'
+        '</lithoInterval></lithoDescr></borehole></pointSurvey>'
+        )
+
+    def test_stream(self, tmpdir):
+        xmlfile = tmpdir.join('bulk_1.4.xml')
+        xmlfile.write('<dinoSurvey>{}{}</dinoSurvey>'.format(
+            self.survey.format(code='B1',
+                date='<date startYear="1990" startMonth="5"/>',
+                quality='<quality code="A"/>',
+                ),
+            self.survey.format(code='B2', date='', quality=''),
+            ))
+        extra_fields = {
+            'borehole': [{'name': 'quality', 'match': 'quality@code',
+                'dtype': 'str'}],
+            }
+        boreholes = list(boreholes_from_xmlfile(str(xmlfile), extra_fields))
+        assert [b.code for b in boreholes] == ['B1', 'B2']
+        assert boreholes[0].timestamp == '1990-05-01T00:00:00'
+        assert boreholes[0].quality == 'A'
+        assert boreholes[1].timestamp is None
+        assert not hasattr(boreholes[1], 'quality')
+        assert np.isclose(boreholes[1].depth, 2.)
+
+
+class TestFieldMatcher(object):
+    xml = (
+        '<lithoInterval topDepth="0" baseDepth="10">'
+        '<colorMain code="GR"/><sandMedian median="150"/></lithoInterval>'
+        )
+
+    def test_compile(self):
+        fields = [{'name': 'color', 'match': 'colorMain@code', 'dtype': 'str'}]
+        assert compile_fields(fields) is compile_fields(fields)
+        assert compile_fields(None) == []
+
+    def test_find(self):
+        fields = [
+            {'name': 'median', 'match': 'sandMedian/@median', 'dtype': 'float'},
+            {'name': 'top', 'match': '@topDepth', 'dtype': 'int'},
+            {'name': 'missing', 'match': 'colorMain@missing', 'dtype': 'str'},
+            ]
+        for backend, etree in BACKENDS.items():
+            interval = etree.fromstring(self.xml)
+            median, top, missing = compile_fields(fields, backend)
+            assert median.cast(median.find(interval)) == 150.
+            assert top.cast(top.find(interval)) == 0
+            assert missing.find(interval) is None
+
+    def test_find_multistep(self):
+        xml = (
+            '<pointSurvey>'
+            '<lithoInterval><colorMain/></lithoInterval>'
+            '<lithoInterval><colorMain code="GR"/></lithoInterval>'
+            '</pointSurvey>'
+            )
+        fields = [
+            {'name': 'color', 'match': 'lithoInterval/colorMain@code'},
+            {'name': 'last', 'match': 'lithoInterval[2]/colorMain@code'},
+            ]
+        pytest.importorskip('lxml')
+        for backend, etree in BACKENDS.items():
+            survey = etree.fromstring(xml)
+            color, last = compile_fields(fields, backend)
+            assert color.find(survey) is None
+            assert last.find(survey) == 'GR'
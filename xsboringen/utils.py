@@ -2,25 +2,88 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
+from xsboringen.archives import ArchiveMember
+from xsboringen.discovery import Discovery
+from xsboringen.prefetch import BufferedSource
+
+from shapely.geometry import shape
+
 from pathlib import Path
-import glob
 import sys
 import os
 
 
-def careful_glob(folder, pattern):
-    baseparts = []
-    for part in folder.parts:
-        if part == '*':
-            break
-        baseparts.append(part)
-
-    basefolder = Path(*baseparts)
-    if not basefolder.exists():
-        raise ValueError('folder \'{f:}\' does not exist'.format(
-            f=folder,
-            ))
-    return glob.glob(str(folder / pattern))
+def careful_glob(folder, pattern, discovery=None):
+    '''paths of files matching pattern in folder, wildcards in folder are
+    expanded, folders are listed in parallel by discovery'''
+    if discovery is None:
+        discovery = Discovery()
+    return [e.path for e in discovery.glob(folder, pattern)]
+
+
+def open_source(source, mode='r', **kwargs):
+    '''open source file, member of archive or buffered source'''
+    if isinstance(source, (ArchiveMember, BufferedSource)):
+        return source.open(mode, **kwargs)
+    return open(source, mode, **kwargs)
+
+
+def source_path(source):
+    '''resolved path of source file or archive member, buffered source
+    keeps its data'''
+    if isinstance(source, BufferedSource):
+        return BufferedSource(source_path(source.source), source.data)
+    if isinstance(source, ArchiveMember):
+        return source.resolve()
+    return Path(source).resolve()
+
+
+def unbuffered_source(source):
+    '''source file or archive member of buffered source, to be opened again
+    without keeping its data'''
+    if isinstance(source, BufferedSource):
+        return source.source
+    return source
+
+
+def source_stat(source):
+    '''size and modification time of source file or archive member'''
+    if isinstance(source, BufferedSource):
+        return source_stat(source.source)
+    if isinstance(source, ArchiveMember):
+        return source.stat()
+    return os.stat(source)
+
+
+def source_exists(path):
+    '''True if source file or archive member at path exists'''
+    if os.path.exists(path):
+        return True
+    member = ArchiveMember.from_path(path)
+    return (member is not None) and member.exists()
+
+
+def as_geometry(polygon):
+    '''shapely geometry from geometry or GeoJSON-like mapping'''
+    if (polygon is None) or hasattr(polygon, 'bounds'):
+        return polygon
+    return shape(polygon)
+
+
+def bounds(bbox=None, polygon=None):
+    '''intersection of bbox (xmin, ymin, xmax, ymax) and bounds of polygon,
+    None if neither given'''
+    polygon = as_geometry(polygon)
+    if polygon is None:
+        return None if bbox is None else tuple(bbox)
+    if bbox is None:
+        return tuple(polygon.bounds)
+    return (
+        max(bbox[0], polygon.bounds[0]),
+        max(bbox[1], polygon.bounds[1]),
+        min(bbox[2], polygon.bounds[2]),
+        min(bbox[3], polygon.bounds[3]),
+        )
 
 
 def careful_open(filepath, mode):
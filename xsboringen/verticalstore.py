@@ -0,0 +1,320 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from xsboringen.borehole import LazyMixin, Vertical, nan_to_none
+from xsboringen.cpt import CPT
+from xsboringen.predicate import Predicate
+
+import numpy as np
+
+from pathlib import Path
+import logging
+import sqlite3
+import mmap
+import json
+import zlib
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+STORE_VERSION = 1
+
+# fraction of chunk bytes orphaned by replaced soundings at which store is
+# compacted after writing
+COMPACT_RATIO = 0.5
+
+
+def cpts_to_store(cpts, folder, compress=True, chunk_size_mb=64,
+        compact_ratio=COMPACT_RATIO,
+        ):
+    '''write verticals of CPT's to chunked store in folder, store is
+    compacted if fraction of orphaned bytes exceeds compact_ratio, returns
+    number of soundings written'''
+    log.info('writing to {f:}'.format(f=os.path.basename(str(folder))))
+    with VerticalStore(folder) as store:
+        count = store.write(cpts,
+            compress=compress,
+            chunk_size_mb=chunk_size_mb,
+            )
+        size = store.chunk_size()
+        if (size > 0) and (store.orphaned() / size > compact_ratio):
+            store.compact(chunk_size_mb=chunk_size_mb)
+        return count
+
+
+def cpts_from_store(folder, codes=None, bbox=None, predicate=None):
+    '''read CPT's with verticals from chunked store, selected by code and
+    bbox (xmin, ymin, xmax, ymax) in index, other parts of predicate are
+    checked on the CPT's read'''
+    predicate = Predicate.from_spec(predicate, codes=codes, bbox=bbox)
+    if predicate is None:
+        selection = {}
+    else:
+        selection = {'codes': predicate.codes, 'bbox': predicate.bbox}
+    with VerticalStore(folder) as store:
+        for cpt in store.cpts(**selection):
+            if (predicate is None) or predicate.accepts_borehole(cpt):
+                yield cpt
+
+
+class VerticalStore(object):
+    '''Chunked binary store of CPT verticals, with each sounding's depth and
+    vertical arrays as one optionally compressed record in a chunk file and
+    an index by code and location'''
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        if not self.folder.exists():
+            self.folder.mkdir(parents=True)
+        self.connection = sqlite3.connect(str(self.folder / 'index.sqlite'))
+        self.connection.execute((
+            'CREATE TABLE IF NOT EXISTS soundings ('
+            'code TEXT PRIMARY KEY, '
+            'x REAL, '
+            'y REAL, '
+            'z REAL, '
+            'depth REAL, '
+            'attrs TEXT, '
+            'chunk INTEGER, '
+            'offset INTEGER, '
+            'size INTEGER, '
+            'compressed INTEGER, '
+            'names TEXT, '
+            'lengths TEXT)'
+            ))
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS soundings_xy ON soundings (x, y)'
+            )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+            )
+        self.connection.execute(
+            'INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+            ('version', str(STORE_VERSION)),
+            )
+        self.connection.commit()
+
+        # memory maps of chunk files opened for reading
+        self.maps = {}
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(folder={s.folder.name:}, '
+                'soundings={n:d})').format(s=self, n=len(self))
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM soundings').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def chunkfile(self, chunk):
+        return self.folder / 'chunk{:05d}.bin'.format(chunk)
+
+    def chunks(self):
+        '''numbers of chunk files in folder'''
+        return sorted(int(f.stem[5:]) for f in self.folder.glob('chunk*.bin'))
+
+    def chunk_size(self):
+        '''total size of chunk files in bytes'''
+        return sum(self.chunkfile(c).stat().st_size for c in self.chunks())
+
+    def orphaned(self):
+        '''size in bytes of chunk data not referenced by index, left by
+        replaced soundings'''
+        referenced = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM soundings').fetchone()[0]
+        return self.chunk_size() - referenced
+
+    @staticmethod
+    def encode(cpt):
+        '''sounding as record of float64 arrays, depth first, with names and
+        array lengths'''
+        names = sorted(cpt.verticals)
+        depth = None
+        for name in names:
+            if cpt.verticals[name].depth is not None:
+                depth = cpt.verticals[name].depth
+                break
+        arrays = [depth or []] + [cpt.verticals[n].values for n in names]
+        arrays = [
+            np.array([np.nan if v is None else v for v in a], dtype=np.float64)
+            for a in arrays
+            ]
+        lengths = [len(a) for a in arrays]
+        return np.concatenate(arrays).tobytes(), names, lengths
+
+    def write(self, cpts, compress=True, chunk_size_mb=64):
+        '''append verticals of CPT's to last chunk file, a new chunk is
+        started when chunk_size_mb is reached, existing codes are replaced'''
+        chunk_size = chunk_size_mb * 1024 ** 2
+        chunk = self.connection.execute(
+            'SELECT MAX(chunk) FROM soundings').fetchone()[0] or 0
+        self.release(chunk)
+        count = 0
+        f = open(self.chunkfile(chunk), 'ab')
+        try:
+            for cpt in cpts:
+                if len(cpt.verticals) == 0:
+                    continue
+                data, names, lengths = self.encode(cpt)
+                if compress:
+                    data = zlib.compress(data)
+                offset = f.tell()
+                if (offset > 0) and (offset + len(data) > chunk_size):
+                    f.close()
+                    chunk += 1
+                    f = open(self.chunkfile(chunk), 'ab')
+                    offset = f.tell()
+                f.write(data)
+
+                attrs = {
+                    k: v for k, v in cpt.__dict__.items()
+                    if k not in {'code', 'depth', 'x', 'y', 'z',
+                        'segments', 'verticals', *LazyMixin.state_attrs}
+                    and isinstance(v, (str, int, float, type(None)))
+                    }
+                self.connection.execute((
+                    'INSERT OR REPLACE INTO soundings '
+                    '(code, x, y, z, depth, attrs, chunk, offset, size, '
+                    'compressed, names, lengths) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'),
+                    (cpt.code, cpt.x, cpt.y, cpt.z, cpt.depth,
+                     json.dumps(attrs), chunk, offset, len(data),
+                     int(compress), json.dumps(names), json.dumps(lengths)),
+                    )
+                count += 1
+        finally:
+            f.close()
+            self.connection.commit()
+        log.debug('stored verticals of {n:d} soundings'.format(n=count))
+        return count
+
+    def compact(self, chunk_size_mb=64):
+        '''copy referenced records to new chunk files and remove old chunk
+        files, returns number of bytes reclaimed'''
+        chunk_size = chunk_size_mb * 1024 ** 2
+        before = self.chunk_size()
+        old_chunks = self.chunks()
+        rows = self.connection.execute((
+            'SELECT code, chunk, offset, size FROM soundings '
+            'ORDER BY chunk, offset'
+            )).fetchall()
+        chunk = max(old_chunks, default=-1)
+        updates = []
+        f = None
+        try:
+            for code, old_chunk, old_offset, size in rows:
+                data = self.map(old_chunk)[old_offset: old_offset + size]
+                if (f is None) or (
+                        (f.tell() > 0) and (f.tell() + size > chunk_size)):
+                    if f is not None:
+                        f.close()
+                    chunk += 1
+                    f = open(self.chunkfile(chunk), 'wb')
+                updates.append((chunk, f.tell(), code))
+                f.write(data)
+        finally:
+            if f is not None:
+                f.close()
+        self.connection.executemany(
+            'UPDATE soundings SET chunk = ?, offset = ? WHERE code = ?',
+            updates,
+            )
+        self.connection.commit()
+
+        # old chunk files are no longer referenced
+        self.release()
+        for old_chunk in old_chunks:
+            self.chunkfile(old_chunk).unlink()
+        reclaimed = before - self.chunk_size()
+        log.debug('compacted store, reclaimed {n:d} bytes'.format(
+            n=reclaimed))
+        return reclaimed
+
+    def map(self, chunk):
+        '''read-only memory map of chunk file'''
+        if chunk not in self.maps:
+            with open(self.chunkfile(chunk), 'rb') as f:
+                self.maps[chunk] = mmap.mmap(f.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        return self.maps[chunk]
+
+    def release(self, chunk=None):
+        '''close memory maps of chunk or all chunks'''
+        chunks = [chunk] if chunk is not None else list(self.maps)
+        for chunk in chunks:
+            if chunk in self.maps:
+                self.maps.pop(chunk).close()
+
+    def read(self, chunk, offset, size, compressed, lengths):
+        '''arrays of sounding record, copied from memory map so that arrays
+        outlive the store'''
+        data = self.map(chunk)[offset: offset + size]
+        if compressed:
+            data = zlib.decompress(data)
+        data = np.frombuffer(data, dtype=np.float64)
+        return np.split(data, np.cumsum(lengths)[:-1])
+
+    def query(self, codes=None, bbox=None):
+        query = (
+            'SELECT soundings.code, x, y, z, depth, attrs, chunk, offset, '
+            'size, compressed, names, lengths FROM soundings'
+            )
+        conditions = []
+        parameters = []
+        if codes is not None:
+            # codes in temporary table, no limit on number of parameters
+            self.connection.execute((
+                'CREATE TEMP TABLE IF NOT EXISTS selected ('
+                'code TEXT PRIMARY KEY)'
+                ))
+            self.connection.execute('DELETE FROM selected')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO selected (code) VALUES (?)',
+                ((str(c),) for c in codes),
+                )
+            query += ' JOIN selected ON selected.code = soundings.code'
+        if bbox is not None:
+            conditions.append('x >= ? AND y >= ? AND x <= ? AND y <= ?')
+            parameters.extend(bbox)
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY chunk, offset'
+        return self.connection.execute(query, parameters).fetchall()
+
+    def arrays(self, codes=None, bbox=None):
+        '''yield code, depth array and dict of vertical arrays'''
+        for row in self.query(codes, bbox):
+            code, *_, chunk, offset, size, compressed, names, lengths = row
+            depth, *values = self.read(chunk, offset, size, compressed,
+                json.loads(lengths))
+            yield code, depth, dict(zip(json.loads(names), values))
+
+    def cpts(self, codes=None, bbox=None):
+        '''yield CPT with verticals for each selected sounding'''
+        for row in self.query(codes, bbox):
+            (code, x, y, z, depth, attrs,
+             chunk, offset, size, compressed, names, lengths) = row
+            depths, *values = self.read(chunk, offset, size, compressed,
+                json.loads(lengths))
+            depths = nan_to_none(depths) if len(depths) > 0 else None
+            verticals = {
+                name: Vertical(name=name, depth=depths,
+                    values=nan_to_none(v))
+                for name, v in zip(json.loads(names), values)
+                }
+            yield CPT(code, depth,
+                x=x, y=y, z=z,
+                verticals=verticals,
+                **json.loads(attrs),
+                )
+
+    def close(self):
+        self.release()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from xsboringen.borehole import Borehole, Segment
+from xsboringen.borehole import Borehole, LazyBorehole, Segment
+from xsboringen.prefetch import prefetched
 from xsboringen import utils
 
 from itertools import chain
@@ -10,34 +11,186 @@ from pathlib import Path
 import datetime
 import logging
 import glob
+import json
 import csv
 import os
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
 log = logging.getLogger(os.path.basename(__file__))
 
+# XML parsing backends, lxml is optional
+BACKENDS = {'etree': ElementTree}
+if lxml_etree is not None:
+    BACKENDS['lxml'] = lxml_etree
+DEFAULT_BACKEND = 'etree'
+
 
-def boreholes_from_xml(folder, version, extra_fields):
+def boreholes_from_xml(folder, version, extra_fields,
+        prefetch=0, prefetch_memory_mb=256, lazy=False,
+        ):
+    '''read boreholes from Dinoloket XML files in folder, next prefetch
+    files are read ahead into memory while parsing, segments are read on
+    first access if lazy'''
     xmlfiles = utils.careful_glob(folder, '*{:.1f}.xml'.format(version))
-    for xmlfile in xmlfiles:
-        xml = XMLBoreholeFile(xmlfile)
-        borehole = xml.to_borehole(extra_fields)
-        if borehole is not None:
+    for xmlfile in prefetched(xmlfiles, prefetch, prefetch_memory_mb):
+        for borehole in boreholes_from_xmlfile(xmlfile, extra_fields,
+                lazy=lazy,
+                ):
             yield borehole
 
 
+def borehole_from_xml(xmlfile, extra_fields=None):
+    '''read first borehole in XML file'''
+    return XMLBoreholeFile(xmlfile).to_borehole(extra_fields)
+
+
+def boreholes_from_xmlfile(xmlfile, extra_fields=None, backend=None,
+        predicate=None, lazy=False,
+        ):
+    xml = XMLBoreholeFile(xmlfile, backend=backend)
+    for borehole in xml.to_boreholes(extra_fields, predicate=predicate,
+            lazy=lazy,
+            ):
+        yield borehole
+
+
+class FieldMatcher(object):
+    '''Compiled accessor of extra field from match specification
+    'path@attribute', as XPath expression if backend is lxml'''
+    def __init__(self, name, match, dtype=None, backend='etree'):
+        self.name = name
+        path, self.attribute = match.split('@')
+        self.path = path.rstrip('/')
+        self.dtype = dtype
+        self.cast = XMLBoreholeFile.caster(dtype)
+        if backend == 'lxml':
+            if self.path:
+                # first match of whole path, as find of ElementTree
+                xpath = '({s.path:})[1]/@{s.attribute:}'.format(s=self)
+            else:
+                xpath = '@{s.attribute:}'.format(s=self)
+            self.xpath = lxml_etree.XPath(xpath)
+            self.find = self.find_xpath
+        else:
+            self.find = self.find_path
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(name={s.name:}, '
+                'path={s.path:}, attribute={s.attribute:})').format(s=self)
+
+    def find_path(self, element):
+        '''attribute value of matching subelement or None'''
+        if self.path:
+            element = element.find(self.path)
+        if element is None:
+            return None
+        return element.attrib.get(self.attribute)
+
+    def find_xpath(self, element):
+        '''attribute value of matching subelement or None'''
+        values = self.xpath(element)
+        if len(values) == 0:
+            return None
+        return str(values[0])
+
+
+# compiled matchers per extra fields specification and backend
+_matchers = {}
+
+
+def compile_fields(fields, backend='etree'):
+    '''compile extra fields specification once to list of FieldMatcher'''
+    if not fields:
+        return []
+    key = json.dumps(fields, sort_keys=True), backend
+    if key not in _matchers:
+        _matchers[key] = [
+            FieldMatcher(f['name'], f['match'], f.get('dtype'), backend)
+            for f in fields
+            ]
+    return _matchers[key]
+
+
+class XMLSegmentsLoader(object):
+    '''Reader of segments of pointSurvey at index in Dinoloket XML file,
+    called by lazy borehole on first access of segments, file is streamed
+    up to the survey at index'''
+    def __init__(self, xmlfile, index, segment_fields=None, backend=None):
+        self.file = utils.unbuffered_source(xmlfile)
+        self.index = index
+        self.segment_fields = segment_fields
+        self.backend = backend
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(file=\'{s.file.name:}\', '
+                'index={s.index:d})').format(s=self)
+
+    def __call__(self):
+        xml = XMLBoreholeFile(self.file, backend=self.backend)
+        fields = compile_fields(self.segment_fields, xml.backend)
+        surveys = xml.iterchildren('pointSurvey')
+        try:
+            for index, survey in enumerate(surveys):
+                if index == self.index:
+                    return {'segments': [
+                        s for s in xml.read_segments(survey, fields)
+                        ]}
+        finally:
+            surveys.close()
+        return {}
+
+
 class XMLFile(object):
     # format field
     _format = None
 
-    def __init__(self, xmlfile):
-        self.file = Path(xmlfile).resolve()
+    def __init__(self, xmlfile, backend=None):
+        self.file = utils.source_path(xmlfile)
         self.attrs = {
             'source': self.file.name,
             'format': self._format,
             }
 
-        log.debug('reading {s.file.name:}'.format(s=self))
-        self.root = ElementTree.parse(xmlfile).getroot()
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError('XML backend \'{}\' not available'.format(
+                self.backend))
+        self.etree = BACKENDS[self.backend]
+        self._root = None
+
+    @property
+    def root(self):
+        '''root element of whole document, parsed on first access'''
+        if self._root is None:
+            log.debug('reading {s.file.name:}'.format(s=self))
+            with utils.open_source(self.file, 'rb') as f:
+                self._root = self.etree.parse(f).getroot()
+        return self._root
+
+    def iterchildren(self, tag):
+        '''stream children of root element with tag, processed elements are
+        cleared to keep memory use independent of file size'''
+        log.debug('streaming {s.file.name:}'.format(s=self))
+        depth = 0
+        root = None
+        with utils.open_source(self.file, 'rb') as f:
+            for event, element in self.etree.iterparse(f,
+                    events=('start', 'end'),
+                    ):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    if element.tag == tag:
+                        yield element
+                    root.clear()
 
 
 class XMLBoreholeFile(XMLFile):
@@ -59,17 +212,23 @@ class XMLBoreholeFile(XMLFile):
 
     @classmethod
     def cast(cls, s, dtype):
+        return cls.caster(dtype)(s)
+
+    @classmethod
+    def caster(cls, dtype):
+        '''cast function for dtype'''
         if dtype == 'float':
-            return cls.safe_float(s)
+            return cls.safe_float
         elif dtype == 'int':
-            return cls.safe_int(s)
+            return cls.safe_int
         else:
-            return s
+            return str
 
     @classmethod
     def read_segments(cls, survey, fields=None):
-        '''read segments from XML and yield as Segment'''
-        fields = fields or {}
+        '''read segments from XML and yield as Segment, extra fields as
+        list of compiled FieldMatcher'''
+        fields = fields or []
         intervals = survey.findall('borehole/lithoDescr/lithoInterval')
         for interval in intervals:
             # top and base
@@ -97,14 +256,10 @@ class XMLBoreholeFile(XMLFile):
                 attrs['sandmedian'] = None
 
             for field in fields:
-                path, attrib = field['match'].split('@')
-                element = interval.find(path.rstrip('/'))
-                if element is None:
-                    continue
-                value = element.attrib.get(attrib)
+                value = field.find(interval)
                 if value is None:
                     continue
-                attrs[field['name']] = cls.cast(value, field['dtype'])
+                attrs[field.name] = field.cast(value)
 
             # yield segment
             yield Segment(top, base, lithology, sandmedianclass, **attrs)
@@ -115,25 +270,46 @@ class XMLBoreholeFile(XMLFile):
         return max(s.base for s in segments)
 
     def to_borehole(self, extra_fields=None):
-        '''read Dinoloket XML file and return Borehole'''
+        '''read first pointSurvey in Dinoloket XML file and return Borehole'''
+        return next(self.to_boreholes(extra_fields), None)
+
+    def to_boreholes(self, extra_fields=None, predicate=None, lazy=False):
+        '''stream Dinoloket XML file and yield Borehole for each pointSurvey,
+        or LazyBorehole with segments read on first access if lazy'''
+        for index, survey in enumerate(self.iterchildren('pointSurvey')):
+            borehole = self.survey_to_borehole(survey, extra_fields,
+                predicate=predicate,
+                index=index if lazy else None,
+                )
+            if borehole is not None:
+                yield borehole
+
+    def survey_to_borehole(self, survey, extra_fields=None, predicate=None,
+            index=None,
+            ):
+        '''read pointSurvey element and return Borehole, or None if rejected
+        by predicate on survey metadata, or LazyBorehole if index of survey
+        in file is given, with segments read on first access if depth is in
+        metadata'''
         # extra fields
         extra_fields = extra_fields or {}
-        borehole_fields = extra_fields.get('borehole') or None
-        segment_fields = extra_fields.get('segments') or None
+        borehole_fields = compile_fields(
+            extra_fields.get('borehole'), self.backend)
+        segment_fields = compile_fields(
+            extra_fields.get('segments'), self.backend)
+
+        # attributes per borehole
+        attrs = self.attrs.copy()
 
         # code
-        survey = self.root.find('pointSurvey')
         code = survey.find('identification').attrib.get('id')
 
-        for field in (borehole_fields or []):
-            path, attrib = field['match'].split('@')
-            element = survey.find("borehole").find(path.rstrip('/'))
-            if element is None:
-                continue
-            value = element.attrib.get(attrib)
+        borehole = survey.find('borehole')
+        for field in borehole_fields:
+            value = field.find(borehole)
             if value is None:
                 continue
-            self.attrs[field['name']] = self.cast(value, field['dtype'])
+            attrs[field.name] = field.cast(value)
 
         # timestamp of borehole
         date = survey.find('borehole/date')
@@ -151,10 +327,12 @@ class XMLBoreholeFile(XMLFile):
                 timestamp = None
         except AttributeError:
             timestamp = None
-        self.attrs['timestamp'] = timestamp
+        attrs['timestamp'] = timestamp
 
-        # segments as list
-        segments = [s for s in self.read_segments(survey, segment_fields)]
+        # x,y coordinates
+        coordinates = survey.find('surveyLocation/coordinates')
+        x = self.safe_float(coordinates.find('coordinateX').text)
+        y = self.safe_float(coordinates.find('coordinateY').text)
 
         # final depth of borehole in m
         basedepth = survey.find('borehole').attrib.get('baseDepth')
@@ -162,12 +340,32 @@ class XMLBoreholeFile(XMLFile):
         try:
             depth *= 1e-2  # to m
         except TypeError:
-            depth = self.depth_from_segments(segments)
+            depth = None
 
-        # x,y coordinates
-        coordinates = survey.find('surveyLocation/coordinates')
-        x = self.safe_float(coordinates.find('coordinateX').text)
-        y = self.safe_float(coordinates.find('coordinateY').text)
+        # skip segments if rejected on survey metadata
+        if (predicate is not None) and not predicate.accepts(
+                code=code, x=x, y=y,
+                quality=attrs.get('quality'),
+                **({'depth': depth} if depth is not None else {})
+                ):
+            return
+
+        # segments as list, read on first access by index of survey if lazy
+        if index is not None:
+            loader = XMLSegmentsLoader(self.file, index,
+                segment_fields=extra_fields.get('segments'),
+                backend=self.backend,
+                )
+        else:
+            loader = None
+        if (loader is not None) and (depth is not None):
+            segments = None
+        else:
+            segments = [s for s in self.read_segments(survey, segment_fields)]
+        if depth is None:
+            depth = self.depth_from_segments(segments)
+            if (predicate is not None) and not predicate.accepts_depth(depth):
+                return
 
         # elevation in m
         elevation = survey.find('surfaceElevation/elevation')
@@ -180,8 +378,15 @@ class XMLBoreholeFile(XMLFile):
         else:
             z = None
 
+        if loader is not None:
+            return LazyBorehole(code, depth,
+                x=x, y=y, z=z,
+                segments=segments,
+                loader=loader,
+                **attrs,
+                )
         return Borehole(code, depth,
             x=x, y=y, z=z,
             segments=segments,
-            **self.attrs,
+            **attrs,
             )